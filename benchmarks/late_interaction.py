@@ -0,0 +1,111 @@
+"""
+Late interaction rescoring in FaissVectorDatabase.
+
+Indexes documents of Zipf distributed words with dense and token embeddings of
+the hashing model, and queries them with a few words of a random document.
+Compares the dense ranking against rescoring the nearest candidates by MaxSim
+over the token embeddings, reporting how often the queried document is in the
+top k, the query latency and the memory of the dense index and the token store.
+
+Usage:
+    python -m benchmarks.late_interaction --num-docs 20000 --candidates 100
+"""
+
+import time
+import asyncio
+import argparse
+import numpy as np
+
+from rag_battle.domain.schemas import DataItem, DataItemWithEmbedding
+from rag_battle.infra.embeddings import (
+    HashingEmbeddingsModel,
+    HashingEmbeddingsModelConfig,
+)
+from rag_battle.infra.vector_database import (
+    FaissVectorDatabase,
+    FaissVectorDatabaseConfig,
+)
+
+
+def random_texts(
+    rng: np.random.Generator, num_texts: int, num_words: int, vocab_size: int
+) -> list[str]:
+    words = rng.zipf(1.2, (num_texts, num_words)) % vocab_size
+    return [" ".join(f"w{word}" for word in text) for text in words.tolist()]
+
+
+async def main(args: argparse.Namespace) -> None:
+    rng = np.random.default_rng(0)
+    model = HashingEmbeddingsModel(
+        config=HashingEmbeddingsModelConfig(EMBEDDINGS_SIZE=args.embedding_size)
+    )
+    database = await FaissVectorDatabase.create(
+        embedding_size=args.embedding_size,
+        config=FaissVectorDatabaseConfig(
+            FAISS_LATE_INTERACTION_CANDIDATES=args.candidates
+        ),
+    )
+    texts = random_texts(rng, args.num_docs, args.doc_words, args.vocab)
+    batch_size = 1000
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start : start + batch_size]
+        embeddings = await model.embed_documents_array(batch)
+        tokens = await model.embed_documents_tokens(batch)
+        await database.save_items(
+            [
+                DataItemWithEmbedding(
+                    item=DataItem(item_id=f"{start + i}", content=text, tags=[]),
+                    embedding=embeddings[i],
+                    token_embeddings=[tokens[i]],
+                )
+                for i, text in enumerate(batch)
+            ]
+        )
+    targets = rng.integers(0, args.num_docs, args.num_queries)
+    queries = [
+        " ".join(rng.choice(texts[target].split(), args.query_words).tolist())
+        for target in targets.tolist()
+    ]
+    query_embeddings = await model.embed_queries_array(queries)
+    query_tokens = await model.embed_queries_tokens(queries)
+    dense_bytes = database._faiss_index.ntotal * args.embedding_size * 4
+    print(
+        f"{args.num_docs} documents x {args.doc_words} words, "
+        f"{args.query_words} query words, k={args.k}, "
+        f"{args.candidates} candidates"
+    )
+    print(
+        f"memory: dense index {dense_bytes / 2**20:.1f} MiB, "
+        f"token store {database._token_store.nbytes / 2**20:.1f} MiB"
+    )
+
+    for name, use_tokens in [("dense", False), ("late", True)]:
+        found = 0
+        start_time = time.perf_counter()
+        for i, target in enumerate(targets.tolist()):
+            items = await database.query(
+                query_embeddings=[query_embeddings[i]],
+                tags=[],
+                num_items=args.k,
+                remove_duplicates=True,
+                token_query_embeddings=[query_tokens[i]] if use_tokens else None,
+            )
+            found += any(x.item.item_id == f"{target}" for x in items)
+        elapsed = (time.perf_counter() - start_time) / len(queries)
+        print(
+            f"{name:>6}: {elapsed * 1000:8.3f} ms per query, "
+            f"hit rate@{args.k} {found / len(queries):.3f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--num-docs", type=int, default=20_000)
+    parser.add_argument("--doc-words", type=int, default=32)
+    parser.add_argument("--query-words", type=int, default=4)
+    parser.add_argument("--vocab", type=int, default=30_000)
+    parser.add_argument("--embedding-size", type=int, default=128)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--candidates", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
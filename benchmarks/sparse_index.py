@@ -0,0 +1,87 @@
+"""
+Top-k search of the in-process inverted index of sparse embeddings.
+
+Indexes documents of Zipf distributed words weighted by their rarity, like
+SPLADE or BM25 term weights of real text, and compares MaxScore
+`SparseIndex.search` against scoring every posting of the query terms, the
+exhaustive term-at-a-time baseline.
+
+Usage:
+    python -m benchmarks.sparse_index --num-docs 200000 --k 10
+"""
+
+import time
+import argparse
+import numpy as np
+
+from rag_battle.domain.schemas import SparseVector
+from rag_battle.infra.vector_database.sparse_index import SparseIndex
+
+
+def random_vectors(
+    rng: np.random.Generator, num_vectors: int, num_terms: int, vocab_size: int
+) -> list[SparseVector]:
+    vectors = []
+    for terms in rng.zipf(1.2, (num_vectors, num_terms)) % vocab_size:
+        indices = np.unique(terms)
+        # rare terms weigh more, like the idf of BM25 or learned SPLADE weights
+        weights = rng.random(len(indices)) * np.log1p(indices)
+        vectors.append(SparseVector(indices, weights.astype(np.float32)))
+    return vectors
+
+
+def exhaustive_search(
+    index: SparseIndex, query: SparseVector, k: int
+) -> tuple[np.ndarray, np.ndarray]:
+    scores = np.zeros(index._size, dtype=np.float32)
+    for term, weight in zip(query.indices.tolist(), query.values.tolist()):
+        if term in index._postings:
+            ids, weights = index._postings[term]
+            scores[ids] += weight * weights
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return scores[top], top
+
+
+def main(args: argparse.Namespace) -> None:
+    rng = np.random.default_rng(0)
+    index = SparseIndex()
+    batch_size = 10_000
+    for start in range(0, args.num_docs, batch_size):
+        vectors = random_vectors(
+            rng, min(batch_size, args.num_docs - start), args.doc_terms, args.vocab
+        )
+        index.add(np.arange(start, start + len(vectors)), vectors)
+    queries = random_vectors(rng, args.num_queries, args.query_terms, args.vocab)
+    # merge the pending postings outside of the measurement
+    index.search(queries[0], args.k)
+    print(
+        f"{args.num_docs} documents x {args.doc_terms} terms, "
+        f"{args.query_terms} query terms, k={args.k}"
+    )
+
+    for query in queries:
+        found_scores, _ = index.search(query, args.k)
+        expected_scores, _ = exhaustive_search(index, query, args.k)
+        assert np.allclose(found_scores, expected_scores[: len(found_scores)])
+
+    for name, search in [
+        ("exhaustive", lambda query: exhaustive_search(index, query, args.k)),
+        ("maxscore", lambda query: index.search(query, args.k)),
+    ]:
+        start_time = time.perf_counter()
+        for query in queries:
+            search(query)
+        elapsed = (time.perf_counter() - start_time) / len(queries)
+        print(f"{name:>10}: {elapsed * 1000:8.3f} ms per query")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--num-docs", type=int, default=200_000)
+    parser.add_argument("--doc-terms", type=int, default=64)
+    parser.add_argument("--query-terms", type=int, default=8)
+    parser.add_argument("--vocab", type=int, default=30_000)
+    parser.add_argument("--num-queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    main(parser.parse_args())
@@ -0,0 +1,117 @@
+"""
+Query embedding latency of the TEI client under concurrent load.
+
+Runs a TEI stand-in server whose inference time grows with the batch size and
+fires concurrent single-query `embed_queries` calls at it, once straight
+through TEIEmbeddingsModel and once coalesced by BatchingEmbeddingsModel.
+Reports throughput and latency percentiles. `--stall-rate` injects the tail
+latency hedged calls cut, compare with `EMBEDDINGS_HEDGE_QUANTILE=0`.
+
+Usage:
+    python -m benchmarks.tei_client --num-queries 2000 --concurrency 64
+"""
+
+import os
+import time
+import asyncio
+import argparse
+import numpy as np
+
+from rag_battle.domain.embeddings_model import BaseEmbeddingsModel
+from rag_battle.infra.embeddings import (
+    BatchingEmbeddingsModel,
+    EmbeddingsBatchingConfig,
+)
+from rag_battle.infra.embeddings.service import TEIService
+from rag_battle.infra.embeddings.tei import TEIEmbeddingsModel, TEIEmbeddingsModelConfig
+from rag_battle.infra.embeddings.text_embeddings_inference.channel_pool import (
+    TEIChannelPool,
+)
+from rag_battle.infra.embeddings.text_embeddings_inference.stand_in import (
+    TEIStandInConfig,
+    TEIStandInServer,
+)
+
+
+async def measure(
+    model: BaseEmbeddingsModel, num_queries: int, concurrency: int
+) -> tuple[float, np.ndarray]:
+    latencies: list[float] = []
+    queue = iter(range(num_queries))
+
+    async def worker() -> None:
+        for i in queue:
+            start_time = time.perf_counter()
+            await model.embed_queries([f"query number {i}"])
+            latencies.append(time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start_time, np.array(latencies)
+
+
+async def main(args: argparse.Namespace) -> None:
+    server = TEIStandInServer(
+        TEIStandInConfig(
+            embedding_size=args.embedding_size,
+            max_concurrent_requests=args.max_concurrent_requests,
+            base_latency_s=args.base_latency_ms / 1000,
+            item_latency_s=args.item_latency_ms / 1000,
+            stall_rate=args.stall_rate,
+            stall_latency_s=args.stall_latency_ms / 1000,
+        )
+    )
+    port = await server.start()
+    os.environ.update(
+        EMBEDDINGS_HOST="127.0.0.1",
+        EMBEDDINGS_PORT=str(port),
+        EMBEDDINGS_MODEL=server.config.model_id,
+        EMBEDDINGS_SIZE=str(args.embedding_size),
+    )
+    pool = TEIChannelPool(TEIService())
+    model = TEIEmbeddingsModel(config=TEIEmbeddingsModelConfig(), channel_pool=pool)
+    await model.configure()
+    print(
+        f"{args.num_queries} queries, concurrency {args.concurrency}, inference "
+        f"{args.base_latency_ms} ms + {args.item_latency_ms} ms per input"
+    )
+    models = [
+        ("direct", model),
+        (
+            "batched",
+            BatchingEmbeddingsModel(
+                model,
+                config=EmbeddingsBatchingConfig(
+                    EMBEDDINGS_BATCH_MAX_WAIT_MS=args.batch_max_wait_ms
+                ),
+            ),
+        ),
+    ]
+    try:
+        for name, measured in models:
+            elapsed, latencies = await measure(
+                measured, args.num_queries, args.concurrency
+            )
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+            print(
+                f"{name:>8}: {args.num_queries / elapsed:8.0f} queries/s, "
+                f"p50 {p50:6.2f} ms, p99 {p99:6.2f} ms"
+            )
+    finally:
+        await pool.close()
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--num-queries", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--embedding-size", type=int, default=1024)
+    parser.add_argument("--max-concurrent-requests", type=int, default=512)
+    parser.add_argument("--base-latency-ms", type=float, default=2.0)
+    parser.add_argument("--item-latency-ms", type=float, default=0.05)
+    parser.add_argument("--batch-max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--stall-latency-ms", type=float, default=100.0)
+    main_args = parser.parse_args()
+    asyncio.run(main(main_args))
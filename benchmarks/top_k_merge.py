@@ -0,0 +1,96 @@
+"""
+Merging the hits of many result lists into the k best ones.
+
+Compares pushing every hit into a heap of dataclasses, as
+FaissVectorDatabase.query used to, against the vectorized `merge_top_k`.
+Result lists overlap, as the results of similar queries or of searches over
+overlapping tags do, so deduplication has work to do.
+
+Usage:
+    python -m benchmarks.top_k_merge --num-lists 50 --k 1000
+"""
+
+import time
+import heapq
+import argparse
+import numpy as np
+from dataclasses import dataclass
+from typing import Callable
+
+from rag_battle.infra.vector_database.top_k import merge_top_k
+
+
+@dataclass(order=True)
+class ScoreItem:
+    score: float
+    item_id: int
+
+
+def heapq_merge_top_k(
+    scores: np.ndarray,
+    ids: np.ndarray,
+    k: int,
+    remove_duplicates: bool,
+) -> tuple[np.ndarray, np.ndarray]:
+    score_items: list[ScoreItem] = []
+    for i in range(len(scores)):
+        for score, item_id in zip(scores[i], ids[i]):
+            if item_id < 0:
+                continue
+            heapq.heappush(score_items, ScoreItem(score=score, item_id=item_id))
+    merged: list[ScoreItem] = []
+    unique_ids = set()
+    for score_item in sorted(score_items, reverse=True):
+        if remove_duplicates:
+            if score_item.item_id in unique_ids:
+                continue
+            unique_ids.add(score_item.item_id)
+        merged.append(score_item)
+    merged = merged[:k]
+    return (
+        np.array([x.score for x in merged], dtype=np.float32),
+        np.array([x.item_id for x in merged], dtype=np.int64),
+    )
+
+
+def measure(
+    merge: Callable[..., tuple[np.ndarray, np.ndarray]],
+    scores: np.ndarray,
+    ids: np.ndarray,
+    k: int,
+    repeat: int,
+) -> float:
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        merge(scores, ids, k, remove_duplicates=True)
+    return (time.perf_counter() - start_time) / repeat
+
+
+def main(args: argparse.Namespace) -> None:
+    rng = np.random.default_rng(0)
+    ids = rng.integers(0, args.num_ids, size=(args.num_lists, args.k))
+    scores = rng.random((args.num_lists, args.k), dtype=np.float32)
+    # every list is sorted like a FAISS result
+    scores = -np.sort(-scores, axis=1)
+    print(
+        f"{args.num_lists} lists x k={args.k}, ids drawn from {args.num_ids}, "
+        f"remove_duplicates=True"
+    )
+
+    expected_scores, expected_ids = heapq_merge_top_k(scores, ids, args.k, True)
+    found_scores, found_ids = merge_top_k(scores, ids, args.k, True)
+    assert np.allclose(found_scores, expected_scores)
+    assert set(found_ids.tolist()) == set(expected_ids.tolist())
+
+    for name, merge in [("heapq", heapq_merge_top_k), ("numpy", merge_top_k)]:
+        elapsed = measure(merge, scores, ids, args.k, args.repeat)
+        print(f"{name:>6}: {elapsed * 1000:8.3f} ms per merge")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--num-lists", type=int, default=50)
+    parser.add_argument("--k", type=int, default=1000)
+    parser.add_argument("--num-ids", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
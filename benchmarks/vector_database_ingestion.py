@@ -0,0 +1,82 @@
+"""
+Ingestion throughput of FaissVectorDatabase.
+
+Compares saving a corpus one item per `save_items` call (the per-item path, one
+FAISS call per document) against saving it in batches (the bulk path), both for
+fresh inserts and for overwriting the already stored corpus.
+
+Usage:
+    python -m benchmarks.vector_database_ingestion --num-items 100000
+"""
+
+import time
+import asyncio
+import argparse
+import numpy as np
+
+from rag_battle.domain.schemas import DataItem, DataItemWithEmbedding
+from rag_battle.infra.vector_database import FaissVectorDatabase
+
+
+def create_items(
+    num_items: int,
+    embedding_size: int,
+    num_tags: int,
+    tags_per_item: int,
+    seed: int = 0,
+) -> list[DataItemWithEmbedding]:
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((num_items, embedding_size), dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    tags = rng.integers(0, num_tags, size=(num_items, tags_per_item))
+    return [
+        DataItemWithEmbedding(
+            item=DataItem(
+                item_id=f"{i:032x}",
+                content=f"Document {i}.",
+                tags=[f"tag{tag}" for tag in set(tags[i].tolist())],
+            ),
+            embedding=embeddings[i],
+        )
+        for i in range(num_items)
+    ]
+
+
+async def save(
+    database: FaissVectorDatabase,
+    items: list[DataItemWithEmbedding],
+    batch_size: int,
+) -> float:
+    start_time = time.perf_counter()
+    for i in range(0, len(items), batch_size):
+        await database.save_items(items[i : i + batch_size])
+    return time.perf_counter() - start_time
+
+
+async def main(args: argparse.Namespace) -> None:
+    items = create_items(
+        args.num_items, args.embedding_size, args.num_tags, args.tags_per_item
+    )
+    print(
+        f"{args.num_items} items, embedding size {args.embedding_size}, "
+        f"{args.tags_per_item} tags per item out of {args.num_tags}"
+    )
+    for name, batch_size in [("per-item", 1), ("bulk", args.batch_size)]:
+        database = FaissVectorDatabase(embedding_size=args.embedding_size)
+        # the second pass overwrites every item, which tombstones the old vectors
+        for stage in ["insert", "upsert"]:
+            elapsed = await save(database, items, batch_size)
+            print(
+                f"{name:>10} {stage}: batch size {batch_size:>6}, "
+                f"{elapsed:8.3f} s, {len(items) / elapsed:10.0f} docs/s"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--num-items", type=int, default=100_000)
+    parser.add_argument("--embedding-size", type=int, default=1024)
+    parser.add_argument("--num-tags", type=int, default=50)
+    parser.add_argument("--tags-per-item", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    asyncio.run(main(parser.parse_args()))
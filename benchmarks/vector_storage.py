@@ -0,0 +1,106 @@
+"""
+Memory, throughput and recall of the FAISS_STORAGE precisions.
+
+Indexes clustered unit vectors, like the embeddings of a corpus, in a
+FaissVectorDatabase storing them as float32, float16 or int8 scalar quantized
+codes, the latter also with FAISS_RESCORE_FACTOR rescoring. Recall@k is measured
+against the exact float32 top k.
+
+Usage:
+    python -m benchmarks.vector_storage --num-items 50000 --embedding-size 1024
+"""
+
+import time
+import faiss
+import asyncio
+import argparse
+import numpy as np
+
+from rag_battle.domain.schemas import DataItem, DataItemWithEmbedding
+from rag_battle.infra.vector_database import (
+    FaissVectorDatabase,
+    FaissVectorDatabaseConfig,
+)
+
+
+def clustered_vectors(
+    rng: np.random.Generator, num_vectors: int, embedding_size: int, num_clusters: int
+) -> np.ndarray:
+    centers = rng.standard_normal((num_clusters, embedding_size), dtype=np.float32)
+    vectors = centers[rng.integers(0, num_clusters, num_vectors)]
+    vectors += rng.standard_normal(vectors.shape, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+async def main(args: argparse.Namespace) -> None:
+    rng = np.random.default_rng(0)
+    vectors = clustered_vectors(
+        rng, args.num_items + args.num_queries, args.embedding_size, args.num_clusters
+    )
+    vectors, queries = vectors[: args.num_items], vectors[args.num_items :]
+    expected = np.argsort(-(queries @ vectors.T), axis=1)[:, : args.k]
+    items = [
+        DataItemWithEmbedding(
+            item=DataItem(item_id=f"{i}", content=f"Document {i}.", tags=[]),
+            embedding=vectors[i],
+        )
+        for i in range(args.num_items)
+    ]
+    print(
+        f"{args.num_items} vectors of size {args.embedding_size}, "
+        f"{args.num_queries} queries, k={args.k}"
+    )
+
+    for storage, rescore_factor in [
+        ("fp32", 0),
+        ("fp16", 0),
+        ("sq8", 0),
+        ("sq8", args.rescore_factor),
+    ]:
+        database = await FaissVectorDatabase.create(
+            embedding_size=args.embedding_size,
+            config=FaissVectorDatabaseConfig(
+                FAISS_STORAGE=storage,
+                FAISS_RESCORE_FACTOR=rescore_factor,
+                FAISS_TRAIN_SIZE=min(args.num_items, 10_000),
+            ),
+        )
+        for start in range(0, args.num_items, 10_000):
+            await database.save_items(items[start : start + 10_000])
+        index_bytes = len(faiss.serialize_index(database._faiss_index))
+        rescore_bytes = (
+            database._vector_store.nbytes if database._vector_store is not None else 0
+        )
+
+        found = 0
+        start_time = time.perf_counter()
+        for query, expected_ids in zip(queries, expected):
+            results = await database.query(
+                query_embeddings=[query],
+                tags=[],
+                num_items=args.k,
+                remove_duplicates=True,
+            )
+            found += len(
+                {f"{i}" for i in expected_ids.tolist()}
+                & {x.item.item_id for x in results}
+            )
+        elapsed = time.perf_counter() - start_time
+        name = f"{storage}" + (f", rescore x{rescore_factor}" if rescore_factor else "")
+        print(
+            f"{name:>18}: index {index_bytes / 2**20:7.1f} MiB, "
+            f"rescore vectors {rescore_bytes / 2**20:7.1f} MiB, "
+            f"{args.num_queries / elapsed:8.1f} QPS, "
+            f"recall@{args.k} {found / (args.num_queries * args.k):.3f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--num-items", type=int, default=50_000)
+    parser.add_argument("--embedding-size", type=int, default=1024)
+    parser.add_argument("--num-clusters", type=int, default=100)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--k", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,48 @@
+from abc import ABC, abstractmethod
+
+
+class BaseChunker(ABC):
+    """
+    Abstract base class for document chunkers.
+
+    Chunkers split documents too long for the embeddings model into chunks that
+    are embedded separately, so long documents are stored as multi-vector items
+    instead of being rejected.
+    """
+
+    @abstractmethod
+    async def chunk(self, texts: list[str]) -> list[list[str]]:
+        """
+        Split texts into chunks.
+
+        :param texts: List of document texts to split.
+
+        :return: list[list[str]]: The chunks of every text, in order. Texts short
+        enough to be embedded at once are a single chunk.
+        """
+        raise NotImplementedError
+
+
+def token_windows(
+    offsets: list[tuple[int, int]],
+    max_tokens: int,
+    overlap_tokens: int,
+) -> list[tuple[int, int]]:
+    """
+    Split a tokenized text into overlapping windows of tokens.
+
+    :param offsets: Start and stop offsets of the tokens of the text.
+    :param max_tokens: Maximum number of tokens of a window.
+    :param overlap_tokens: Number of tokens a window shares with the previous one.
+
+    :return: list[tuple[int, int]]: Start and stop offsets of the windows, in
+    the unit of the token offsets.
+    """
+    step = max(1, max_tokens - overlap_tokens)
+    windows: list[tuple[int, int]] = []
+    for start in range(0, len(offsets), step):
+        end = min(start + max_tokens, len(offsets))
+        windows.append((offsets[start][0], offsets[end - 1][1]))
+        if end == len(offsets):
+            break
+    return windows
@@ -0,0 +1,46 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+# monotonic time by which the current request must be answered
+_DEADLINE: ContextVar[float | None] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(timeout: float | None) -> Iterator[None]:
+    """
+    Set the deadline of the calls made inside, `timeout` seconds from now.
+
+    A deadline of an outer scope is only ever shortened, never extended. None
+    keeps the outer deadline.
+    """
+    deadline = _DEADLINE.get()
+    if timeout is not None:
+        new_deadline = time.monotonic() + timeout
+        if deadline is None or new_deadline < deadline:
+            deadline = new_deadline
+    token = _DEADLINE.set(deadline)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+def current() -> float | None:
+    """
+    :return: float | None: Monotonic time of the deadline, None without
+    deadline.
+    """
+    return _DEADLINE.get()
+
+
+def remaining() -> float | None:
+    """
+    :return: float | None: Seconds left until the deadline, negative once it
+    passed. None without deadline.
+    """
+    deadline = _DEADLINE.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
@@ -1,8 +1,11 @@
+import numpy as np
 from abc import ABC, abstractmethod
 from typing import TypeVar, Generic
 from pydantic import ConfigDict
 from pydantic_settings import BaseSettings
 
+from rag_battle.domain.schemas import SparseVector
+
 
 class EmbeddingsModelConfig(BaseSettings):
     """
@@ -43,6 +46,10 @@ class BaseEmbeddingsModel(Generic[EmbeddingsModelConfigType], ABC):
         """
         self._config = config
 
+    @property
+    def config(self) -> EmbeddingsModelConfigType:
+        return self._config
+
     @abstractmethod
     async def embed_queries(self, texts: list[str]) -> list[list[float]]:
         """
@@ -70,3 +77,97 @@ class BaseEmbeddingsModel(Generic[EmbeddingsModelConfigType], ABC):
 
         """
         raise NotImplementedError
+
+    async def embed_queries_array(self, texts: list[str]) -> np.ndarray:
+        """
+        Generate embeddings for query texts as one matrix.
+
+        :param texts: List of query texts to embed.
+
+        :return: np.ndarray: float32 matrix with one embedding row per input text.
+        """
+        return self._to_array(await self.embed_queries(texts))
+
+    async def embed_documents_array(self, texts: list[str]) -> np.ndarray:
+        """
+        Generate embeddings for document texts as one matrix.
+
+        :param texts: List of document texts to embed.
+
+        :return: np.ndarray: float32 matrix with one embedding row per input text.
+        """
+        return self._to_array(await self.embed_documents(texts))
+
+    def _to_array(self, embeddings: list[list[float]]) -> np.ndarray:
+        # models receiving embeddings as buffers override the array methods to
+        # skip the lists
+        if not embeddings:
+            return np.empty((0, self._config.embedding_size or 0), dtype=np.float32)
+        return np.array(embeddings, dtype=np.float32)
+
+
+class BaseSparseEmbeddingsModel(ABC):
+    """
+    Abstract base class for sparse text embedding models.
+
+    Sparse embedding models weight the vocabulary tokens of a text, e.g. SPLADE
+    or the lexical weights of bge-m3. Their embeddings are searched next to the
+    dense ones and help queries for exact keywords.
+    """
+
+    @abstractmethod
+    async def embed_queries_sparse(self, texts: list[str]) -> list[SparseVector]:
+        """
+        Generate sparse embeddings for query texts.
+
+        :param texts: List of query texts to embed.
+
+        :return: list[SparseVector]: One sparse embedding per input text.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def embed_documents_sparse(self, texts: list[str]) -> list[SparseVector]:
+        """
+        Generate sparse embeddings for document texts.
+
+        :param texts: List of document texts to embed.
+
+        :return: list[SparseVector]: One sparse embedding per input text.
+        """
+        raise NotImplementedError
+
+
+class BaseTokenEmbeddingsModel(ABC):
+    """
+    Abstract base class for token embedding models.
+
+    Token embedding models embed every token of a text, e.g. ColBERT or the
+    multi-vector output of bge-m3. A query and a document are scored by late
+    interaction: every query token is matched with its most similar document
+    token (MaxSim).
+    """
+
+    @abstractmethod
+    async def embed_queries_tokens(self, texts: list[str]) -> list[np.ndarray]:
+        """
+        Generate token embeddings for query texts.
+
+        :param texts: List of query texts to embed.
+
+        :return: list[np.ndarray]: One float32 matrix per input text, with an L2
+        normalized row per token.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def embed_documents_tokens(self, texts: list[str]) -> list[np.ndarray]:
+        """
+        Generate token embeddings for document texts.
+
+        :param texts: List of document texts to embed.
+
+        :return: list[np.ndarray]: One float32 matrix per input text, with an L2
+        normalized row per token.
+        """
+        raise NotImplementedError
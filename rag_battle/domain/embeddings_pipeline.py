@@ -1,8 +1,18 @@
+import asyncio
 import numpy as np
 
+from rag_battle.domain.chunker import BaseChunker
 from rag_battle.domain.vector_database import VectorDatabase
-from rag_battle.domain.embeddings_model import BaseEmbeddingsModel
-from rag_battle.domain.schemas import DataItemType, DataItemWithEmbedding
+from rag_battle.domain.embeddings_model import (
+    BaseEmbeddingsModel,
+    BaseSparseEmbeddingsModel,
+    BaseTokenEmbeddingsModel,
+)
+from rag_battle.domain.schemas import (
+    DataItemType,
+    DataItemWithEmbedding,
+    SparseVector,
+)
 
 
 class EmbeddingsPipeline:
@@ -18,15 +28,27 @@ class EmbeddingsPipeline:
         self,
         vector_database: VectorDatabase,
         embeddings_model: BaseEmbeddingsModel,
+        chunker: BaseChunker | None = None,
+        sparse_embeddings_model: BaseSparseEmbeddingsModel | None = None,
+        token_embeddings_model: BaseTokenEmbeddingsModel | None = None,
     ):
         """
         Initialize the embeddings pipeline with required components.
 
         :param vector_database: The database for storing vector embeddings.
         :param embeddings_model: The model that generates embeddings.
+        :param chunker: Splits long documents into separately embedded chunks.
+        None embeds every document whole.
+        :param sparse_embeddings_model: The model that generates sparse
+        embeddings for hybrid retrieval. None saves dense embeddings only.
+        :param token_embeddings_model: The model that generates token embeddings
+        for late interaction. None saves no token embeddings.
         """
         self._vector_database = vector_database
         self._embeddings_model = embeddings_model
+        self._chunker = chunker
+        self._sparse_embeddings_model = sparse_embeddings_model
+        self._token_embeddings_model = token_embeddings_model
 
     async def embed_and_save(self, documents: list[DataItemType]) -> None:
         """
@@ -44,12 +66,69 @@ class EmbeddingsPipeline:
         texts: list[str] = []
         for document in documents:
             texts.append(document.content)
-        embeddings = await self._embeddings_model.embed_documents(texts)
-        for i in range(len(documents)):
-            documents_with_embeddings.append(
-                DataItemWithEmbedding(
-                    item=documents[i],
-                    embedding=np.array(embeddings[i]),
+        if self._chunker is None:
+            embeddings, sparse_embeddings, token_embeddings = await self._embed(texts)
+            for i in range(len(documents)):
+                # rows are views of one matrix, not copies
+                documents_with_embeddings.append(
+                    DataItemWithEmbedding(
+                        item=documents[i],
+                        embedding=embeddings[i],
+                        sparse_embeddings=(
+                            [sparse_embeddings[i]]
+                            if sparse_embeddings is not None
+                            else None
+                        ),
+                        token_embeddings=(
+                            [token_embeddings[i]]
+                            if token_embeddings is not None
+                            else None
+                        ),
+                    )
                 )
+        else:
+            chunks = await self._chunker.chunk(texts)
+            embeddings, sparse_embeddings, token_embeddings = await self._embed(
+                [chunk for document_chunks in chunks for chunk in document_chunks]
             )
+            start = 0
+            for i in range(len(documents)):
+                end = start + len(chunks[i])
+                # one embedding row per chunk
+                documents_with_embeddings.append(
+                    DataItemWithEmbedding(
+                        item=documents[i],
+                        embedding=embeddings[start:end],
+                        sparse_embeddings=(
+                            sparse_embeddings[start:end]
+                            if sparse_embeddings is not None
+                            else None
+                        ),
+                        token_embeddings=(
+                            token_embeddings[start:end]
+                            if token_embeddings is not None
+                            else None
+                        ),
+                    )
+                )
+                start = end
         await self._vector_database.save_items(documents_with_embeddings)
+
+    async def _embed(
+        self, texts: list[str]
+    ) -> tuple[np.ndarray, list[SparseVector] | None, list[np.ndarray] | None]:
+        return await asyncio.gather(
+            self._embeddings_model.embed_documents_array(texts),
+            self._embed_sparse(texts),
+            self._embed_tokens(texts),
+        )
+
+    async def _embed_sparse(self, texts: list[str]) -> list[SparseVector] | None:
+        if self._sparse_embeddings_model is None:
+            return None
+        return await self._sparse_embeddings_model.embed_documents_sparse(texts)
+
+    async def _embed_tokens(self, texts: list[str]) -> list[np.ndarray] | None:
+        if self._token_embeddings_model is None:
+            return None
+        return await self._token_embeddings_model.embed_documents_tokens(texts)
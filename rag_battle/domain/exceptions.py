@@ -1,2 +1,10 @@
 class InvalidInputException(Exception):
     pass
+
+
+class OverloadedException(Exception):
+    pass
+
+
+class DeadlineExceededException(Exception):
+    pass
@@ -0,0 +1,152 @@
+import time
+import asyncio
+import dataclasses
+import numpy as np
+from abc import ABC, abstractmethod
+from loguru import logger
+from pydantic import Field
+from pydantic_settings import BaseSettings
+
+from rag_battle.domain.deadline import deadline_scope
+from rag_battle.domain.exceptions import (
+    DeadlineExceededException,
+    InvalidInputException,
+    OverloadedException,
+)
+from rag_battle.domain.retriever import BaseRetriever
+from rag_battle.domain.schemas import RAGQuery, ScoredItem
+
+
+class RerankConfig(BaseSettings):
+    enabled: bool = Field(
+        default=False,
+        validation_alias="RERANK",
+        description=(
+            "Whether queries are reranked unless they ask otherwise. Needs a "
+            "reranker service."
+        ),
+    )
+    num_candidates: int = Field(
+        default=50,
+        validation_alias="RERANK_NUM_CANDIDATES",
+        description=(
+            "Number of items retrieved for reranking, the best `num_items` of "
+            "them are returned."
+        ),
+    )
+    max_candidates: int = Field(
+        default=1000,
+        validation_alias="RERANK_MAX_CANDIDATES",
+        description=(
+            "Largest number of items reranked per query. Queries asking for more "
+            "`rerank_candidates` are rejected, further items of queries asking "
+            "for more `num_items` follow the reranked ones in retrieval order."
+        ),
+    )
+    budget_ms: float = Field(
+        default=200.0,
+        validation_alias="RERANK_BUDGET_MS",
+        description=(
+            "Time reranking may take before the items are returned in retrieval "
+            "order. 0 waits for the reranker until the request deadline."
+        ),
+    )
+
+
+class BaseReranker(ABC):
+    """
+    Abstract base class for rerankers.
+
+    Rerankers score how relevant texts are to a query, usually with a
+    cross-encoder that reads the query and a text together. That is more
+    accurate than comparing embeddings, and too slow for more than the
+    candidates of a retrieval.
+    """
+
+    @abstractmethod
+    async def rerank(self, query: str, texts: list[str]) -> np.ndarray:
+        """
+        Score the relevance of texts to a query.
+
+        :param query: The query text.
+        :param texts: Texts to score.
+
+        :return: np.ndarray: float32 scores of the texts in their order, higher
+        is more relevant.
+        """
+        raise NotImplementedError
+
+
+class RerankStage:
+    """
+    Retrieval followed by reranking.
+
+    Queries retrieve more candidates than they ask for, which the reranker
+    orders before they are cut to `num_items`. At most `max_candidates` items
+    are reranked, the rest of a larger `num_items` follows them in retrieval
+    order. A reranking that takes longer than its budget, or that the reranker
+    rejects as overloaded, returns the candidates in retrieval order instead.
+    """
+
+    def __init__(self, reranker: BaseReranker | None, config: RerankConfig):
+        """
+        :param reranker: The component reordering the retrieved items. None
+        rejects queries asking for reranking.
+        :param config: When and how many items to rerank.
+        """
+        self._reranker = reranker
+        self._config = config
+
+    async def retrieve(
+        self, retriever: BaseRetriever, query: RAGQuery
+    ) -> list[ScoredItem]:
+        rerank = self._config.enabled if query.rerank is None else query.rerank
+        if not rerank:
+            return await retriever.retrieve(query=query)
+        if self._reranker is None:
+            raise InvalidInputException("Reranking is not configured.")
+        num_candidates = query.rerank_candidates or self._config.num_candidates
+        if num_candidates > self._config.max_candidates:
+            raise InvalidInputException(
+                f"Reranking {num_candidates} candidates, more than "
+                f"{self._config.max_candidates}."
+            )
+        candidates = await retriever.retrieve(
+            query=dataclasses.replace(
+                query, num_items=max(query.num_items, num_candidates)
+            )
+        )
+        # the cost of a cross-encoder grows with the texts it reads
+        num_reranked = min(len(candidates), self._config.max_candidates)
+        reranked = await self._rerank(query.query, candidates[:num_reranked])
+        return (reranked + candidates[num_reranked:])[: query.num_items]
+
+    async def _rerank(self, query: str, items: list[ScoredItem]) -> list[ScoredItem]:
+        start_time = time.time()
+        budget_ms = self._config.budget_ms
+        budget = budget_ms / 1000 if budget_ms > 0 else None
+        try:
+            # the deadline bounds the calls of the reranker, the timeout also
+            # its waiting for them
+            with deadline_scope(budget):
+                async with asyncio.timeout(budget):
+                    scores = await self._reranker.rerank(
+                        query, [scored_item.item.content for scored_item in items]
+                    )
+        except (DeadlineExceededException, OverloadedException, TimeoutError) as e:
+            logger.warning(
+                f"Reranking skipped, keeping the retrieval order: "
+                f"{str(e) or 'budget exceeded'}"
+            )
+            return items
+        end_time = time.time()
+        logger.info(
+            f"Rerank {len(items)} items executing time: "
+            f"{end_time - start_time:.3f} s."
+        )
+        reranked = [
+            ScoredItem(item=scored_item.item, score=score)
+            for scored_item, score in zip(items, scores.tolist())
+        ]
+        reranked.sort(key=lambda scored_item: scored_item.score, reverse=True)
+        return reranked
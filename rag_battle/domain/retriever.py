@@ -1,7 +1,11 @@
 from abc import ABC, abstractmethod
-from rag_battle.domain.schemas import RAGQuery
-from rag_battle.domain.embeddings_model import BaseEmbeddingsModel
-from rag_battle.domain.vector_database import VectorDatabase, DataItemType
+from rag_battle.domain.schemas import RAGQuery, ScoredItem
+from rag_battle.domain.embeddings_model import (
+    BaseEmbeddingsModel,
+    BaseSparseEmbeddingsModel,
+    BaseTokenEmbeddingsModel,
+)
+from rag_battle.domain.vector_database import VectorDatabase
 
 
 class BaseRetriever(ABC):
@@ -18,23 +22,33 @@ class BaseRetriever(ABC):
         self,
         embeddings_model: BaseEmbeddingsModel,
         vector_database: VectorDatabase,
+        sparse_embeddings_model: BaseSparseEmbeddingsModel | None = None,
+        token_embeddings_model: BaseTokenEmbeddingsModel | None = None,
     ):
         """
         Initialize the retriever with embedding model and vector database.
 
         :param embeddings_model: The model used to convert text to vector embeddings.
         :param vector_database: The database that stores and retrieves vectors.
+        :param sparse_embeddings_model: The model that converts text to sparse
+        embeddings for hybrid retrieval. None retrieves by dense vectors only.
+        :param token_embeddings_model: The model that converts text to token
+        embeddings, which rescore the nearest dense vectors by late interaction.
+        None keeps the dense scores.
         """
         self._embeddings_model = embeddings_model
         self._vector_database = vector_database
+        self._sparse_embeddings_model = sparse_embeddings_model
+        self._token_embeddings_model = token_embeddings_model
 
     @abstractmethod
-    async def retrieve(self, query: RAGQuery) -> list[DataItemType]:
+    async def retrieve(self, query: RAGQuery) -> list[ScoredItem]:
         """
         Retrieve relevant documents based on the provided query.
 
         :param query: The query object containing search text and parameters.
 
-        :return: list[DataItemType]: A list of retrieved items ordered by relevance.
+        :return: list[ScoredItem]: A list of retrieved items with their scores
+        ordered by relevance.
         """
         raise NotImplementedError
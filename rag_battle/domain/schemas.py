@@ -16,6 +16,12 @@ class RAGQuery:
     tags: list[str]  # Tags to filter documents by
     num_items: int  # Maximum number of items to retrieve
     remove_duplicates: bool = True  # Whether to deduplicate results
+    # Backend specific search parameters, e.g. {"nprobe": 16}
+    search_params: dict[str, int] | None = None
+    # Whether to rerank the items, None for the server default
+    rerank: bool | None = None
+    # Number of items retrieved for reranking, None for the server default
+    rerank_candidates: int | None = None
 
 
 @dataclass
@@ -24,14 +30,54 @@ class DataItem:
     Represents a document or content item in the RAG system.
 
     This class stores the content and metadata of items that can be retrieved
-    during RAG operations. It includes the actual text content, a unique identifier,
-    categorization tags, and an optional relevance score.
+    during RAG operations. It includes the actual text content, a unique identifier
+    and categorization tags. Retrieved items come back as ScoredItem.
     """
 
     item_id: str  # Unique identifier for the item
     content: str  # The text content of the item
     tags: list[str]  # Categorization tags for filtering
-    score: float | None = None  # Relevance score (populated during retrieval)
+
+
+@dataclass(frozen=True, slots=True)
+class StoredItem:
+    """
+    Immutable representation of an item stored in a vector database.
+
+    Stored items are shared between queries instead of being copied, so they
+    must never be mutated.
+    """
+
+    item_id: str  # Unique identifier for the item
+    content: str  # The text content of the item
+    tags: tuple[str, ...]  # Categorization tags for filtering
+
+    @classmethod
+    def from_data_item(cls, item: DataItem) -> "StoredItem":
+        return cls(item_id=item.item_id, content=item.content, tags=tuple(item.tags))
+
+
+@dataclass(frozen=True, slots=True)
+class ScoredItem:
+    """
+    A stored item retrieved by a query together with its relevance score.
+    """
+
+    item: StoredItem  # The retrieved item, shared with the database
+    score: float  # Relevance score of the item for the query
+
+
+@dataclass(frozen=True, slots=True)
+class SparseVector:
+    """
+    A sparse embedding, holding only its non-zero dimensions.
+
+    Sparse embeddings weight the vocabulary tokens of a text, so they match
+    exact keywords that dense embeddings may miss.
+    """
+
+    indices: np.ndarray  # int64 non-zero dimensions, e.g. token ids
+    values: np.ndarray  # float32 weights of the dimensions
 
 
 @dataclass
@@ -44,7 +90,13 @@ class DataItemWithEmbedding:
     """
 
     item: DataItem  # The base data item
-    embedding: np.ndarray  # Vector embedding of the item's content
+    # Vector embedding of the item's content, or one row per chunk of it
+    embedding: np.ndarray
+    # Sparse embeddings of the item's content, one per embedding row, if any
+    sparse_embeddings: list[SparseVector] | None = None
+    # Token embeddings of the item's content, a (tokens, size) matrix per
+    # embedding row, if any
+    token_embeddings: list[np.ndarray] | None = None
 
 
 DataItemType = TypeVar("DataItemType", bound=DataItem)
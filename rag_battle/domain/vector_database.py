@@ -1,7 +1,12 @@
 import numpy as np
 from abc import ABC, abstractmethod
 from typing import Generic
-from rag_battle.domain.schemas import DataItemType, DataItemWithEmbeddingType
+from rag_battle.domain.schemas import (
+    DataItemType,
+    DataItemWithEmbeddingType,
+    ScoredItem,
+    SparseVector,
+)
 
 
 class VectorDatabase(Generic[DataItemType], ABC):
@@ -25,7 +30,18 @@ class VectorDatabase(Generic[DataItemType], ABC):
         Save multiple items with their embeddings to the vector database.
 
         :param items_with_embeddings: List of data items with their corresponding
-        vector embeddings to be stored.
+        vector embeddings to be stored. A 2D embedding holds one vector per chunk
+        of a chunked item, the item is then scored by its best matching chunks.
+        Sparse embeddings are stored for hybrid queries.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_items(self, item_ids: list[str]) -> None:
+        """
+        Delete items from the vector database.
+
+        :param item_ids: Ids of the items to delete. Unknown ids are ignored.
         """
         raise NotImplementedError
 
@@ -36,16 +52,38 @@ class VectorDatabase(Generic[DataItemType], ABC):
         tags: list[str],
         num_items: int,
         remove_duplicates: bool,
-    ) -> list[DataItemType]:
+        search_params: dict[str, int] | None = None,
+        sparse_query_embeddings: list[SparseVector] | None = None,
+        token_query_embeddings: list[np.ndarray] | None = None,
+    ) -> list[ScoredItem]:
         """
         Query the vector database for items similar to the provided embeddings.
 
         :param query_embeddings: The vector representations of the query.
-        :param tags: Tags to filter documents by.
+        :param tags: Tags to filter documents by. An empty list searches all
+        documents.
         :param num_items: Maximum number of items to return.
         :param remove_duplicates: Whether to remove duplicate results.
+        :param search_params: Backend specific search parameters trading recall
+        for latency, e.g. the number of probed clusters.
+        :param sparse_query_embeddings: Sparse representations of the query, one
+        per query embedding. Items saved with sparse embeddings are then also
+        searched by them and both results are fused.
+        :param token_query_embeddings: Token embeddings of the query, one matrix
+        per query embedding. The nearest items saved with token embeddings are
+        then rescored by late interaction.
 
-        :return: list[DataItemType]: A list of retrieved items ordered by similarity.
+        :return: list[ScoredItem]: A list of retrieved items with their scores
+        ordered by similarity.
 
         """
         raise NotImplementedError
+
+    async def close(self) -> None:
+        """
+        Release resources held by the database.
+
+        Called once on application shutdown. Databases keeping state in process
+        memory may use it to persist that state.
+        """
+        return None
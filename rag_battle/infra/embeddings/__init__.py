@@ -1,7 +1,39 @@
 from rag_battle.infra.embeddings.mock import MockEmbeddingsModel
 from rag_battle.infra.embeddings.tei import TEIEmbeddingsModel
+from rag_battle.infra.embeddings.batching import (
+    BatchingEmbeddingsModel,
+    EmbeddingsBatchingConfig,
+)
+from rag_battle.infra.embeddings.cache import (
+    CachingEmbeddingsModel,
+    EmbeddingsCacheConfig,
+)
+from rag_battle.infra.embeddings.document_cache import (
+    DocumentCachingEmbeddingsModel,
+    DocumentEmbeddingsCacheConfig,
+)
+from rag_battle.infra.embeddings.config import (
+    EmbeddingsBackendConfig,
+    LateInteractionConfig,
+    SparseEmbeddingsConfig,
+)
+from rag_battle.infra.embeddings.hashing import (
+    HashingEmbeddingsModel,
+    HashingEmbeddingsModelConfig,
+)
 
 __all__ = [
     "MockEmbeddingsModel",
     "TEIEmbeddingsModel",
+    "BatchingEmbeddingsModel",
+    "EmbeddingsBatchingConfig",
+    "CachingEmbeddingsModel",
+    "EmbeddingsCacheConfig",
+    "DocumentCachingEmbeddingsModel",
+    "DocumentEmbeddingsCacheConfig",
+    "EmbeddingsBackendConfig",
+    "SparseEmbeddingsConfig",
+    "LateInteractionConfig",
+    "HashingEmbeddingsModel",
+    "HashingEmbeddingsModelConfig",
 ]
@@ -0,0 +1,153 @@
+import time
+import asyncio
+import contextvars
+import numpy as np
+from dataclasses import dataclass, field
+from loguru import logger
+from pydantic import Field
+from pydantic_settings import BaseSettings
+
+from rag_battle.domain import deadline
+from rag_battle.domain.embeddings_model import BaseEmbeddingsModel
+from rag_battle.domain.exceptions import (
+    DeadlineExceededException,
+    InvalidInputException,
+)
+
+
+class EmbeddingsBatchingConfig(BaseSettings):
+    max_wait_ms: float = Field(
+        default=0.0,
+        validation_alias="EMBEDDINGS_BATCH_MAX_WAIT_MS",
+        description=(
+            "Milliseconds a query waits for concurrent queries to be embedded "
+            "in one request with. 0 embeds every query on its own."
+        ),
+    )
+    max_size: int = Field(
+        default=32,
+        validation_alias="EMBEDDINGS_BATCH_MAX_SIZE",
+        description="Number of texts that sends a batch early.",
+    )
+
+
+@dataclass
+class _Batch:
+    requests: list[tuple[list[str], asyncio.Future]] = field(default_factory=list)
+    size: int = 0
+    timer: asyncio.TimerHandle | None = None
+    # deadlines of the callers, None for callers without one
+    deadlines: list[float | None] = field(default_factory=list)
+
+
+class BatchingEmbeddingsModel(BaseEmbeddingsModel):
+    """
+    Coalesces concurrent `embed_queries` calls into batched calls of a wrapped
+    model.
+
+    Texts of calls arriving within `max_wait_ms` of the first one are sent in one
+    request, and every caller gets the embeddings of its own texts back. A batch
+    is sent early once it holds `max_size` texts. Documents are ingested in
+    batches already and go straight to the wrapped model.
+
+    A batch is embedded under the latest deadline of its callers, not the one of
+    the caller that happened to send it, and every caller waits for it within
+    its own deadline.
+    """
+
+    def __init__(self, model: BaseEmbeddingsModel, config: EmbeddingsBatchingConfig):
+        super().__init__(config=model.config)
+        self._model = model
+        self._max_wait = config.max_wait_ms / 1000
+        self._max_size = config.max_size
+        self._batch: _Batch | None = None
+        # keep references to running batches, the loop only holds weak ones
+        self._tasks: set[asyncio.Task] = set()
+
+    async def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        return (await self.embed_queries_array(texts)).tolist()
+
+    async def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self._model.embed_documents(texts)
+
+    async def embed_queries_array(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return self._to_array([])
+        loop = asyncio.get_running_loop()
+        if self._batch is None:
+            self._batch = _Batch()
+            self._batch.timer = loop.call_later(self._max_wait, self._send)
+        future = loop.create_future()
+        self._batch.requests.append((texts, future))
+        self._batch.deadlines.append(deadline.current())
+        self._batch.size += len(texts)
+        if self._batch.size >= self._max_size:
+            self._batch.timer.cancel()
+            self._send()
+        try:
+            async with asyncio.timeout(deadline.remaining()):
+                return await future
+        except TimeoutError:
+            raise DeadlineExceededException(
+                "Request deadline exceeded waiting for an embeddings batch."
+            ) from None
+
+    async def embed_documents_array(self, texts: list[str]) -> np.ndarray:
+        return await self._model.embed_documents_array(texts)
+
+    def _send(self) -> None:
+        batch, self._batch = self._batch, None
+        # the task would copy the context of whoever sends the batch, a timer
+        # callback or the caller filling it, and run under its deadline
+        task = asyncio.create_task(
+            self._embed_batch(batch.requests, batch.deadlines),
+            context=contextvars.Context(),
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _embed_batch(
+        self,
+        requests: list[tuple[list[str], asyncio.Future]],
+        deadlines: list[float | None],
+    ) -> None:
+        timeout = None
+        if None not in deadlines:
+            timeout = max(deadlines) - time.monotonic()
+        with deadline.deadline_scope(timeout):
+            await self._embed(requests)
+
+    async def _embed(self, requests: list[tuple[list[str], asyncio.Future]]) -> None:
+        try:
+            embeddings = await self._model.embed_queries_array(
+                [text for texts, _ in requests for text in texts]
+            )
+        except InvalidInputException as e:
+            if len(requests) > 1:
+                # one invalid text must not fail the other callers of the batch
+                logger.info(
+                    f"Embeddings batch of {len(requests)} requests rejected, "
+                    f"embedding them one by one."
+                )
+                await asyncio.gather(*(self._embed([request]) for request in requests))
+                return
+            self._fail(requests, e)
+            return
+        except Exception as e:
+            self._fail(requests, e)
+            return
+        # every caller gets a view of its rows
+        start = 0
+        for texts, future in requests:
+            end = start + len(texts)
+            if not future.done():
+                future.set_result(embeddings[start:end])
+            start = end
+
+    @staticmethod
+    def _fail(
+        requests: list[tuple[list[str], asyncio.Future]], exception: Exception
+    ) -> None:
+        for _, future in requests:
+            if not future.done():
+                future.set_exception(exception)
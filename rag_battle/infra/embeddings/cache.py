@@ -0,0 +1,138 @@
+import time
+import unicodedata
+import numpy as np
+from collections import OrderedDict
+from pydantic import Field
+from pydantic_settings import BaseSettings
+
+from rag_battle.domain.embeddings_model import BaseEmbeddingsModel
+
+
+class EmbeddingsCacheConfig(BaseSettings):
+    max_bytes: int = Field(
+        default=0,
+        validation_alias="EMBEDDINGS_CACHE_MAX_BYTES",
+        description=(
+            "Memory budget of cached query embeddings in bytes. 0 disables the "
+            "cache."
+        ),
+    )
+    ttl_s: float | None = Field(
+        default=None,
+        validation_alias="EMBEDDINGS_CACHE_TTL_S",
+        description="Seconds a cached embedding stays valid. None keeps it forever.",
+    )
+
+
+def normalize_query(text: str) -> str:
+    """Normalize unicode and collapse whitespace of a query."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class CachingEmbeddingsModel(BaseEmbeddingsModel):
+    """
+    Caches query embeddings of a wrapped model.
+
+    Embeddings are keyed on the model name and the normalized query and stored
+    as float16 arrays. Least recently used embeddings are evicted once the cache
+    outgrows `max_bytes`, and embeddings older than `ttl_s` are embedded again.
+    Queries missing from the cache are embedded in one call. Document
+    embeddings are not cached, as documents are embedded once on ingestion.
+
+    Normalization is part of the key: queries differing only in unicode form or
+    whitespace share the embedding of the first of them, which is embedded as
+    sent. Embeddings are returned float16 rounded on misses as on hits, so a
+    query gets the same embedding whether it was cached or not.
+    """
+
+    def __init__(self, model: BaseEmbeddingsModel, config: EmbeddingsCacheConfig):
+        super().__init__(config=model.config)
+        self._model = model
+        self._max_bytes = config.max_bytes
+        self._ttl = config.ttl_s
+        # key -> (expiration time, embedding), least recently used first
+        self._entries: OrderedDict[tuple[str, str], tuple[float, np.ndarray]] = (
+            OrderedDict()
+        )
+        self._size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def size(self) -> int:
+        """Bytes taken by the cached embeddings."""
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        return (await self.embed_queries_array(texts)).tolist()
+
+    async def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self._model.embed_documents(texts)
+
+    async def embed_queries_array(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return self._to_array([])
+        now = time.monotonic()
+        keys = [(self.config.model_name, normalize_query(text)) for text in texts]
+        cached: list[np.ndarray | None] = []
+        missing: dict[tuple[str, str], list[int]] = {}
+        for i, key in enumerate(keys):
+            embedding = self._get(key, now)
+            if embedding is None:
+                missing.setdefault(key, []).append(i)
+            cached.append(embedding)
+        self.hits += len(texts) - sum(len(positions) for positions in missing.values())
+        self.misses += len(missing)
+
+        computed = None
+        if missing:
+            computed = await self._model.embed_queries_array(
+                [texts[positions[0]] for positions in missing.values()]
+            )
+            # rounded like the cached ones
+            computed = computed.astype(np.float16)
+            for key, embedding in zip(missing.keys(), computed):
+                self._put(key, embedding, now)
+        embedding_size = (computed if computed is not None else cached[0]).shape[-1]
+        embeddings = np.empty((len(texts), embedding_size), dtype=np.float32)
+        for i, embedding in enumerate(cached):
+            if embedding is not None:
+                embeddings[i] = embedding
+        if computed is not None:
+            for positions, embedding in zip(missing.values(), computed):
+                embeddings[positions] = embedding
+        return embeddings
+
+    async def embed_documents_array(self, texts: list[str]) -> np.ndarray:
+        return await self._model.embed_documents_array(texts)
+
+    def _get(self, key: tuple[str, str], now: float) -> np.ndarray | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, embedding = entry
+        if expires_at <= now:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return embedding
+
+    def _put(self, key: tuple[str, str], embedding: np.ndarray, now: float) -> None:
+        expires_at = now + self._ttl if self._ttl is not None else float("inf")
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, embedding)
+        self._size += self._entry_size(key, embedding)
+        while self._size > self._max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: tuple[str, str]) -> None:
+        _, embedding = self._entries.pop(key)
+        self._size -= self._entry_size(key, embedding)
+
+    @staticmethod
+    def _entry_size(key: tuple[str, str], embedding: np.ndarray) -> int:
+        return embedding.nbytes + len(key[1])
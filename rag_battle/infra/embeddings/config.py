@@ -0,0 +1,36 @@
+from typing import Literal
+from pydantic import Field
+from pydantic_settings import BaseSettings
+
+
+class EmbeddingsBackendConfig(BaseSettings):
+    backend: Literal["tei", "hashing"] = Field(
+        default="tei",
+        validation_alias="EMBEDDINGS_BACKEND",
+        description=(
+            "Model computing the embeddings: a Text Embeddings Inference server, "
+            "or in-process hashed n-gram features for benchmarks without a GPU."
+        ),
+    )
+
+
+class SparseEmbeddingsConfig(BaseSettings):
+    enabled: bool = Field(
+        default=False,
+        validation_alias="EMBEDDINGS_SPARSE",
+        description=(
+            "Whether documents and queries also get sparse embeddings for hybrid "
+            "retrieval. A TEI backend must serve a model with SPLADE pooling."
+        ),
+    )
+
+
+class LateInteractionConfig(BaseSettings):
+    enabled: bool = Field(
+        default=False,
+        validation_alias="EMBEDDINGS_LATE_INTERACTION",
+        description=(
+            "Whether documents and queries also get token embeddings, which "
+            "rescore the nearest dense vectors by late interaction (MaxSim)."
+        ),
+    )
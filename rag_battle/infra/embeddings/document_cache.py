@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from loguru import logger
+from pydantic import Field
+from pydantic_settings import BaseSettings
+
+from rag_battle.domain.embeddings_model import BaseEmbeddingsModel
+
+
+class DocumentEmbeddingsCacheConfig(BaseSettings):
+    path: str | None = Field(
+        default=None,
+        validation_alias="EMBEDDINGS_DOCUMENT_CACHE_PATH",
+        description=(
+            "SQLite file caching dense document embeddings by content hash. "
+            "Sparse and token embeddings (EMBEDDINGS_SPARSE, "
+            "EMBEDDINGS_LATE_INTERACTION) are not cached and still computed "
+            "for every ingested document. Empty disables the cache."
+        ),
+    )
+
+
+def content_hash(model_name: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model_name}\0{text}".encode()).digest()
+
+
+class DocumentEmbeddingsStore:
+    """
+    SQLite file of float16 embeddings keyed by a hash of the model and content.
+
+    Calls are blocking and serialized, run them in a thread.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(hash BLOB PRIMARY KEY, embedding BLOB NOT NULL) WITHOUT ROWID"
+            )
+
+    def get(self, hashes: list[bytes]) -> dict[bytes, np.ndarray]:
+        found: dict[bytes, np.ndarray] = {}
+        with self._lock:
+            # stay below the default limit of 999 bound parameters
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start : start + 500]
+                rows = self._connection.execute(
+                    f"SELECT hash, embedding FROM embeddings "
+                    f"WHERE hash IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float16)
+        return found
+
+    def put(self, embeddings: dict[bytes, np.ndarray]) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (hash, embedding) VALUES (?, ?)",
+                [
+                    (key, embedding.astype(np.float16).tobytes())
+                    for key, embedding in embeddings.items()
+                ],
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class DocumentCachingEmbeddingsModel(BaseEmbeddingsModel):
+    """
+    Persistently caches document embeddings of a wrapped model.
+
+    Documents are looked up by a hash of the model name and their content, so
+    re-ingesting unchanged documents skips the embeddings model and only new or
+    changed documents are embedded. Cached embeddings are float16, which keeps
+    the file small at a precision well below the differences between unrelated
+    documents. Embeddings computed on a miss are rounded the same way, so a
+    document gets the same embedding whether it was cached or not.
+
+    Only the dense embeddings are cached, the sparse and token embeddings of
+    the wrapped model are not.
+    """
+
+    def __init__(
+        self, model: BaseEmbeddingsModel, config: DocumentEmbeddingsCacheConfig
+    ):
+        super().__init__(config=model.config)
+        self._model = model
+        self._store = DocumentEmbeddingsStore(config.path)
+        logger.info(f"Document embeddings cache: `{config.path}`.")
+
+    async def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        return await self._model.embed_queries(texts)
+
+    async def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return (await self.embed_documents_array(texts)).tolist()
+
+    async def embed_queries_array(self, texts: list[str]) -> np.ndarray:
+        return await self._model.embed_queries_array(texts)
+
+    async def embed_documents_array(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return self._to_array([])
+        hashes = [content_hash(self.config.model_name, text) for text in texts]
+        cached = await asyncio.to_thread(self._store.get, list(set(hashes)))
+        num_cached = sum(key in cached for key in hashes)
+        # embed every missing content once
+        missing = {key: text for key, text in zip(hashes, texts) if key not in cached}
+        if missing:
+            computed = await self._model.embed_documents_array(list(missing.values()))
+            embeddings = {
+                key: embedding.astype(np.float16)
+                for key, embedding in zip(missing.keys(), computed)
+            }
+            await asyncio.to_thread(self._store.put, embeddings)
+            # rounded like the cached ones
+            cached.update(embeddings)
+        logger.info(
+            f"Document embeddings cache: {num_cached} of "
+            f"{len(texts)} documents cached."
+        )
+        return np.stack([cached[key] for key in hashes]).astype(np.float32)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self._store.close)
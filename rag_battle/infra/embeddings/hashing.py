@@ -0,0 +1,248 @@
+import re
+import zlib
+import asyncio
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from numpy.lib.stride_tricks import sliding_window_view
+from pydantic import Field
+
+from rag_battle.domain.embeddings_model import (
+    BaseEmbeddingsModel,
+    BaseSparseEmbeddingsModel,
+    BaseTokenEmbeddingsModel,
+    EmbeddingsModelConfig,
+)
+from rag_battle.domain.exceptions import InvalidInputException
+from rag_battle.domain.schemas import SparseVector
+
+# number of signed buckets every n-gram is projected onto
+NUM_PROJECTIONS = 4
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+# dimensions of sparse embeddings, the size of a typical wordpiece vocabulary
+SPARSE_VOCAB_SIZE = 30_000
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class HashingEmbeddingsModelConfig(EmbeddingsModelConfig):
+    model_name: str = Field(
+        default="hashing",
+        description="The name or identifier of the embedding model.",
+    )
+    embedding_size: int = Field(
+        default=None,
+        validation_alias="EMBEDDINGS_SIZE",
+        description="The dimension size of the generated embeddings.",
+    )
+    min_ngram: int = Field(
+        default=3,
+        validation_alias="EMBEDDINGS_HASHING_MIN_NGRAM",
+        description="Length in bytes of the shortest hashed n-grams.",
+    )
+    max_ngram: int = Field(
+        default=5,
+        validation_alias="EMBEDDINGS_HASHING_MAX_NGRAM",
+        description="Length in bytes of the longest hashed n-grams.",
+    )
+    max_input_length: int = Field(
+        default=100_000,
+        validation_alias="EMBEDDINGS_HASHING_MAX_INPUT_LENGTH",
+        description=(
+            "Number of characters of the longest accepted text. Longer texts are "
+            "rejected like a served model rejects them."
+        ),
+    )
+    num_workers: int = Field(
+        default=0,
+        validation_alias="EMBEDDINGS_HASHING_NUM_WORKERS",
+        description=(
+            "Processes embedding large batches. 0 embeds in a thread of the "
+            "server process."
+        ),
+    )
+    min_pool_batch_size: int = Field(
+        default=256,
+        validation_alias="EMBEDDINGS_HASHING_MIN_POOL_BATCH_SIZE",
+        description="Number of texts from which a batch is split over workers.",
+    )
+
+
+def _mix(h: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, spreads n-gram hashes over all 64 bits."""
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+def _ngram_hashes(text: str, min_ngram: int, max_ngram: int) -> np.ndarray:
+    data = np.frombuffer(f" {text.lower()} ".encode(), dtype=np.uint8)
+    hashes = []
+    for n in range(min_ngram, max_ngram + 1):
+        if len(data) < n:
+            break
+        windows = sliding_window_view(data, n).astype(np.uint64)
+        # polynomial hash of every window, wrapping around 2**64
+        h = np.full(len(windows), np.uint64(n))
+        for i in range(n):
+            h = h * _GOLDEN + windows[:, i]
+        hashes.append(_mix(h))
+    if not hashes:
+        return np.empty(0, dtype=np.uint64)
+    return np.concatenate(hashes)
+
+
+def embed_texts(
+    texts: list[str], embedding_size: int, min_ngram: int, max_ngram: int
+) -> np.ndarray:
+    """
+    Embed texts into L2 normalized hashed n-gram features.
+
+    Every byte n-gram adds ±1 to NUM_PROJECTIONS buckets picked by its hash,
+    which is a sparse random projection of the n-gram counts, so texts sharing
+    n-grams get similar embeddings.
+    """
+    embeddings = np.zeros((len(texts), embedding_size), dtype=np.float32)
+    with np.errstate(over="ignore"):
+        for i, text in enumerate(texts):
+            h = _ngram_hashes(text, min_ngram, max_ngram)
+            if len(h) == 0:
+                continue
+            for j in range(NUM_PROJECTIONS):
+                h = _mix(h + np.uint64(j))
+                buckets = (h % np.uint64(embedding_size)).astype(np.int64)
+                signs = np.where(h >> np.uint64(63), -1.0, 1.0)
+                embeddings[i] += np.bincount(
+                    buckets, weights=signs, minlength=embedding_size
+                )
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    np.divide(embeddings, norms, out=embeddings, where=norms > 0)
+    return embeddings
+
+
+def embed_texts_sparse(texts: list[str]) -> list[SparseVector]:
+    """
+    Embed texts into sparse vectors of hashed lowercase words, weighted by the
+    logarithm of their counts.
+    """
+    vectors = []
+    for text in texts:
+        words = WORD_PATTERN.findall(text.lower())
+        indices, counts = np.unique(
+            np.array(
+                [zlib.crc32(word.encode()) % SPARSE_VOCAB_SIZE for word in words],
+                dtype=np.int64,
+            ),
+            return_counts=True,
+        )
+        vectors.append(
+            SparseVector(indices=indices, values=np.log1p(counts).astype(np.float32))
+        )
+    return vectors
+
+
+def embed_texts_tokens(
+    texts: list[str], embedding_size: int, min_ngram: int, max_ngram: int
+) -> list[np.ndarray]:
+    """
+    Embed the words of texts into hashed n-gram features, one matrix with a
+    row per word for every text.
+    """
+    words = [WORD_PATTERN.findall(text) for text in texts]
+    embeddings = embed_texts(
+        [word for text_words in words for word in text_words],
+        embedding_size,
+        min_ngram,
+        max_ngram,
+    )
+    ends = np.cumsum([len(text_words) for text_words in words])
+    return np.split(embeddings, ends[:-1]) if len(texts) else []
+
+
+class HashingEmbeddingsModel(
+    BaseEmbeddingsModel[HashingEmbeddingsModelConfig],
+    BaseSparseEmbeddingsModel,
+    BaseTokenEmbeddingsModel,
+):
+    """
+    Deterministic CPU embeddings from hashed character n-grams.
+
+    Texts sharing words and word fragments score higher than unrelated ones, so
+    retrieval can be load and recall tested without a GPU. Large batches are
+    split over a process pool, other batches are embedded in a thread to keep
+    the event loop free. Sparse embeddings weight hashed words, token
+    embeddings embed every word on its own.
+    """
+
+    def __init__(self, config: HashingEmbeddingsModelConfig):
+        super().__init__(config=config)
+        self._executor: ProcessPoolExecutor | None = None
+
+    async def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        return (await self._embed(texts)).tolist()
+
+    async def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return (await self._embed(texts)).tolist()
+
+    async def embed_queries_array(self, texts: list[str]) -> np.ndarray:
+        return await self._embed(texts)
+
+    async def embed_documents_array(self, texts: list[str]) -> np.ndarray:
+        return await self._embed(texts)
+
+    async def embed_queries_sparse(self, texts: list[str]) -> list[SparseVector]:
+        return await asyncio.to_thread(embed_texts_sparse, texts)
+
+    async def embed_documents_sparse(self, texts: list[str]) -> list[SparseVector]:
+        return await self.embed_queries_sparse(texts)
+
+    async def embed_queries_tokens(self, texts: list[str]) -> list[np.ndarray]:
+        config = self.config
+        return await asyncio.to_thread(
+            embed_texts_tokens,
+            texts,
+            config.embedding_size,
+            config.min_ngram,
+            config.max_ngram,
+        )
+
+    async def embed_documents_tokens(self, texts: list[str]) -> list[np.ndarray]:
+        return await self.embed_queries_tokens(texts)
+
+    async def _embed(self, texts: list[str]) -> np.ndarray:
+        config = self.config
+        for text in texts:
+            if len(text) > config.max_input_length:
+                raise InvalidInputException(
+                    f"Input of {len(text)} characters is longer than "
+                    f"{config.max_input_length} characters."
+                )
+        args = (config.embedding_size, config.min_ngram, config.max_ngram)
+        if config.num_workers == 0 or len(texts) < config.min_pool_batch_size:
+            return await asyncio.to_thread(embed_texts, texts, *args)
+
+        if self._executor is None:
+            # forking a process running an event loop and threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=config.num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        loop = asyncio.get_running_loop()
+        batch_size = -(-len(texts) // config.num_workers)
+        batches = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    self._executor,
+                    embed_texts,
+                    texts[start : start + batch_size],
+                    *args,
+                )
+                for start in range(0, len(texts), batch_size)
+            )
+        )
+        return np.concatenate(batches)
+
+    def close(self) -> None:
+        """Shut the process pool down, it is started again on the next large batch."""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
@@ -18,3 +18,34 @@ class TEIService(Service):
         validation_alias="EMBEDDINGS_PORT",
         description="Text embeddings inference service port number.",
     )
+    num_channels: int = Field(
+        default=4,
+        validation_alias="EMBEDDINGS_NUM_CHANNELS",
+        description="Number of gRPC connections kept open to the service.",
+    )
+    keepalive_time_ms: int = Field(
+        default=30_000,
+        validation_alias="EMBEDDINGS_KEEPALIVE_TIME_MS",
+        description="Interval of keepalive pings on idle connections.",
+    )
+    keepalive_timeout_ms: int = Field(
+        default=10_000,
+        validation_alias="EMBEDDINGS_KEEPALIVE_TIMEOUT_MS",
+        description="Time to wait for a keepalive ping ack before reconnecting.",
+    )
+
+
+class TEIRerankerService(TEIService):
+    host: str | None = Field(
+        default=None,
+        validation_alias="RERANKER_HOST",
+        description=(
+            "Text embeddings inference service serving a reranker model. Unset "
+            "disables reranking."
+        ),
+    )
+    port: int | None = Field(
+        default=None,
+        validation_alias="RERANKER_PORT",
+        description="Reranker service port number.",
+    )
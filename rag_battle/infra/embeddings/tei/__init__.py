@@ -1,7 +1,13 @@
 from rag_battle.infra.embeddings.tei.model import TEIEmbeddingsModel
-from rag_battle.infra.embeddings.tei.config import TEIEmbeddingsModelConfig
+from rag_battle.infra.embeddings.tei.config import (
+    TEIChunkerConfig,
+    TEIEmbeddingsModelConfig,
+)
+from rag_battle.infra.embeddings.tei.chunker import TEIChunker
 
 __all__ = [
     "TEIEmbeddingsModel",
     "TEIEmbeddingsModelConfig",
+    "TEIChunker",
+    "TEIChunkerConfig",
 ]
@@ -0,0 +1,67 @@
+import time
+import grpc
+from loguru import logger
+
+from rag_battle.domain import deadline
+from rag_battle.domain.chunker import BaseChunker, token_windows
+from rag_battle.infra.embeddings.tei.config import TEIChunkerConfig
+from rag_battle.infra.embeddings.tei.exceptions import TEIDeadlineExceededException
+from rag_battle.infra.embeddings.text_embeddings_inference.channel_pool import (
+    TEIChannelPool,
+)
+from rag_battle.infra.embeddings.text_embeddings_inference.embedding import (
+    tokenize_grpc,
+)
+
+
+class TEIChunker(BaseChunker):
+    """
+    Splits documents into overlapping token windows with the tokenizer of the
+    TEI model, so chunks match what the model counts against its input limit.
+    """
+
+    def __init__(self, config: TEIChunkerConfig, channel_pool: TEIChannelPool):
+        self._max_tokens = config.max_tokens
+        self._overlap_tokens = config.overlap_tokens
+        self._channel_pool = channel_pool
+
+    async def chunk(self, texts: list[str]) -> list[list[str]]:
+        if not texts:
+            return []
+        start_time = time.time()
+        timeout = deadline.remaining()
+        if timeout is not None and timeout <= 0:
+            raise TEIDeadlineExceededException(
+                f"Request deadline exceeded before tokenizing {len(texts)} texts."
+            )
+        try:
+            offsets = await tokenize_grpc(
+                texts, stub=self._channel_pool.tokenize_stub(), timeout=timeout
+            )
+        except grpc.aio.AioRpcError as e:
+            if e.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+                raise TEIDeadlineExceededException(
+                    f"Request deadline exceeded while tokenizing {len(texts)} texts."
+                )
+            raise
+        chunks: list[list[str]] = []
+        for text, text_offsets in zip(texts, offsets):
+            if len(text_offsets) <= self._max_tokens:
+                chunks.append([text])
+                continue
+            # TEI offsets count UTF-8 bytes, not characters
+            encoded = text.encode()
+            chunks.append(
+                [
+                    encoded[start:stop].decode(errors="ignore")
+                    for start, stop in token_windows(
+                        text_offsets, self._max_tokens, self._overlap_tokens
+                    )
+                ]
+            )
+        end_time = time.time()
+        logger.info(
+            f"TEI: {len(texts)} documents split into "
+            f"{sum(len(x) for x in chunks)} chunks in {end_time - start_time:.3f} s."
+        )
+        return chunks
@@ -1,4 +1,5 @@
 from pydantic import Field
+from pydantic_settings import BaseSettings
 
 from rag_battle.domain.embeddings_model import EmbeddingsModelConfig
 
@@ -9,8 +10,62 @@ class TEIEmbeddingsModelConfig(EmbeddingsModelConfig):
         validation_alias="EMBEDDINGS_MODEL",
         description="The name or identifier of the embedding model.",
     )
-    embedding_size: int = Field(
+    embedding_size: int | None = Field(
         default=None,
         validation_alias="EMBEDDINGS_SIZE",
-        description="The dimension size of the generated embeddings.",
+        description=(
+            "The dimension size of the generated embeddings. Checked against "
+            "the server on first use, and taken from it when not set."
+        ),
+    )
+    max_queue: int = Field(
+        default=1024,
+        validation_alias="EMBEDDINGS_MAX_QUEUE",
+        description=(
+            "Number of calls waiting for the concurrency limit before further "
+            "calls are rejected as overloaded."
+        ),
+    )
+    target_latency_ms: float | None = Field(
+        default=None,
+        validation_alias="EMBEDDINGS_TARGET_LATENCY_MS",
+        description=(
+            "Latency of a call above which the concurrency limit shrinks. Unset "
+            "to only shrink it on rejections."
+        ),
+    )
+    retry_budget_ratio: float = Field(
+        default=0.1,
+        validation_alias="EMBEDDINGS_RETRY_BUDGET_RATIO",
+        description="Retries earned by every successful call.",
+    )
+    retry_budget_max: float = Field(
+        default=10.0,
+        validation_alias="EMBEDDINGS_RETRY_BUDGET_MAX",
+        description="Maximum number of retries saved up.",
+    )
+    hedge_quantile: float = Field(
+        default=0.95,
+        validation_alias="EMBEDDINGS_HEDGE_QUANTILE",
+        description=(
+            "Latency quantile of similar calls after which a call is duplicated "
+            "on another channel, the slower one is cancelled. Hedges are paid "
+            "from the retry budget. 0 disables hedging."
+        ),
+    )
+
+
+class TEIChunkerConfig(BaseSettings):
+    max_tokens: int | None = Field(
+        default=None,
+        validation_alias="EMBEDDINGS_CHUNK_MAX_TOKENS",
+        description=(
+            "Maximum number of tokens of a document chunk, without special "
+            "tokens. Unset to embed documents whole and reject too long ones."
+        ),
+    )
+    overlap_tokens: int = Field(
+        default=64,
+        validation_alias="EMBEDDINGS_CHUNK_OVERLAP_TOKENS",
+        description="Number of tokens shared by consecutive chunks.",
     )
@@ -1,5 +1,17 @@
-from rag_battle.domain.exceptions import InvalidInputException
+from rag_battle.domain.exceptions import (
+    DeadlineExceededException,
+    InvalidInputException,
+    OverloadedException,
+)
 
 
 class TEIInvalidInputException(InvalidInputException):
     pass
+
+
+class TEIOverloadedException(OverloadedException):
+    pass
+
+
+class TEIDeadlineExceededException(DeadlineExceededException):
+    pass
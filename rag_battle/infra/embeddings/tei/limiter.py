@@ -0,0 +1,195 @@
+import time
+import asyncio
+import numpy as np
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from rag_battle.domain.exceptions import OverloadedException
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on the number of concurrent calls to a server.
+
+    Every successful call raises the limit by 1 / limit, so the limit grows by
+    about one per round of calls. An overloaded call, or one slower than
+    `target_latency`, halves it. Calls that started before the last decrease
+    saw the old limit and don't decrease it again, so a burst of rejections
+    shrinks the limit once instead of collapsing it. Callers beyond the limit
+    wait in a queue of at most `max_queue`, further callers are rejected with
+    OverloadedException.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        max_limit: int,
+        max_queue: int,
+        target_latency: float | None = None,
+        min_limit: int = 1,
+        backoff: float = 0.5,
+    ):
+        """
+        :param limit: Initial limit.
+        :param max_limit: Limit it never grows past, e.g. the server capacity.
+        :param max_queue: Number of callers waiting for a call slot.
+        :param target_latency: Seconds a call may take before the server is
+        considered overloaded. None reacts to rejections only.
+        :param min_limit: Limit it never shrinks below.
+        :param backoff: Factor of a decrease.
+        """
+        self._limit: float = float(limit)
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._max_queue = max_queue
+        self._target_latency = target_latency
+        self._backoff = backoff
+        self._in_flight: int = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._last_decrease: float = 0.0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator["_Slot"]:
+        """
+        Hold a call slot for the duration of one call. Exceptions of the call
+        marked overloaded with `Slot.overloaded()` shrink the limit, a call
+        finishing without exception counts as a success.
+        """
+        await self._acquire()
+        slot = _Slot(time.monotonic())
+        try:
+            yield slot
+        except BaseException:
+            self._release()
+            if slot.is_overloaded:
+                self._decrease(slot.start_time)
+            raise
+        self._release()
+        latency = time.monotonic() - slot.start_time
+        if self._target_latency is not None and latency > self._target_latency:
+            self._decrease(slot.start_time)
+        else:
+            self._increase()
+
+    async def _acquire(self) -> None:
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            return
+        if len(self._waiters) >= self._max_queue:
+            raise OverloadedException(
+                f"{self._in_flight} calls in flight and {len(self._waiters)} "
+                f"queued, the embeddings service is overloaded."
+            )
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            # the releasing call hands its slot over
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()
+            else:
+                self._waiters.remove(future)
+            raise
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._in_flight < self.limit:
+            future = self._waiters.popleft()
+            if not future.done():
+                self._in_flight += 1
+                future.set_result(None)
+
+    def _increase(self) -> None:
+        self._limit = min(self._limit + 1 / self._limit, self._max_limit)
+        self._wake()
+
+    def _decrease(self, start_time: float) -> None:
+        if start_time < self._last_decrease:
+            return
+        self._limit = max(self._limit * self._backoff, self._min_limit)
+        self._last_decrease = time.monotonic()
+
+
+class _Slot:
+    def __init__(self, start_time: float):
+        self.start_time = start_time
+        self.is_overloaded = False
+
+    def overloaded(self) -> None:
+        """Mark the call as rejected by an overloaded server."""
+        self.is_overloaded = True
+
+
+class RetryBudget:
+    """
+    Retries shared by all calls to a server, earned by successful calls.
+
+    Every success deposits `ratio` retries up to `max_retries`, every retry
+    withdraws one. When the server fails most calls the budget runs dry and
+    callers fail fast instead of multiplying the load with retries.
+    """
+
+    def __init__(self, ratio: float, max_retries: float):
+        self._ratio = ratio
+        self._max_retries = max_retries
+        self._balance: float = max_retries
+
+    @property
+    def balance(self) -> float:
+        return self._balance
+
+    def deposit(self) -> None:
+        self._balance = min(self._balance + self._ratio, self._max_retries)
+
+    def withdraw(self) -> bool:
+        """
+        :return: bool: Whether a retry is allowed.
+        """
+        if self._balance < 1:
+            return False
+        self._balance -= 1
+        return True
+
+
+class LatencyWindow:
+    """Latencies of the most recent calls to a server."""
+
+    def __init__(self, size: int = 1000, min_samples: int = 20):
+        """
+        :param size: Number of latencies kept.
+        :param min_samples: Number of latencies needed to estimate a quantile.
+        """
+        self._latencies: deque[float] = deque(maxlen=size)
+        self._min_samples = min_samples
+
+    def __len__(self) -> int:
+        return len(self._latencies)
+
+    def record(self, latency: float) -> None:
+        self._latencies.append(latency)
+
+    def quantile(self, q: float) -> float | None:
+        """
+        :return: float | None: The latency quantile in seconds, None while there
+        are too few latencies to tell.
+        """
+        if len(self._latencies) < self._min_samples:
+            return None
+        return float(np.quantile(self._latencies, q))
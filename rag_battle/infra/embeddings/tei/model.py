@@ -1,31 +1,203 @@
 import time
 import grpc
+import numpy as np
+import asyncio
+import functools
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, TypeVar
 
 import tenacity
 from grpc import RpcError
 from loguru import logger
+from rag_battle.domain import deadline
 from rag_battle.domain.embeddings_model import (
     BaseEmbeddingsModel,
+    BaseSparseEmbeddingsModel,
+    BaseTokenEmbeddingsModel,
     EmbeddingsModelConfigType,
 )
+from rag_battle.domain.schemas import SparseVector
 from rag_battle.infra.embeddings.text_embeddings_inference.embedding import (
     embeddings_grpc,
+    info_grpc,
+    sparse_embeddings_grpc,
+    token_embeddings_grpc,
+)
+from rag_battle.infra.embeddings.text_embeddings_inference.channel_pool import (
+    TEIChannelPool,
 )
-from rag_battle.infra.embeddings.service import Service
 from rag_battle.infra.embeddings.tei.config import TEIEmbeddingsModelConfig
-from rag_battle.infra.embeddings.tei.exceptions import TEIInvalidInputException
+from rag_battle.infra.embeddings.tei.exceptions import (
+    TEIDeadlineExceededException,
+    TEIInvalidInputException,
+    TEIOverloadedException,
+)
+from rag_battle.infra.embeddings.tei.limiter import (
+    AdaptiveLimiter,
+    LatencyWindow,
+    RetryBudget,
+)
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class TEILimits:
+    """Client limits derived from the Info of a TEI server."""
+
+    # texts per EmbedStream call
+    batch_size: int
+    # EmbedStream calls in flight at once
+    max_concurrent_batches: int
+
 
+class TEIEmbeddingsModel(
+    BaseEmbeddingsModel[TEIEmbeddingsModelConfig],
+    BaseSparseEmbeddingsModel,
+    BaseTokenEmbeddingsModel,
+):
+    """
+    Embeddings model served by Text Embeddings Inference over gRPC.
 
-class TEIEmbeddingsModel(BaseEmbeddingsModel[TEIEmbeddingsModelConfig]):
-    def __init__(self, config: EmbeddingsModelConfigType, service: Service):
+    The server is asked for its limits on first use. Texts are then sent in
+    batches of at most `max_client_batch_size`, and no more batches are in
+    flight than the server's `max_concurrent_requests` admits, so large ingests
+    are split instead of overloading the server queue.
+
+    Within that bound an AdaptiveLimiter shrinks the concurrency when the
+    server rejects batches or slows down, and callers beyond it queue or are
+    rejected with TEIOverloadedException. Rejected batches are retried out of
+    a RetryBudget, so an overloaded server is not hit with more retries.
+
+    Calls get the time left until the request deadline as their gRPC timeout,
+    and are not retried once that is shorter than a typical call. Calls slower
+    than most similar ones are hedged on another channel.
+
+    Sparse embeddings come from the EmbedSparse service, which TEI serves for
+    models with SPLADE pooling, and token embeddings from EmbedAll.
+    """
+
+    def __init__(self, config: EmbeddingsModelConfigType, channel_pool: TEIChannelPool):
         super().__init__(config=config)
-        self._service = service
+        self._channel_pool = channel_pool
+        self._limits: TEILimits | None = None
+        self._limiter: AdaptiveLimiter | None = None
+        self._retry_budget = RetryBudget(
+            ratio=config.retry_budget_ratio, max_retries=config.retry_budget_max
+        )
+        # latency windows by kind of call and the bit length of its number of texts
+        self._latencies: defaultdict[tuple[str, int], LatencyWindow] = defaultdict(
+            LatencyWindow
+        )
+        self._configure_lock = asyncio.Lock()
+
+    @property
+    def limits(self) -> TEILimits | None:
+        return self._limits
 
     async def embed_queries(self, texts: list[str]) -> list[list[float]]:
-        return await self._embed(texts)
+        return (await self._embed_batches(texts)).tolist()
 
     async def embed_documents(self, texts: list[str]) -> list[list[float]]:
-        return await self._embed(texts)
+        return (await self._embed_batches(texts)).tolist()
+
+    async def embed_queries_array(self, texts: list[str]) -> np.ndarray:
+        return await self._embed_batches(texts)
+
+    async def embed_documents_array(self, texts: list[str]) -> np.ndarray:
+        return await self._embed_batches(texts)
+
+    async def embed_queries_sparse(self, texts: list[str]) -> list[SparseVector]:
+        return await self._embed_batches_sparse(texts)
+
+    async def embed_documents_sparse(self, texts: list[str]) -> list[SparseVector]:
+        return await self._embed_batches_sparse(texts)
+
+    async def embed_queries_tokens(self, texts: list[str]) -> list[np.ndarray]:
+        return await self._embed_batches_tokens(texts)
+
+    async def embed_documents_tokens(self, texts: list[str]) -> list[np.ndarray]:
+        return await self._embed_batches_tokens(texts)
+
+    async def configure(self) -> TEILimits:
+        """
+        Derive batch size, concurrency and the embedding size from the server.
+
+        An embedding size missing from the config is filled in, a configured one
+        that does not match the server fails.
+        """
+        async with self._configure_lock:
+            if self._limits is not None:
+                return self._limits
+            info = await info_grpc(self._channel_pool.info_stub())
+            batch_size = max(
+                1, min(info.max_client_batch_size, info.max_concurrent_requests)
+            )
+            limits = TEILimits(
+                batch_size=batch_size,
+                max_concurrent_batches=max(
+                    1, info.max_concurrent_requests // batch_size
+                ),
+            )
+            target_latency_ms = self.config.target_latency_ms
+            self._limiter = AdaptiveLimiter(
+                limit=limits.max_concurrent_batches,
+                max_limit=limits.max_concurrent_batches,
+                max_queue=self.config.max_queue,
+                target_latency=(
+                    target_latency_ms / 1000 if target_latency_ms is not None else None
+                ),
+            )
+            embedding_size = (await self._embed(["dimension"])).shape[1]
+            if self.config.embedding_size is None:
+                self.config.embedding_size = embedding_size
+            elif self.config.embedding_size != embedding_size:
+                raise ValueError(
+                    f"EMBEDDINGS_SIZE is {self.config.embedding_size}, but "
+                    f"`{info.model_id}` embeds into {embedding_size} dimensions."
+                )
+            logger.info(
+                f"TEI: `{info.model_id}` ({info.model_dtype}), "
+                f"{embedding_size} dimensions, batches of {limits.batch_size} "
+                f"texts, {limits.max_concurrent_batches} concurrent batches."
+            )
+            self._limits = limits
+            return limits
+
+    async def _embed_batches(self, texts: list[str]) -> np.ndarray:
+        limits = self._limits or await self.configure()
+        # batches write their responses straight into their rows of the result
+        out = np.empty((len(texts), self.config.embedding_size), dtype=np.float32)
+
+        async def embed_batch(start: int) -> None:
+            end = start + limits.batch_size
+            await self._embed(texts[start:end], out=out[start:end])
+
+        await asyncio.gather(
+            *(embed_batch(start) for start in range(0, len(texts), limits.batch_size))
+        )
+        return out
+
+    async def _embed_batches_sparse(self, texts: list[str]) -> list[SparseVector]:
+        limits = self._limits or await self.configure()
+        batches = await asyncio.gather(
+            *(
+                self._embed_sparse(texts[start : start + limits.batch_size])
+                for start in range(0, len(texts), limits.batch_size)
+            )
+        )
+        return [vector for batch in batches for vector in batch]
+
+    async def _embed_batches_tokens(self, texts: list[str]) -> list[np.ndarray]:
+        limits = self._limits or await self.configure()
+        batches = await asyncio.gather(
+            *(
+                self._embed_tokens(texts[start : start + limits.batch_size])
+                for start in range(0, len(texts), limits.batch_size)
+            )
+        )
+        return [matrix for batch in batches for matrix in batch]
 
     @staticmethod
     def is_retryable_grpc_error(exception: BaseException) -> bool:
@@ -37,30 +209,181 @@ class TEIEmbeddingsModel(BaseEmbeddingsModel[TEIEmbeddingsModelConfig]):
             }
         return False
 
-    @tenacity.retry(
-        stop=tenacity.stop_after_attempt(5),
-        wait=(
-            # use exponential backoff to gradually increase delay between retries
-            tenacity.wait_exponential(multiplier=0.5, min=0.1, max=1.0)
-            # add jitter to prevent retry storm when many clients retry simultaneously
-            + tenacity.wait_random(0, 1)
-        ),
-        retry=tenacity.retry_if_exception(is_retryable_grpc_error),
-        reraise=True,
-    )
-    async def _embed(self, texts: list[str]) -> list[list[float]]:
-        start_time = time.time()
-        try:
-            embeddings = await embeddings_grpc(
-                texts,
-                host=self._service.host,
-                port=self._service.port,
+    @staticmethod
+    def is_overload_grpc_error(exception: BaseException) -> bool:
+        # deadlines are set by the clients, only rejections tell of overload
+        if isinstance(exception, RpcError):
+            return exception.code().name == "RESOURCE_EXHAUSTED"
+        return False
+
+    def _latency_window(self, kind: str, num_texts: int) -> LatencyWindow:
+        # calls of similar size, as the latency grows with the batch size
+        return self._latencies[kind, num_texts.bit_length()]
+
+    def _should_stop(
+        self, kind: str, num_texts: int, retry_state: tenacity.RetryCallState
+    ) -> bool:
+        time_left = deadline.remaining()
+        if time_left is not None:
+            # a retry that can't finish in time only adds load
+            expected_latency = (
+                self._latency_window(kind, num_texts).quantile(0.5) or 0.0
             )
+            if time_left - retry_state.upcoming_sleep < expected_latency:
+                return True
+        return not self._retry_budget.withdraw()
+
+    async def _embed(
+        self, texts: list[str], out: np.ndarray | None = None
+    ) -> np.ndarray:
+        return await self._retrying(
+            "embeddings", len(texts), lambda: self._embed_hedged(texts, out=out)
+        )
+
+    async def _embed_sparse(self, texts: list[str]) -> list[SparseVector]:
+        return await self._retrying(
+            "sparse embeddings",
+            len(texts),
+            lambda: self._call(
+                "sparse embeddings",
+                len(texts),
+                lambda timeout: sparse_embeddings_grpc(
+                    texts, stub=self._channel_pool.embed_stub(), timeout=timeout
+                ),
+            ),
+        )
+
+    async def _embed_tokens(self, texts: list[str]) -> list[np.ndarray]:
+        return await self._retrying(
+            "token embeddings",
+            len(texts),
+            lambda: self._call(
+                "token embeddings",
+                len(texts),
+                lambda timeout: token_embeddings_grpc(
+                    texts, stub=self._channel_pool.embed_stub(), timeout=timeout
+                ),
+            ),
+        )
+
+    async def _retrying(
+        self, kind: str, num_texts: int, call: Callable[[], Awaitable[T]]
+    ) -> T:
+        """Run a call of an RPC, retrying it while time and the budget allow."""
+        retrying = tenacity.AsyncRetrying(
+            stop=(
+                tenacity.stop_after_attempt(5)
+                | functools.partial(self._should_stop, kind, num_texts)
+            ),
+            wait=(
+                # use exponential backoff to gradually increase delay between retries
+                tenacity.wait_exponential(multiplier=0.5, min=0.1, max=1.0)
+                # add jitter to prevent retry storms of many simultaneous clients
+                + tenacity.wait_random(0, 1)
+            ),
+            retry=tenacity.retry_if_exception(self.is_retryable_grpc_error),
+            reraise=True,
+        )
+        try:
+            async for attempt in retrying:
+                with attempt:
+                    return await call()
         except grpc.aio.AioRpcError as e:
+            if (
+                e.code() == grpc.StatusCode.DEADLINE_EXCEEDED
+                and deadline.remaining() is not None
+            ):
+                raise TEIDeadlineExceededException(
+                    f"Request deadline exceeded while embedding {num_texts} texts."
+                )
+            if self.is_retryable_grpc_error(e):
+                raise TEIOverloadedException(e.details())
             raise TEIInvalidInputException(e.details())
+
+    async def _embed_hedged(
+        self, texts: list[str], out: np.ndarray | None = None
+    ) -> np.ndarray:
+        """
+        Embed texts, duplicating the call on the next channel once it takes
+        longer than `hedge_quantile` of similar calls. The first call to succeed
+        wins and the other one is cancelled.
+        """
+        hedge_quantile = self.config.hedge_quantile
+        hedge_delay = (
+            self._latency_window("embeddings", len(texts)).quantile(hedge_quantile)
+            if hedge_quantile > 0
+            else None
+        )
+        if hedge_delay is None:
+            return await self._embed_once(texts, out=out)
+
+        tasks = {asyncio.create_task(self._embed_once(texts, out=out))}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done and self._retry_budget.withdraw():
+                # the hedge gets rows of its own, the slower call may still
+                # write into `out` until it is cancelled
+                tasks.add(asyncio.create_task(self._embed_once(texts)))
+            error: BaseException | None = None
+            while tasks:
+                done, tasks = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    embeddings = task.result()
+                    if out is not None and embeddings is not out:
+                        out[:] = embeddings
+                        return out
+                    return embeddings
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _embed_once(
+        self, texts: list[str], out: np.ndarray | None = None
+    ) -> np.ndarray:
+        return await self._call(
+            "embeddings",
+            len(texts),
+            lambda timeout: embeddings_grpc(
+                texts, stub=self._channel_pool.embed_stub(), out=out, timeout=timeout
+            ),
+        )
+
+    async def _call(
+        self,
+        kind: str,
+        num_texts: int,
+        rpc: Callable[[float | None], Awaitable[T]],
+    ) -> T:
+        """
+        Run one attempt of an RPC in a slot of the limiter.
+
+        :param rpc: Makes the RPC with the given timeout.
+        """
+        async with self._limiter.slot() as slot:
+            # time spent waiting for the slot counts against the deadline
+            timeout = deadline.remaining()
+            if timeout is not None and timeout <= 0:
+                raise TEIDeadlineExceededException(
+                    f"Request deadline exceeded before embedding {num_texts} texts."
+                )
+            start_time = time.time()
+            try:
+                result = await rpc(timeout)
+            except grpc.aio.AioRpcError as e:
+                if self.is_overload_grpc_error(e):
+                    slot.overloaded()
+                raise
         end_time = time.time()
+        self._retry_budget.deposit()
+        self._latency_window(kind, num_texts).record(end_time - start_time)
         logger.info(
-            f"TEI: {len(texts)} embeddings calculating time: "
+            f"TEI: {num_texts} {kind} calculating time: "
             f"{end_time - start_time:.3f} s."
         )
-        return embeddings.tolist()
+        return result
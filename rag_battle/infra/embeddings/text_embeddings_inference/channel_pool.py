@@ -0,0 +1,99 @@
+import asyncio
+import grpc
+from loguru import logger
+
+from rag_battle.infra.embeddings.service import TEIService
+from rag_battle.infra.embeddings.text_embeddings_inference import tei_pb2_grpc
+
+
+class TEIChannelPool:
+    """
+    Long-lived gRPC channels to a TEI service, handed out round-robin.
+
+    Every channel keeps its own HTTP/2 connection alive with keepalive pings,
+    so calls skip connection setup and spread over several connections. The
+    pool is created once per process and closed on application shutdown.
+    """
+
+    def __init__(self, service: TEIService):
+        self._service = service
+        self._channels: list[grpc.aio.Channel] = []
+        self._embed_stubs: list[tei_pb2_grpc.EmbedStub] = []
+        self._info_stubs: list[tei_pb2_grpc.InfoStub] = []
+        self._tokenize_stubs: list[tei_pb2_grpc.TokenizeStub] = []
+        self._rerank_stubs: list[tei_pb2_grpc.RerankStub] = []
+        self._next: int = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _connect(self) -> None:
+        target = f"{self._service.host}:{self._service.port}"
+        options = [
+            # without a local subchannel pool channels to one target share a
+            # single connection
+            ("grpc.use_local_subchannel_pool", 1),
+            ("grpc.keepalive_time_ms", self._service.keepalive_time_ms),
+            ("grpc.keepalive_timeout_ms", self._service.keepalive_timeout_ms),
+            ("grpc.keepalive_permit_without_calls", 1),
+            ("grpc.http2.max_pings_without_data", 0),
+        ]
+        self._channels = [
+            grpc.aio.insecure_channel(target, options=options)
+            for _ in range(self._service.num_channels)
+        ]
+        self._embed_stubs = [
+            tei_pb2_grpc.EmbedStub(channel) for channel in self._channels
+        ]
+        self._info_stubs = [
+            tei_pb2_grpc.InfoStub(channel) for channel in self._channels
+        ]
+        self._tokenize_stubs = [
+            tei_pb2_grpc.TokenizeStub(channel) for channel in self._channels
+        ]
+        self._rerank_stubs = [
+            tei_pb2_grpc.RerankStub(channel) for channel in self._channels
+        ]
+        self._next = 0
+        self._loop = asyncio.get_running_loop()
+        logger.info(f"TEI: {len(self._channels)} channels to `{target}` opened.")
+
+    def _next_channel(self) -> int:
+        # channels are opened on first use, as aio channels are bound to the
+        # event loop they are created in
+        if self._loop is not asyncio.get_running_loop():
+            self._connect()
+        i = self._next
+        self._next = (self._next + 1) % len(self._channels)
+        return i
+
+    def embed_stub(self) -> tei_pb2_grpc.EmbedStub:
+        """Get the Embed stub of the next channel."""
+        i = self._next_channel()
+        return self._embed_stubs[i]
+
+    def info_stub(self) -> tei_pb2_grpc.InfoStub:
+        """Get the Info stub of the next channel."""
+        i = self._next_channel()
+        return self._info_stubs[i]
+
+    def tokenize_stub(self) -> tei_pb2_grpc.TokenizeStub:
+        """Get the Tokenize stub of the next channel."""
+        i = self._next_channel()
+        return self._tokenize_stubs[i]
+
+    def rerank_stub(self) -> tei_pb2_grpc.RerankStub:
+        """Get the Rerank stub of the next channel."""
+        i = self._next_channel()
+        return self._rerank_stubs[i]
+
+    async def close(self, grace: float | None = None) -> None:
+        """
+        Close all channels.
+
+        :param grace: Seconds to let in-flight calls finish before they are
+        cancelled. None cancels them right away.
+        """
+        channels = self._channels
+        self._channels, self._loop = [], None
+        self._embed_stubs, self._info_stubs, self._tokenize_stubs = [], [], []
+        self._rerank_stubs = []
+        await asyncio.gather(*(channel.close(grace) for channel in channels))
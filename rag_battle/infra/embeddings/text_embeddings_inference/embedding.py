@@ -1,16 +1,26 @@
 import numpy as np
-import grpc
+from rag_battle.domain.schemas import SparseVector
 from rag_battle.infra.embeddings.text_embeddings_inference import tei_pb2, tei_pb2_grpc
 
 
-async def embeddings_grpc(texts: list[str], host: str, port: int) -> np.ndarray:
+async def embeddings_grpc(
+    texts: list[str],
+    stub: tei_pb2_grpc.EmbedStub,
+    out: np.ndarray | None = None,
+    timeout: float | None = None,
+) -> np.ndarray:
+    """
+    Embed texts into a float32 matrix, one row per text.
+
+    :param out: Matrix to fill, e.g. a slice of a larger one. Allocated once the
+    embedding size is known from the first response if None.
+    :param timeout: Seconds until the call fails with DEADLINE_EXCEEDED. None
+    waits forever.
+    """
     if not texts:
-        return np.array([])
-    # TODO: find out a reason of the behaviour
-    #  async with grpc.aio.insecure_channel(f"{host}:{port}") as channel:
-    #  It is stuck under load - sync code in async => the app is dead!
-    channel = grpc.aio.insecure_channel(f"{host}:{port}")
-    stub = tei_pb2_grpc.EmbedStub(channel)
+        return np.empty((0, 0), dtype=np.float32) if out is None else out
+    # the stub comes from a long-lived channel, opening and closing a channel
+    # per call stalls the event loop under load
 
     async def batch(texts_: list[str]):
         for text in texts_:
@@ -19,8 +29,145 @@ async def embeddings_grpc(texts: list[str], host: str, port: int) -> np.ndarray:
                 text = " "
             yield tei_pb2.EmbedRequest(inputs=text, normalize=True)
 
-    embeddings = []
-    async for response in stub.EmbedStream(batch(texts)):
-        embeddings.append(response.embeddings)
+    i = 0
+    async for response in stub.EmbedStream(batch(texts), timeout=timeout):
+        if out is None:
+            out = np.empty((len(texts), len(response.embeddings)), dtype=np.float32)
+        # iterating the repeated field with a known count beats copying it as a
+        # sequence
+        out[i] = np.fromiter(response.embeddings, dtype=np.float32, count=out.shape[1])
+        i += 1
+    return out
+
+
+async def sparse_embeddings_grpc(
+    texts: list[str],
+    stub: tei_pb2_grpc.EmbedStub,
+    timeout: float | None = None,
+) -> list[SparseVector]:
+    """
+    Embed texts into sparse vectors, one per text.
+
+    :param timeout: Seconds until the call fails with DEADLINE_EXCEEDED. None
+    waits forever.
+    """
+    if not texts:
+        return []
+
+    async def batch(texts_: list[str]):
+        for text in texts_:
+            # gRPC fails to embed empty string
+            if not text:
+                text = " "
+            yield tei_pb2.EmbedSparseRequest(inputs=text)
+
+    vectors = []
+    async for response in stub.EmbedSparseStream(batch(texts), timeout=timeout):
+        values = response.sparse_embeddings
+        vectors.append(
+            SparseVector(
+                indices=np.fromiter(
+                    (value.index for value in values), dtype=np.int64, count=len(values)
+                ),
+                values=np.fromiter(
+                    (value.value for value in values),
+                    dtype=np.float32,
+                    count=len(values),
+                ),
+            )
+        )
+    return vectors
+
+
+async def token_embeddings_grpc(
+    texts: list[str],
+    stub: tei_pb2_grpc.EmbedStub,
+    timeout: float | None = None,
+) -> list[np.ndarray]:
+    """
+    Embed every token of texts into L2 normalized float32 rows, one matrix per
+    text.
+
+    :param timeout: Seconds until the call fails with DEADLINE_EXCEEDED. None
+    waits forever.
+    """
+    if not texts:
+        return []
+
+    async def batch(texts_: list[str]):
+        for text in texts_:
+            # gRPC fails to embed empty string
+            if not text:
+                text = " "
+            yield tei_pb2.EmbedAllRequest(inputs=text, truncate=True)
+
+    matrices = []
+    async for response in stub.EmbedAllStream(batch(texts), timeout=timeout):
+        tokens = response.token_embeddings
+        size = len(tokens[0].embeddings) if tokens else 0
+        matrix = np.empty((len(tokens), size), dtype=np.float32)
+        for i, token in enumerate(tokens):
+            matrix[i] = np.fromiter(token.embeddings, dtype=np.float32, count=size)
+        # TEI returns the hidden states as they are
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        matrices.append(matrix)
+    return matrices
+
+
+async def info_grpc(stub: tei_pb2_grpc.InfoStub) -> tei_pb2.InfoResponse:
+    return await stub.Info(tei_pb2.InfoRequest())
+
+
+async def tokenize_grpc(
+    texts: list[str],
+    stub: tei_pb2_grpc.TokenizeStub,
+    timeout: float | None = None,
+) -> list[list[tuple[int, int]]]:
+    """
+    Get the UTF-8 byte offsets of the tokens of every text.
+
+    :param timeout: Seconds until the call fails with DEADLINE_EXCEEDED. None
+    waits indefinitely.
+    """
+
+    async def batch(texts_: list[str]):
+        for text in texts_:
+            yield tei_pb2.EncodeRequest(inputs=text, add_special_tokens=False)
+
+    offsets = []
+    async for response in stub.TokenizeStream(batch(texts), timeout=timeout):
+        offsets.append([(token.start, token.stop) for token in response.tokens])
+    return offsets
+
+
+async def rerank_grpc(
+    query: str,
+    texts: list[str],
+    stub: tei_pb2_grpc.RerankStub,
+    timeout: float | None = None,
+) -> np.ndarray:
+    """
+    Score the relevance of texts to a query with a reranker model.
+
+    :param timeout: Seconds until the call fails with DEADLINE_EXCEEDED. None
+    waits forever.
+
+    :return: np.ndarray: float32 scores of the texts in their order.
+    """
+    scores = np.zeros(len(texts), dtype=np.float32)
+    if not texts:
+        return scores
+
+    async def batch(texts_: list[str]):
+        for text in texts_:
+            # gRPC fails to rerank empty string
+            yield tei_pb2.RerankStreamRequest(
+                query=query, text=text or " ", truncate=True
+            )
 
-    return np.array(embeddings, dtype=np.float16)
+    response = await stub.RerankStream(batch(texts), timeout=timeout)
+    # ranks come ordered by score, indices point back to the texts
+    for rank in response.ranks:
+        scores[rank.index] = rank.score
+    return scores
@@ -0,0 +1,393 @@
+"""
+Pure-Python stand-in for a Text Embeddings Inference gRPC server.
+
+Serves deterministic hashed n-gram embeddings, hashed word weights as sparse
+embeddings and hashed words as token embeddings, through the Info, Embed,
+Tokenize and Rerank services of `tei.proto`, with the behavior of a real
+server that matters to clients: inputs are queued and run in batches whose
+inference time grows with their size, a full queue is rejected with
+RESOURCE_EXHAUSTED, too long inputs with INVALID_ARGUMENT, and failures and
+stalls can be injected. Used by the tests and to benchmark the client without
+a GPU.
+
+Usage:
+    python -m rag_battle.infra.embeddings.text_embeddings_inference.stand_in \\
+        --port 8081 --item-latency-ms 0.5
+"""
+
+import re
+import zlib
+import random
+import asyncio
+import argparse
+import grpc
+import numpy as np
+from dataclasses import dataclass, field
+from loguru import logger
+
+from rag_battle.infra.embeddings.hashing import (
+    embed_texts,
+    embed_texts_sparse,
+    embed_texts_tokens,
+)
+from rag_battle.infra.embeddings.text_embeddings_inference import tei_pb2, tei_pb2_grpc
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+@dataclass
+class TEIStandInConfig:
+    model_id: str = "stand-in"
+    embedding_size: int = 1024
+    # tokens of the longest input
+    max_input_length: int = 512
+    max_client_batch_size: int = 32
+    # inputs queued or running before new ones are rejected
+    max_concurrent_requests: int = 512
+    # inputs run together in one inference batch
+    max_batch_requests: int = 32
+    # inference time of a batch: base latency plus item latency per input
+    base_latency_s: float = 0.0
+    item_latency_s: float = 0.0
+    # fraction of inputs failing with UNAVAILABLE
+    failure_rate: float = 0.0
+    # fraction of inputs stalled by stall_latency_s before they are queued,
+    # the tail latency of a busy replica
+    stall_rate: float = 0.0
+    stall_latency_s: float = 0.0
+    seed: int = 0
+
+
+class _StatusError(Exception):
+    def __init__(self, code: grpc.StatusCode, details: str):
+        super().__init__(details)
+        self.code = code
+        self.details = details
+
+
+def tokenize(text: str) -> list[tuple[int, int]]:
+    """Character offsets of the words and punctuation of a text."""
+    return [match.span() for match in TOKEN_PATTERN.finditer(text)]
+
+
+def byte_offsets(text: str, offsets: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """UTF-8 byte offsets of the tokens of a text, as TEI returns them."""
+    byte_offsets_: list[tuple[int, int]] = []
+    position = byte_position = 0
+    for start, stop in offsets:
+        byte_start = byte_position + len(text[position:start].encode())
+        byte_position = byte_start + len(text[start:stop].encode())
+        position = stop
+        byte_offsets_.append((byte_start, byte_position))
+    return byte_offsets_
+
+
+@dataclass
+class _Batcher:
+    """Queue of inputs embedded in batches by one inference loop."""
+
+    config: TEIStandInConfig
+    queue: list[tuple[str, asyncio.Future]] = field(default_factory=list)
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+    in_flight: int = 0
+
+    async def embed(self, text: str) -> np.ndarray:
+        if self.in_flight >= self.config.max_concurrent_requests:
+            raise _StatusError(
+                grpc.StatusCode.RESOURCE_EXHAUSTED, "Model is overloaded"
+            )
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight += 1
+        try:
+            self.queue.append((text, future))
+            self.wakeup.set()
+            return await future
+        finally:
+            self.in_flight -= 1
+
+    async def run(self) -> None:
+        config = self.config
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while self.queue:
+                batch = self.queue[: config.max_batch_requests]
+                del self.queue[: config.max_batch_requests]
+                batch = [(text, future) for text, future in batch if not future.done()]
+                if not batch:
+                    continue
+                await asyncio.sleep(
+                    config.base_latency_s + config.item_latency_s * len(batch)
+                )
+                embeddings = embed_texts(
+                    [text for text, _ in batch], config.embedding_size, 3, 5
+                )
+                for (_, future), embedding in zip(batch, embeddings):
+                    if not future.done():
+                        future.set_result(embedding)
+
+
+class TEIStandIn(
+    tei_pb2_grpc.InfoServicer,
+    tei_pb2_grpc.EmbedServicer,
+    tei_pb2_grpc.TokenizeServicer,
+    tei_pb2_grpc.RerankServicer,
+):
+    def __init__(self, config: TEIStandInConfig):
+        self._config = config
+        self._batcher = _Batcher(config)
+        self._random = random.Random(config.seed)
+
+    async def run(self) -> None:
+        """Run the inference loop, until cancelled."""
+        await self._batcher.run()
+
+    async def Info(self, request, context):
+        config = self._config
+        return tei_pb2.InfoResponse(
+            version="stand-in",
+            model_id=config.model_id,
+            model_dtype="float32",
+            model_type=tei_pb2.MODEL_TYPE_EMBEDDING,
+            max_concurrent_requests=config.max_concurrent_requests,
+            max_input_length=config.max_input_length,
+            max_batch_tokens=config.max_input_length * config.max_batch_requests,
+            max_batch_requests=config.max_batch_requests,
+            max_client_batch_size=config.max_client_batch_size,
+            tokenization_workers=1,
+        )
+
+    async def Embed(self, request, context):
+        try:
+            return await self._embed(request)
+        except _StatusError as e:
+            await context.abort(e.code, e.details)
+
+    async def EmbedStream(self, request_iterator, context):
+        # inputs of a stream are embedded concurrently and answered in order
+        tasks: list[asyncio.Task] = []
+        try:
+            async for request in request_iterator:
+                tasks.append(asyncio.create_task(self._embed(request)))
+            for task in tasks:
+                yield await task
+        except _StatusError as e:
+            await context.abort(e.code, e.details)
+        finally:
+            for task in tasks:
+                if task.done() and not task.cancelled():
+                    # the first failure aborted the stream, drop the others
+                    task.exception()
+                task.cancel()
+
+    async def EmbedSparse(self, request, context):
+        try:
+            return await self._embed_sparse(request)
+        except _StatusError as e:
+            await context.abort(e.code, e.details)
+
+    async def EmbedSparseStream(self, request_iterator, context):
+        try:
+            async for request in request_iterator:
+                yield await self._embed_sparse(request)
+        except _StatusError as e:
+            await context.abort(e.code, e.details)
+
+    async def _embed_sparse(
+        self, request: tei_pb2.EmbedSparseRequest
+    ) -> tei_pb2.EmbedSparseResponse:
+        text = self._validate(request.inputs, request.truncate)
+        # sparse inference shares the batches of the dense one
+        await self._batcher.embed(text)
+        (vector,) = embed_texts_sparse([text])
+        return tei_pb2.EmbedSparseResponse(
+            sparse_embeddings=[
+                tei_pb2.SparseValue(index=index, value=value)
+                for index, value in zip(vector.indices.tolist(), vector.values.tolist())
+            ]
+        )
+
+    async def EmbedAll(self, request, context):
+        try:
+            return await self._embed_all(request)
+        except _StatusError as e:
+            await context.abort(e.code, e.details)
+
+    async def EmbedAllStream(self, request_iterator, context):
+        try:
+            async for request in request_iterator:
+                yield await self._embed_all(request)
+        except _StatusError as e:
+            await context.abort(e.code, e.details)
+
+    async def _embed_all(
+        self, request: tei_pb2.EmbedAllRequest
+    ) -> tei_pb2.EmbedAllResponse:
+        text = self._validate(request.inputs, request.truncate)
+        await self._batcher.embed(text)
+        (matrix,) = embed_texts_tokens([text], self._config.embedding_size, 3, 5)
+        return tei_pb2.EmbedAllResponse(
+            token_embeddings=[
+                tei_pb2.TokenEmbedding(embeddings=row) for row in matrix.tolist()
+            ]
+        )
+
+    async def _embed(self, request: tei_pb2.EmbedRequest) -> tei_pb2.EmbedResponse:
+        text = self._validate(request.inputs, request.truncate)
+        if self._random.random() < self._config.failure_rate:
+            raise _StatusError(grpc.StatusCode.UNAVAILABLE, "Injected failure")
+        if self._random.random() < self._config.stall_rate:
+            await asyncio.sleep(self._config.stall_latency_s)
+        embedding = await self._batcher.embed(text)
+        return tei_pb2.EmbedResponse(embeddings=embedding.tolist())
+
+    def _validate(self, text: str, truncate: bool) -> str:
+        if not text:
+            raise _StatusError(grpc.StatusCode.INVALID_ARGUMENT, "`inputs` is empty")
+        offsets = tokenize(text)
+        max_length = self._config.max_input_length
+        if len(offsets) > max_length:
+            if not truncate:
+                raise _StatusError(
+                    grpc.StatusCode.INVALID_ARGUMENT,
+                    f"`inputs` must have less than {max_length} tokens. "
+                    f"Given: {len(offsets)}",
+                )
+            text = text[: offsets[max_length - 1][1]]
+        return text
+
+    async def Tokenize(self, request, context):
+        return self._tokenize(request)
+
+    async def TokenizeStream(self, request_iterator, context):
+        async for request in request_iterator:
+            yield self._tokenize(request)
+
+    @staticmethod
+    def _tokenize(request: tei_pb2.EncodeRequest) -> tei_pb2.EncodeResponse:
+        text = request.inputs
+        offsets = tokenize(text)
+        tokens = [
+            tei_pb2.SimpleToken(
+                id=zlib.crc32(text[start:stop].encode()) % 30_000,
+                text=text[start:stop],
+                special=False,
+                start=byte_start,
+                stop=byte_stop,
+            )
+            for (start, stop), (byte_start, byte_stop) in zip(
+                offsets, byte_offsets(text, offsets)
+            )
+        ]
+        if request.add_special_tokens:
+            tokens = (
+                [tei_pb2.SimpleToken(id=0, text="[CLS]", special=True)]
+                + tokens
+                + [tei_pb2.SimpleToken(id=2, text="[SEP]", special=True)]
+            )
+        return tei_pb2.EncodeResponse(tokens=tokens)
+
+    async def Rerank(self, request, context):
+        try:
+            return await self._rerank(
+                request.query,
+                list(request.texts),
+                request.raw_scores,
+                request.return_text,
+            )
+        except _StatusError as e:
+            await context.abort(e.code, e.details)
+
+    async def RerankStream(self, request_iterator, context):
+        requests = [request async for request in request_iterator]
+        if not requests:
+            return tei_pb2.RerankResponse()
+        try:
+            return await self._rerank(
+                requests[0].query,
+                [request.text for request in requests],
+                requests[0].raw_scores,
+                requests[0].return_text,
+            )
+        except _StatusError as e:
+            await context.abort(e.code, e.details)
+
+    async def _rerank(
+        self, query: str, texts: list[str], raw_scores: bool, return_text: bool
+    ) -> tei_pb2.RerankResponse:
+        inputs = [self._validate(query, False)] + [
+            self._validate(text, True) for text in texts
+        ]
+        embeddings = await asyncio.gather(*(self._batcher.embed(x) for x in inputs))
+        scores = np.stack(embeddings[1:]) @ embeddings[0]
+        if not raw_scores:
+            # cross-encoders report a sigmoid of their logits
+            scores = 1 / (1 + np.exp(-4 * scores))
+        ranks = []
+        for i in np.argsort(-scores, kind="stable"):
+            rank = tei_pb2.Rank(index=int(i), score=float(scores[i]))
+            if return_text:
+                rank.text = texts[i]
+            ranks.append(rank)
+        return tei_pb2.RerankResponse(ranks=ranks)
+
+
+class TEIStandInServer:
+    def __init__(self, config: TEIStandInConfig | None = None):
+        self.config = config or TEIStandInConfig()
+        self._server: grpc.aio.Server | None = None
+        self._batcher_task: asyncio.Task | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """
+        Start serving.
+
+        :return: int: The bound port, a free one if `port` is 0.
+        """
+        stand_in = TEIStandIn(self.config)
+        self._server = grpc.aio.server()
+        tei_pb2_grpc.add_InfoServicer_to_server(stand_in, self._server)
+        tei_pb2_grpc.add_EmbedServicer_to_server(stand_in, self._server)
+        tei_pb2_grpc.add_TokenizeServicer_to_server(stand_in, self._server)
+        tei_pb2_grpc.add_RerankServicer_to_server(stand_in, self._server)
+        port = self._server.add_insecure_port(f"{host}:{port}")
+        await self._server.start()
+        self._batcher_task = asyncio.create_task(stand_in.run())
+        logger.info(f"TEI stand-in: serving `{self.config.model_id}` on {port}.")
+        return port
+
+    async def stop(self) -> None:
+        await self._server.stop(grace=None)
+        self._batcher_task.cancel()
+
+
+async def main(args: argparse.Namespace) -> None:
+    server = TEIStandInServer(
+        TEIStandInConfig(
+            embedding_size=args.embedding_size,
+            max_concurrent_requests=args.max_concurrent_requests,
+            max_batch_requests=args.max_batch_requests,
+            base_latency_s=args.base_latency_ms / 1000,
+            item_latency_s=args.item_latency_ms / 1000,
+            failure_rate=args.failure_rate,
+            stall_rate=args.stall_rate,
+            stall_latency_s=args.stall_latency_ms / 1000,
+        )
+    )
+    await server.start(args.host, args.port)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--embedding-size", type=int, default=1024)
+    parser.add_argument("--max-concurrent-requests", type=int, default=512)
+    parser.add_argument("--max-batch-requests", type=int, default=32)
+    parser.add_argument("--base-latency-ms", type=float, default=0.0)
+    parser.add_argument("--item-latency-ms", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--stall-latency-ms", type=float, default=0.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,9 @@
+from rag_battle.infra.rerankers.tei import TEIReranker, TEIRerankerConfig
+from rag_battle.infra.rerankers.cache import CachingReranker, RerankCacheConfig
+
+__all__ = [
+    "TEIReranker",
+    "TEIRerankerConfig",
+    "CachingReranker",
+    "RerankCacheConfig",
+]
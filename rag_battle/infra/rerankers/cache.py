@@ -0,0 +1,64 @@
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from pydantic import Field
+from pydantic_settings import BaseSettings
+
+from rag_battle.domain.reranker import BaseReranker
+from rag_battle.infra.embeddings.cache import normalize_query
+
+
+class RerankCacheConfig(BaseSettings):
+    max_entries: int = Field(
+        default=0,
+        validation_alias="RERANK_CACHE_MAX_ENTRIES",
+        description="Number of cached (query, text) scores. 0 disables the cache.",
+    )
+
+
+class CachingReranker(BaseReranker):
+    """
+    Caches the scores of a wrapped reranker.
+
+    Scores are keyed on the normalized query and a hash of the text, so a
+    repeated query only reranks the candidates it didn't retrieve before. Least
+    recently used scores are evicted once the cache holds `max_entries`. Texts
+    missing from the cache are reranked in one call.
+    """
+
+    def __init__(self, reranker: BaseReranker, config: RerankCacheConfig):
+        self._reranker = reranker
+        self._max_entries = config.max_entries
+        # (query, text hash) -> score, least recently used first
+        self._entries: OrderedDict[tuple[str, bytes], float] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def rerank(self, query: str, texts: list[str]) -> np.ndarray:
+        normalized = normalize_query(query)
+        scores = np.empty(len(texts), dtype=np.float32)
+        missing: dict[tuple[str, bytes], list[int]] = {}
+        for i, text in enumerate(texts):
+            key = (normalized, hashlib.blake2b(text.encode(), digest_size=16).digest())
+            score = self._entries.get(key)
+            if score is None:
+                missing.setdefault(key, []).append(i)
+                continue
+            self._entries.move_to_end(key)
+            scores[i] = score
+        self.hits += len(texts) - sum(len(positions) for positions in missing.values())
+        self.misses += len(missing)
+
+        if missing:
+            computed = await self._reranker.rerank(
+                query, [texts[positions[0]] for positions in missing.values()]
+            )
+            for (key, positions), score in zip(missing.items(), computed.tolist()):
+                scores[positions] = score
+                self._entries[key] = score
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return scores
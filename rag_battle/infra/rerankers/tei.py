@@ -0,0 +1,123 @@
+import time
+import grpc
+import asyncio
+import numpy as np
+from loguru import logger
+from pydantic import Field
+from pydantic_settings import BaseSettings
+
+from rag_battle.domain import deadline
+from rag_battle.domain.reranker import BaseReranker
+from rag_battle.infra.embeddings.tei import TEIEmbeddingsModel
+from rag_battle.infra.embeddings.tei.exceptions import (
+    TEIDeadlineExceededException,
+    TEIInvalidInputException,
+    TEIOverloadedException,
+)
+from rag_battle.infra.embeddings.tei.limiter import AdaptiveLimiter
+from rag_battle.infra.embeddings.text_embeddings_inference.channel_pool import (
+    TEIChannelPool,
+)
+from rag_battle.infra.embeddings.text_embeddings_inference.embedding import (
+    info_grpc,
+    rerank_grpc,
+)
+
+
+class TEIRerankerConfig(BaseSettings):
+    max_queue: int = Field(
+        default=1024,
+        validation_alias="RERANKER_MAX_QUEUE",
+        description=(
+            "Number of calls waiting for the concurrency limit before further "
+            "calls are rejected as overloaded."
+        ),
+    )
+
+
+class TEIReranker(BaseReranker):
+    """
+    Cross-encoder reranker served by Text Embeddings Inference over gRPC.
+
+    Like TEIEmbeddingsModel it asks the server for its limits on first use,
+    sends texts in batches of at most `max_client_batch_size` and keeps the
+    batches in flight within an AdaptiveLimiter. Batches are not retried, a
+    reranking that fails falls back to the retrieval order instead.
+    """
+
+    def __init__(self, config: TEIRerankerConfig, channel_pool: TEIChannelPool):
+        self._config = config
+        self._channel_pool = channel_pool
+        self._batch_size: int | None = None
+        self._limiter: AdaptiveLimiter | None = None
+        self._configure_lock = asyncio.Lock()
+
+    async def configure(self) -> int:
+        """
+        Derive batch size and concurrency from the server.
+
+        :return: int: The batch size.
+        """
+        async with self._configure_lock:
+            if self._batch_size is not None:
+                return self._batch_size
+            info = await info_grpc(self._channel_pool.info_stub())
+            batch_size = max(
+                1, min(info.max_client_batch_size, info.max_concurrent_requests)
+            )
+            max_concurrent_batches = max(1, info.max_concurrent_requests // batch_size)
+            self._limiter = AdaptiveLimiter(
+                limit=max_concurrent_batches,
+                max_limit=max_concurrent_batches,
+                max_queue=self._config.max_queue,
+            )
+            logger.info(
+                f"TEI: reranker `{info.model_id}`, batches of {batch_size} texts, "
+                f"{max_concurrent_batches} concurrent batches."
+            )
+            self._batch_size = batch_size
+            return batch_size
+
+    async def rerank(self, query: str, texts: list[str]) -> np.ndarray:
+        batch_size = self._batch_size or await self.configure()
+        scores = np.empty(len(texts), dtype=np.float32)
+
+        async def rerank_batch(start: int) -> None:
+            end = start + batch_size
+            scores[start:end] = await self._rerank(query, texts[start:end])
+
+        await asyncio.gather(
+            *(rerank_batch(start) for start in range(0, len(texts), batch_size))
+        )
+        return scores
+
+    async def _rerank(self, query: str, texts: list[str]) -> np.ndarray:
+        async with self._limiter.slot() as slot:
+            # time spent waiting for the slot counts against the deadline
+            timeout = deadline.remaining()
+            if timeout is not None and timeout <= 0:
+                raise TEIDeadlineExceededException(
+                    f"Request deadline exceeded before reranking {len(texts)} texts."
+                )
+            start_time = time.time()
+            try:
+                scores = await rerank_grpc(
+                    query, texts, stub=self._channel_pool.rerank_stub(), timeout=timeout
+                )
+            except grpc.aio.AioRpcError as e:
+                if TEIEmbeddingsModel.is_overload_grpc_error(e):
+                    slot.overloaded()
+                if e.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+                    raise TEIDeadlineExceededException(
+                        f"Request deadline exceeded while reranking {len(texts)} "
+                        f"texts."
+                    )
+                if TEIEmbeddingsModel.is_retryable_grpc_error(e):
+                    raise TEIOverloadedException(e.details())
+                raise TEIInvalidInputException(e.details())
+        end_time = time.time()
+        logger.info(
+            f"TEI: {len(texts)} rerank scores calculating time: "
+            f"{end_time - start_time:.3f} s."
+        )
+        return scores
@@ -1,16 +1,20 @@
 import time
+import asyncio
 import numpy as np
 from loguru import logger
 
-from rag_battle.domain.schemas import RAGQuery
+from rag_battle.domain.schemas import RAGQuery, ScoredItem, SparseVector
 from rag_battle.domain.retriever import BaseRetriever
-from rag_battle.domain.vector_database import DataItemType
 
 
 class Retriever(BaseRetriever):
-    async def retrieve(self, query: RAGQuery) -> list[DataItemType]:
+    async def retrieve(self, query: RAGQuery) -> list[ScoredItem]:
         calculate_embeddings_start_time = time.time()
-        embeddings = await self._embeddings_model.embed_queries([query.query])
+        embeddings, sparse_embeddings, token_embeddings = await asyncio.gather(
+            self._embeddings_model.embed_queries_array([query.query]),
+            self._embed_sparse(query.query),
+            self._embed_tokens(query.query),
+        )
         calculate_embeddings_end_time = time.time()
         calculate_embeddings_execution_time = (
             calculate_embeddings_end_time - calculate_embeddings_start_time
@@ -22,11 +26,24 @@ class Retriever(BaseRetriever):
 
         query_start_time = time.time()
         items = await self._vector_database.query(
-            query_embeddings=[np.array(embedding) for embedding in embeddings],
+            query_embeddings=list(embeddings),
             tags=query.tags,
             num_items=query.num_items,
             remove_duplicates=query.remove_duplicates,
+            search_params=query.search_params,
+            sparse_query_embeddings=sparse_embeddings,
+            token_query_embeddings=token_embeddings,
         )
         query_end_time = time.time()
         logger.info(f"Query executing time: {query_end_time - query_start_time:.3f} s.")
         return items
+
+    async def _embed_sparse(self, text: str) -> list[SparseVector] | None:
+        if self._sparse_embeddings_model is None:
+            return None
+        return await self._sparse_embeddings_model.embed_queries_sparse([text])
+
+    async def _embed_tokens(self, text: str) -> list[np.ndarray] | None:
+        if self._token_embeddings_model is None:
+            return None
+        return await self._token_embeddings_model.embed_queries_tokens([text])
@@ -1,5 +1,7 @@
 from rag_battle.infra.vector_database.faiss import FaissVectorDatabase
+from rag_battle.infra.vector_database.config import FaissVectorDatabaseConfig
 
 __all__ = [
     "FaissVectorDatabase",
+    "FaissVectorDatabaseConfig",
 ]
@@ -0,0 +1,89 @@
+import faiss
+import numpy as np
+
+
+class IdBitmap:
+    """
+    Growable bitmap over internal int64 vector ids.
+
+    Bits are packed in little-endian bit order, which is the layout expected by
+    `faiss.IDSelectorBitmap`, so a bitmap can be handed to FAISS as a search
+    pre-filter without any conversion.
+    """
+
+    def __init__(self, bits: np.ndarray | None = None):
+        if bits is None:
+            bits = np.zeros(0, dtype=np.uint8)
+        self._bits: np.ndarray = bits
+
+    @property
+    def bits(self) -> np.ndarray:
+        return self._bits
+
+    def __len__(self) -> int:
+        return len(self._bits)
+
+    def _reserve(self, max_id: int) -> None:
+        size = (max_id >> 3) + 1
+        # a memory-mapped bitmap is read-only, it is copied on the first write
+        if size <= len(self._bits) and self._bits.flags.writeable:
+            return
+        if size > len(self._bits):
+            # grow geometrically to keep amortized insertion cost constant
+            size = max(size, 2 * len(self._bits))
+        bits = np.zeros(max(size, len(self._bits)), dtype=np.uint8)
+        bits[: len(self._bits)] = self._bits
+        self._bits = bits
+
+    def add(self, ids: np.ndarray) -> None:
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return
+        self._reserve(int(ids.max()))
+        np.bitwise_or.at(
+            self._bits, ids >> 3, np.left_shift(1, ids & 7).astype(np.uint8)
+        )
+
+    def discard(self, ids: np.ndarray) -> None:
+        ids = np.asarray(ids, dtype=np.int64)
+        ids = ids[(ids >> 3) < len(self._bits)]
+        if len(ids) == 0:
+            return
+        self._reserve(int(ids.max()))
+        np.bitwise_and.at(
+            self._bits, ids >> 3, ~np.left_shift(1, ids & 7).astype(np.uint8)
+        )
+
+    def contains(self, ids: np.ndarray) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64)
+        result = np.zeros(len(ids), dtype=bool)
+        in_range = (ids >= 0) & ((ids >> 3) < len(self._bits))
+        ids = ids[in_range]
+        result[in_range] = (self._bits[ids >> 3] >> (ids & 7)) & 1 == 1
+        return result
+
+    def count(self) -> int:
+        return int(np.unpackbits(self._bits).sum())
+
+    def ids(self) -> np.ndarray:
+        return np.flatnonzero(np.unpackbits(self._bits, bitorder="little"))
+
+    @classmethod
+    def union(cls, bitmaps: list["IdBitmap"]) -> "IdBitmap":
+        size = max((len(bitmap) for bitmap in bitmaps), default=0)
+        bits = np.zeros(size, dtype=np.uint8)
+        for bitmap in bitmaps:
+            bits[: len(bitmap)] |= bitmap.bits
+        return cls(bits)
+
+    def selector(self) -> faiss.IDSelector:
+        """
+        Build a FAISS selector that admits exactly the ids set in this bitmap.
+
+        The selector references the bitmap memory directly, so the bitmap must
+        stay alive (and unmodified) while the selector is in use.
+        """
+        if len(self._bits) == 0:
+            # swig cannot take a pointer to an empty buffer
+            self._bits = np.zeros(1, dtype=np.uint8)
+        return faiss.IDSelectorBitmap(len(self._bits), faiss.swig_ptr(self._bits))
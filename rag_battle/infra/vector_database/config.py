@@ -0,0 +1,157 @@
+from typing import Literal
+from pydantic import ConfigDict, Field
+from pydantic_settings import BaseSettings
+
+
+class FaissVectorDatabaseConfig(BaseSettings):
+    model_config = ConfigDict(populate_by_name=True)
+
+    index_factory: str = Field(
+        default="Flat",
+        validation_alias="FAISS_INDEX_FACTORY",
+        description=(
+            "FAISS index_factory string describing the index, "
+            "e.g. Flat, HNSW32, SQ8 or IVF4096,PQ64."
+        ),
+    )
+    storage: Literal["fp32", "fp16", "sq8"] = Field(
+        default="fp32",
+        validation_alias="FAISS_STORAGE",
+        description=(
+            "Precision of the vectors stored by Flat, HNSW and IVF...,Flat "
+            "indexes: float32, float16, or int8 scalar quantization, which "
+            "takes half and a quarter of the memory. sq8 needs training."
+        ),
+    )
+    rescore_factor: int = Field(
+        default=0,
+        validation_alias="FAISS_RESCORE_FACTOR",
+        description=(
+            "Multiple of the requested vectors searched in the index and "
+            "rescored with float32 copies kept outside of it, for lossy "
+            "storages. The copies take the memory of an fp32 index on top of "
+            "the lossy one, unless they are memory-mapped from a snapshot. 0 "
+            "keeps the scores of the index."
+        ),
+    )
+    train_size: int | None = Field(
+        default=None,
+        validation_alias="FAISS_TRAIN_SIZE",
+        description=(
+            "Number of vectors to buffer in a flat index before training an "
+            "index that requires training. Defaults to 39 vectors per IVF "
+            "centroid or 9984 vectors for other trainable indexes."
+        ),
+    )
+    nprobe: int | None = Field(
+        default=None,
+        validation_alias="FAISS_NPROBE",
+        description="Default number of IVF lists visited per query.",
+    )
+    ef_search: int | None = Field(
+        default=None,
+        validation_alias="FAISS_EF_SEARCH",
+        description="Default HNSW search queue size per query.",
+    )
+    search_batch_max_wait_ms: float = Field(
+        default=0.0,
+        validation_alias="FAISS_SEARCH_BATCH_MAX_WAIT_MS",
+        description=(
+            "Milliseconds a query waits for concurrent queries with the same "
+            "tags and search parameters to run one batched search with. "
+            "0 searches every query on its own."
+        ),
+    )
+    search_batch_max_size: int = Field(
+        default=64,
+        validation_alias="FAISS_SEARCH_BATCH_MAX_SIZE",
+        description="Number of query vectors that runs a batched search early.",
+    )
+    compaction_threshold: float | None = Field(
+        default=0.2,
+        validation_alias="FAISS_COMPACTION_THRESHOLD",
+        description=(
+            "Fraction of deleted or replaced vectors in the index that starts "
+            "a background compaction removing them. Unset to only compact on "
+            "explicit calls."
+        ),
+    )
+    chunk_aggregation: Literal["max", "sum"] = Field(
+        default="max",
+        validation_alias="FAISS_CHUNK_AGGREGATION",
+        description=(
+            "How the scores of the chunks of a chunked item found by a query "
+            "combine into the score of the item."
+        ),
+    )
+    fusion: Literal["rrf", "weighted"] = Field(
+        default="rrf",
+        validation_alias="FAISS_FUSION",
+        description=(
+            "How the dense and sparse results of hybrid queries are fused: by "
+            "reciprocal rank, or by the weighted sum of their scores."
+        ),
+    )
+    sparse_weight: float = Field(
+        default=1.0,
+        validation_alias="FAISS_SPARSE_WEIGHT",
+        description=(
+            "Weight of the sparse results in the fusion, relative to the dense "
+            "ones. Sparse scores are unbounded dot products, weighted fusion "
+            "usually needs a lower weight, e.g. 0.3 for bge-m3."
+        ),
+    )
+    rrf_k: int = Field(
+        default=60,
+        validation_alias="FAISS_RRF_K",
+        description=(
+            "Rank offset of reciprocal rank fusion, larger values flatten the "
+            "difference between top and lower ranks."
+        ),
+    )
+    late_interaction_candidates: int = Field(
+        default=100,
+        validation_alias="FAISS_LATE_INTERACTION_CANDIDATES",
+        description=(
+            "Number of nearest vectors rescored by late interaction, for queries "
+            "with token embeddings."
+        ),
+    )
+    snapshot_dir: str | None = Field(
+        default=None,
+        validation_alias="FAISS_SNAPSHOT_DIR",
+        description=(
+            "Directory for snapshots of the database. The latest snapshot is "
+            "restored on startup and a new one is written on shutdown."
+        ),
+    )
+    snapshot_mmap: bool = Field(
+        default=True,
+        validation_alias="FAISS_SNAPSHOT_MMAP",
+        description=(
+            "Whether to memory-map restored snapshots instead of reading them "
+            "into memory. The index is loaded into memory on the first write."
+        ),
+    )
+    shared: bool = Field(
+        default=False,
+        validation_alias="FAISS_SHARED",
+        description=(
+            "Whether server workers share the database through the snapshot "
+            "directory. One worker at a time applies its queued writes and "
+            "publishes them as a new snapshot, the others memory-map it on their "
+            "next query. Every snapshot rewrites the whole database, see "
+            "FAISS_SHARED_PUBLISH_WAIT_MS. Put FAISS_SNAPSHOT_DIR on a tmpfs "
+            "such as /dev/shm to keep a single copy in memory for all workers."
+        ),
+    )
+    shared_publish_wait_ms: float = Field(
+        default=0.0,
+        validation_alias="FAISS_SHARED_PUBLISH_WAIT_MS",
+        description=(
+            "Milliseconds a worker of a shared database waits for more writes "
+            "before publishing a snapshot. Publishing costs I/O in the size of "
+            "the database, this bounds a worker to one snapshot per wait. "
+            "0 publishes the writes queued so far right away."
+        ),
+    )
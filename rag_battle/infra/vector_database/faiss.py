@@ -1,45 +1,120 @@
+import os
+import time
+import asyncio
 import faiss
-import heapq
 import numpy as np
 from loguru import logger
-from copy import deepcopy
-from pydantic import BaseModel, ConfigDict
-from typing import TypeVar, Generic
-from dataclasses import dataclass
+from functools import partial
+from typing import Awaitable, Callable, TypeVar, Generic
+from rag_battle.domain.exceptions import InvalidInputException
+from rag_battle.domain.schemas import ScoredItem, SparseVector, StoredItem
 from rag_battle.domain.vector_database import (
     DataItemType,
     VectorDatabase,
     DataItemWithEmbeddingType,
 )
+from rag_battle.infra.vector_database import index as faiss_index_utils
+from rag_battle.infra.vector_database import snapshot
+from rag_battle.infra.vector_database.bitmap import IdBitmap
+from rag_battle.infra.vector_database.config import FaissVectorDatabaseConfig
+from rag_battle.infra.vector_database.fusion import fuse
+from rag_battle.infra.vector_database.id_map import IdMap
+from rag_battle.infra.vector_database.item_store import ItemStore
+from rag_battle.infra.vector_database.search_batcher import SearchBatcher
+from rag_battle.infra.vector_database.sparse_index import SparseIndex
+from rag_battle.infra.vector_database.token_store import TokenStore
+from rag_battle.infra.vector_database.top_k import merge_top_k
+from rag_battle.infra.vector_database.vector_store import VectorStore
 
 IndexType = TypeVar("IndexType", bound="faiss.Index")
 
+SEARCH_PARAMS = {"nprobe", "ef_search"}
+# over-fetch factor for indexes that can only be filtered after the search
+POST_FILTER_GROWTH = 4
+# over-fetch factor for databases holding chunked items, whose chunks compete
+# for the k nearest vectors
+CHUNK_GROWTH = 4
+# separates the item id and the chunk number in the ids of chunk vectors, the
+# first chunk of an item is keyed by the bare item id
+CHUNK_SEPARATOR = "\x1f"
+# over-fetch factor of the dense and sparse results of hybrid queries, items
+# ranked low by one of them may still rank high when fused
+FUSION_GROWTH = 2
 
-class TagIndex(BaseModel):
-    faiss_index: IndexType
-    item_ids: set[str]
-    vector_ids: list[str]
 
-    model_config = ConfigDict(arbitrary_types_allowed=True)
-
-
-@dataclass(order=True)
-class ScoreItem:
-    score: float
-    item_id: str
-    tag: str
+def chunk_key(item_id: str, chunk: int) -> str:
+    return item_id if chunk == 0 else f"{item_id}{CHUNK_SEPARATOR}{chunk}"
 
 
 class FaissVectorDatabase(VectorDatabase, Generic[IndexType, DataItemType]):
     def __init__(
         self,
         embedding_size: int,
-        index_type: type[IndexType] = faiss.IndexFlatIP,
+        config: FaissVectorDatabaseConfig | None = None,
     ):
-        self._index_type: type[IndexType] = index_type
+        if config is None:
+            config = FaissVectorDatabaseConfig()
+        self._config: FaissVectorDatabaseConfig = config
         self._embedding_size: int = embedding_size
-        self._tag_to_index: dict[str, TagIndex] = {}
-        self._item_id_to_item: dict[str, DataItemType] = {}
+        self._index_factory: str = faiss_index_utils.with_storage(
+            config.index_factory, config.storage
+        )
+        # one index holds every vector once, tags only select which ids match
+        self._faiss_index: IndexType = self._create_faiss_index()
+        self._is_trained: bool = self._faiss_index.is_trained
+        self._train_size: int = (
+            config.train_size or faiss_index_utils.default_train_size(self._faiss_index)
+        )
+        if not self._is_trained:
+            # serve exact searches from a flat index until there are enough
+            # vectors to train the configured one
+            self._faiss_index = faiss_index_utils.create_flat_index(embedding_size)
+        self._supports_remove: bool = faiss_index_utils.supports_remove(
+            self._faiss_index
+        )
+        self._supports_selector: bool = faiss_index_utils.supports_selector(
+            self._faiss_index
+        )
+        self._vector_ids: IdMap = IdMap()
+        # tombstones: ids of deleted or replaced vectors still in the index
+        self._dead_ids: IdBitmap = IdBitmap()
+        self._num_dead_ids: int = 0
+        # live vectors of chunks after the first one of their items
+        self._num_chunk_vectors: int = 0
+        self._tag_to_bitmap: dict[str, IdBitmap] = {}
+        # sparse vectors of the items saved with any, under the same ids
+        self._sparse_index: SparseIndex = SparseIndex()
+        # token embeddings of the items saved with any, under the same ids
+        self._token_store: TokenStore = TokenStore()
+        # float32 copies of the vectors rescoring the candidates of the index
+        self._vector_store: VectorStore | None = None
+        if config.rescore_factor > 0:
+            self._vector_store = VectorStore(embedding_size)
+        self._items: ItemStore = ItemStore()
+        # a memory-mapped index is read-only until it is loaded into memory
+        self._is_mapped: bool = False
+        self._index_path: str | None = None
+        # snapshot the database was restored from, the epoch of a shared database
+        self._snapshot_path: str | None = None
+        self._write_lock: asyncio.Lock = asyncio.Lock()
+        self._compaction: asyncio.Task | None = None
+        self._search_batcher: SearchBatcher | None = None
+        if config.search_batch_max_wait_ms > 0:
+            self._search_batcher = SearchBatcher(
+                search=self._search_batch,
+                max_wait=config.search_batch_max_wait_ms / 1000,
+                max_size=config.search_batch_max_size,
+            )
+        # vectors added while a compaction runs, replayed into the compacted index
+        self._added_during_compaction: list[tuple[np.ndarray, np.ndarray]] | None = None
+        # writes of a shared database waiting to be published, with their results
+        self._pending_writes: list[
+            tuple[Callable[[], Awaitable[None]], asyncio.Future]
+        ] = []
+        if config.shared and not config.snapshot_dir:
+            raise ValueError("FAISS_SHARED requires FAISS_SNAPSHOT_DIR.")
+        if config.snapshot_dir:
+            self._restore_snapshot()
 
     @classmethod
     async def create(cls, *args, **kwargs):
@@ -50,46 +125,395 @@ class FaissVectorDatabase(VectorDatabase, Generic[IndexType, DataItemType]):
         self,
         items_with_embeddings: list[DataItemWithEmbeddingType],
     ) -> None:
-        for i in range(len(items_with_embeddings)):
-            item_with_embedding = items_with_embeddings[i]
-            vector = item_with_embedding.embedding.reshape(1, -1).astype("float32")
-            item = item_with_embedding.item
-            item = deepcopy(item)
+        if not items_with_embeddings:
+            return
+        await self._write(partial(self._apply_items, items_with_embeddings))
+        self._maybe_compact()
+
+    async def delete_items(self, item_ids: list[str]) -> None:
+        if not item_ids:
+            return
+        await self._write(partial(self._delete_items, item_ids))
+        self._maybe_compact()
+
+    async def _write(self, apply: Callable[[], Awaitable[None]]) -> None:
+        if not self._config.shared:
+            async with self._write_lock:
+                await apply()
+            return
+        # writes queued while a snapshot is published go out in the next one
+        done = asyncio.get_running_loop().create_future()
+        self._pending_writes.append((apply, done))
+        async with self._write_lock:
+            if not done.done():
+                await self._publish_pending_writes()
+        await done
+
+    async def _publish_pending_writes(self) -> None:
+        """
+        Apply the queued writes and publish them as one snapshot. Publishing
+        rewrites the whole snapshot, so its cost is shared by every write in it.
+        """
+        wait_ms = self._config.shared_publish_wait_ms
+        if wait_ms > 0:
+            # let more writes join the snapshot
+            await asyncio.sleep(wait_ms / 1000)
+        writes, self._pending_writes = self._pending_writes, []
+        applied = []
+        try:
+            async with snapshot.writer_lock(self._config.snapshot_dir):
+                # other workers may have published writes since the last refresh
+                if self._is_stale():
+                    await self._refresh_snapshot()
+                for apply, done in writes:
+                    try:
+                        await apply()
+                    except Exception as e:
+                        done.set_exception(e)
+                    else:
+                        applied.append(done)
+                if applied:
+                    await self._write_snapshot()
+                    # drop the in-memory copy and map the published snapshot
+                    # like the other workers do
+                    await self._refresh_snapshot()
+        except Exception as e:
+            for _, done in writes:
+                if not done.done():
+                    done.set_exception(e)
+            return
+        for done in applied:
+            done.set_result(None)
 
-            item_id = item.item_id
-            tags = item.tags
-            vector_id = item_id
+    async def _apply_items(
+        self,
+        items_with_embeddings: list[DataItemWithEmbeddingType],
+    ) -> None:
+        await self._ensure_writable()
+        await self._save_items(items_with_embeddings)
+        if not self._is_trained and self._faiss_index.ntotal >= self._train_size:
+            await self._train()
 
+    async def _save_items(
+        self,
+        items_with_embeddings: list[DataItemWithEmbeddingType],
+    ) -> None:
+        # the last occurrence of an item id in a batch wins, as it would if the
+        # items were saved one by one
+        item_id_to_position: dict[str, int] = {}
+        for i, item_with_embedding in enumerate(items_with_embeddings):
+            item_id_to_position[item_with_embedding.item.item_id] = i
+        if len(item_id_to_position) < len(items_with_embeddings):
+            items_with_embeddings = [
+                items_with_embeddings[i] for i in item_id_to_position.values()
+            ]
+
+        # an item has one vector per chunk
+        item_vectors = [
+            x.embedding.reshape(-1, self._embedding_size) for x in items_with_embeddings
+        ]
+        vectors = np.ascontiguousarray(np.concatenate(item_vectors), dtype=np.float32)
+        vector_int_ids = np.empty(len(vectors), dtype=np.int64)
+        tag_to_ids: dict[str, list[int]] = {}
+        sparse_ids: list[int] = []
+        sparse_vectors: list[SparseVector] = []
+        token_ids: list[int] = []
+        token_matrices: list[np.ndarray] = []
+        items: list[StoredItem] = []
+        # replaced vectors are tombstoned instead of removed from the index
+        self._tombstone([x.item.item_id for x in items_with_embeddings])
+        i = 0
+        for item_with_embedding, chunk_vectors in zip(
+            items_with_embeddings, item_vectors
+        ):
+            item = StoredItem.from_data_item(item_with_embedding.item)
+            for chunk in range(len(chunk_vectors)):
+                vector_int_id, _ = self._vector_ids.get_or_add(
+                    chunk_key(item.item_id, chunk)
+                )
+                vector_int_ids[i] = vector_int_id
+                i += 1
+                for tag in item.tags:
+                    tag_to_ids.setdefault(tag, []).append(vector_int_id)
+                if item_with_embedding.sparse_embeddings is not None:
+                    sparse_ids.append(vector_int_id)
+                    sparse_vectors.append(item_with_embedding.sparse_embeddings[chunk])
+                if item_with_embedding.token_embeddings is not None:
+                    token_ids.append(vector_int_id)
+                    token_matrices.append(item_with_embedding.token_embeddings[chunk])
+            self._num_chunk_vectors += len(chunk_vectors) - 1
+            items.append(item)
+
+        self._faiss_index.add_with_ids(vectors, vector_int_ids)
+        if self._vector_store is not None:
+            self._vector_store.add(vector_int_ids, vectors)
+        if self._added_during_compaction is not None:
+            self._added_during_compaction.append((vectors, vector_int_ids))
+
+        for tag, ids in tag_to_ids.items():
+            self._get_or_create_tag_bitmap(tag).add(np.array(ids, dtype=np.int64))
+        if sparse_vectors:
+            self._sparse_index.add(np.array(sparse_ids, dtype=np.int64), sparse_vectors)
+        if token_matrices:
+            self._token_store.add(np.array(token_ids, dtype=np.int64), token_matrices)
+        for item in items:
             await self._save_item(item=item)
 
-            for tag in tags:
-                tag_index: TagIndex = self._get_or_create_tag_index(tag)
-                tag_index.item_ids.add(item_id)
-                vector_ids: list[str] = tag_index.vector_ids
-                faiss_index: IndexType = tag_index.faiss_index
-
-                try:
-                    vector_int_id = vector_ids.index(vector_id)
-                    faiss_index.remove_ids(np.array([vector_int_id]))
-                except ValueError:
-                    vector_int_id = len(vector_ids)
-                    vector_ids.append(vector_id)
-                faiss_index.add_with_ids(vector, vector_int_id)
-
-    def _get_or_create_tag_index(self, tag: str) -> TagIndex:
+    async def _delete_items(self, item_ids: list[str]) -> None:
+        await self._ensure_writable()
+        for item_id in self._tombstone(item_ids):
+            del self._items[item_id]
+
+    def _tombstone(self, item_ids: list[str]) -> list[str]:
+        """
+        Retire the vectors of stored items. The vectors stay in the index and
+        are filtered out of searches until the next compaction.
+
+        :return: list[str]: The ids of the items that were stored.
+        """
+        dead_ids: list[int] = []
+        stale_tag_to_ids: dict[str, list[int]] = {}
+        found_item_ids: list[str] = []
+        for item_id in dict.fromkeys(item_ids):
+            if item_id not in self._vector_ids:
+                continue
+            tags = self._items[item_id].tags
+            chunk = 0
+            while chunk_key(item_id, chunk) in self._vector_ids:
+                # the id is recycled only after the vector is compacted away
+                vector_int_id = self._vector_ids.remove(
+                    chunk_key(item_id, chunk), reuse=False
+                )
+                dead_ids.append(vector_int_id)
+                for tag in tags:
+                    stale_tag_to_ids.setdefault(tag, []).append(vector_int_id)
+                chunk += 1
+            self._num_chunk_vectors -= chunk - 1
+            found_item_ids.append(item_id)
+        if dead_ids:
+            self._dead_ids.add(np.array(dead_ids, dtype=np.int64))
+            self._num_dead_ids += len(dead_ids)
+        for tag, ids in stale_tag_to_ids.items():
+            self._tag_to_bitmap[tag].discard(np.array(ids, dtype=np.int64))
+        return found_item_ids
+
+    def _maybe_compact(self) -> None:
+        if self._compaction is not None and not self._compaction.done():
+            return
+        ntotal = self._faiss_index.ntotal
+        threshold = self._config.compaction_threshold
+        if threshold is None or ntotal == 0 or self._num_dead_ids / ntotal < threshold:
+            return
+        self._compaction = asyncio.create_task(self.compact())
+
+    async def compact(self) -> None:
+        """
+        Remove tombstoned vectors from the index.
+
+        The index is compacted on a copy in a background thread, while queries
+        and writes go on against the current one. Vectors written in the
+        meantime are replayed into the compacted index before it is swapped in.
+        The sparse index and the token store are then purged into copies in a
+        thread as well, writes wait for that while queries go on.
+        """
+        if self._config.shared:
+            # other workers map the published index, compact it as a write
+            await self._write(self._compact)
+            return
+        async with self._write_lock:
+            await self._ensure_writable()
+            faiss_index = self._faiss_index
+            dead_ids = self._dead_ids.ids()
+            if len(dead_ids) == 0:
+                return
+            # writes only wait for the copy
+            index_copy = await asyncio.to_thread(faiss.clone_index, faiss_index)
+            self._added_during_compaction = []
         try:
-            tag_index: TagIndex = self._tag_to_index[tag]
-        except KeyError:
-            tag_index = TagIndex(
-                faiss_index=self._create_faiss_index(),
-                item_ids=set(),
-                vector_ids=[],
+            compacted = await self._compacted_index(index_copy, dead_ids)
+            async with self._write_lock:
+                if compacted is None or self._faiss_index is not faiss_index:
+                    # the index was trained or restored in the meantime
+                    return
+                for vectors, ids in self._added_during_compaction:
+                    compacted.add_with_ids(vectors, ids)
+                await self._swap_compacted(compacted, dead_ids)
+        finally:
+            self._added_during_compaction = None
+
+    async def _compact(self) -> None:
+        await self._ensure_writable()
+        dead_ids = self._dead_ids.ids()
+        if len(dead_ids) == 0:
+            return
+        index_copy = await asyncio.to_thread(faiss.clone_index, self._faiss_index)
+        compacted = await self._compacted_index(index_copy, dead_ids)
+        if compacted is not None:
+            await self._swap_compacted(compacted, dead_ids)
+
+    async def _compacted_index(
+        self, index_copy: IndexType, dead_ids: np.ndarray
+    ) -> IndexType | None:
+        start_time = time.time()
+        try:
+            compacted = await asyncio.to_thread(
+                faiss_index_utils.remove_or_rebuild,
+                index_copy,
+                dead_ids,
+                self._create_faiss_index,
+                can_remove=self._supports_remove,
+            )
+        except RuntimeError as e:
+            # tombstones keep being filtered out of searches
+            logger.warning(f"FAISS: compaction is not supported: {e}")
+            return None
+        end_time = time.time()
+        logger.info(
+            f"FAISS: {len(dead_ids)} tombstoned vectors compacted in "
+            f"{end_time - start_time:.3f} s."
+        )
+        return compacted
+
+    async def _swap_compacted(self, compacted: IndexType, dead_ids: np.ndarray) -> None:
+        """
+        Swap in a compacted index and purge the tombstoned vectors from the
+        side structures. Must be called under the write lock: the purged copies
+        are built in a thread while queries go on against the current ones.
+        """
+        self._sparse_index.merge()
+        sparse_index, token_store = await asyncio.to_thread(
+            lambda: (
+                self._sparse_index.without(dead_ids),
+                self._token_store.without(dead_ids),
             )
-            self._tag_to_index[tag] = tag_index
-        return tag_index
+        )
+        self._faiss_index = compacted
+        self._sparse_index = sparse_index
+        self._token_store = token_store
+        # the ids are reused from now on
+        self._dead_ids.discard(dead_ids)
+        self._num_dead_ids -= len(dead_ids)
+        self._vector_ids.release(dead_ids)
+
+    async def _train(self) -> None:
+        """
+        Train the configured index on the buffered vectors and migrate them
+        from the flat staging index into it.
+        """
+        start_time = time.time()
+        vectors, ids = faiss_index_utils.reconstruct_all(self._faiss_index)
+        # tombstoned vectors don't need to survive the migration
+        dead = self._dead_ids.contains(ids)
+        dead_ids = ids[dead]
+        vectors, ids = vectors[~dead], ids[~dead]
+
+        def train() -> IndexType:
+            index = self._create_faiss_index()
+            index.train(vectors)
+            index.add_with_ids(vectors, ids)
+            return index
+
+        # training may take a while, keep serving queries from the flat index
+        await self._swap_compacted(await asyncio.to_thread(train), dead_ids)
+        self._is_trained = True
+        self._supports_remove = faiss_index_utils.supports_remove(self._faiss_index)
+        self._supports_selector = faiss_index_utils.supports_selector(self._faiss_index)
+        end_time = time.time()
+        logger.info(
+            f"FAISS: `{self._index_factory}` index trained on "
+            f"{len(vectors)} vectors in {end_time - start_time:.3f} s."
+        )
+
+    def _get_or_create_tag_bitmap(self, tag: str) -> IdBitmap:
+        try:
+            bitmap: IdBitmap = self._tag_to_bitmap[tag]
+        except KeyError:
+            bitmap = IdBitmap()
+            self._tag_to_bitmap[tag] = bitmap
+        return bitmap
 
     def _create_faiss_index(self) -> IndexType:
-        return faiss.IndexIDMap(self._index_type(self._embedding_size))
+        return faiss_index_utils.create_index(self._index_factory, self._embedding_size)
+
+    def _filter(self, tags: list[str]) -> tuple[IdBitmap | None, IdBitmap | None]:
+        """
+        Describe which internal ids a search over the given tags may return.
+
+        :return: tuple[IdBitmap | None, IdBitmap | None]: Bitmaps of the ids to
+        include (None for all) and to exclude (None for none). Raises KeyError if
+        no vector can match.
+        """
+        included = None
+        if tags:
+            bitmaps = [
+                self._tag_to_bitmap[tag] for tag in tags if tag in self._tag_to_bitmap
+            ]
+            if not bitmaps:
+                raise KeyError(tags)
+            included = IdBitmap.union(bitmaps)
+        excluded = self._dead_ids if self._num_dead_ids else None
+        return included, excluded
+
+    def _search(
+        self,
+        query_embeddings: np.ndarray,
+        k: int,
+        tags: list[str],
+        search_params: dict[str, int],
+    ) -> tuple[np.ndarray, np.ndarray]:
+        faiss_index: IndexType = self._faiss_index
+        k = min(k, faiss_index.ntotal)
+        included, excluded = self._filter(tags)
+        nprobe = search_params.get("nprobe", self._config.nprobe)
+        ef_search = search_params.get("ef_search", self._config.ef_search)
+
+        if self._supports_selector or (included is None and excluded is None):
+            sel = None
+            if included is not None:
+                sel = included.selector()
+            if excluded is not None:
+                not_excluded = faiss.IDSelectorNot(excluded.selector())
+                sel = (
+                    not_excluded
+                    if sel is None
+                    else faiss.IDSelectorAnd(sel, not_excluded)
+                )
+            params = faiss_index_utils.search_parameters(
+                faiss_index, sel, nprobe, ef_search
+            )
+            # selectors point into the bitmap buffers, which stay alive as locals
+            return faiss_index.search(query_embeddings, k, params=params)
+
+        # the index can't apply a selector, over-fetch and filter the results
+        params = faiss_index_utils.search_parameters(
+            faiss_index, None, nprobe, ef_search
+        )
+        k_fetch = k
+        while True:
+            scores, ids = faiss_index.search(query_embeddings, k_fetch, params=params)
+            mask = ids >= 0
+            if included is not None:
+                mask &= included.contains(ids.ravel()).reshape(ids.shape)
+            if excluded is not None:
+                mask &= ~excluded.contains(ids.ravel()).reshape(ids.shape)
+            if (mask.sum(axis=1) >= k).all() or k_fetch >= faiss_index.ntotal:
+                break
+            k_fetch = min(k_fetch * POST_FILTER_GROWTH, faiss_index.ntotal)
+        # move matching results to the front, keeping their order
+        order = np.argsort(~mask, axis=1, kind="stable")[:, :k]
+        scores = np.take_along_axis(scores, order, axis=1)
+        ids = np.take_along_axis(ids, order, axis=1)
+        ids[~np.take_along_axis(mask, order, axis=1)] = -1
+        return scores, ids
+
+    def _search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        k: int,
+        key: tuple[tuple[str, ...], tuple[tuple[str, int], ...]],
+    ) -> tuple[np.ndarray, np.ndarray]:
+        tags, search_params = key
+        return self._search(query_embeddings, k, list(tags), dict(search_params))
 
     async def query(
         self,
@@ -97,70 +521,330 @@ class FaissVectorDatabase(VectorDatabase, Generic[IndexType, DataItemType]):
         tags: list[str],
         num_items: int,
         remove_duplicates: bool,
-    ) -> list[DataItemType]:
+        search_params: dict[str, int] | None = None,
+        sparse_query_embeddings: list[SparseVector] | None = None,
+        token_query_embeddings: list[np.ndarray] | None = None,
+    ) -> list[ScoredItem]:
         if num_items <= 0:
             return []
 
         tags = list(set(tags))
+        search_params = search_params or {}
+        unknown_params = set(search_params) - SEARCH_PARAMS
+        if unknown_params:
+            raise InvalidInputException(
+                f"Unknown search parameters: {sorted(unknown_params)}. "
+                f"Supported: {sorted(SEARCH_PARAMS)}."
+            )
 
-        score_item_ids: list[ScoreItem] = []
-
-        query_embeddings = np.array(query_embeddings).astype("float32")
-        for tag in tags:
-            if tag not in self._tag_to_index:
-                continue
-
-            tag_index: TagIndex = self._tag_to_index[tag]
+        # a write of this worker is publishing a snapshot, it is up to date
+        if self._config.shared and not self._write_lock.locked() and self._is_stale():
+            # writes wait for the refresh, other queries go on with the old state
+            async with self._write_lock:
+                if self._is_stale():
+                    await self._refresh_snapshot()
 
-            faiss_index: IndexType = tag_index.faiss_index
-            if faiss_index.ntotal == 0:
-                continue
+        if self._faiss_index.ntotal == 0:
+            return []
 
-            scores, indexes = faiss_index.search(
+        if self._token_store.is_empty:
+            token_query_embeddings = None
+        if not sparse_query_embeddings or self._sparse_index.is_empty:
+            return await self._query_dense(
                 query_embeddings,
-                min(num_items, faiss_index.ntotal),
+                tags,
+                num_items,
+                remove_duplicates,
+                search_params,
+                token_query_embeddings,
             )
-            vector_ids: list[str] = tag_index.vector_ids
-            for i in range(len(scores)):
-                for score, local_index in zip(scores[i], indexes[i]):
-                    vector_id = vector_ids[local_index]
-                    # TODO: add support for multivector items
-                    #  vector_id may be item_id + "_0", + "_1", etc
-                    item_id = vector_id
-                    heapq.heappush(
-                        score_item_ids,
-                        ScoreItem(
-                            score=score,
-                            item_id=item_id,
-                            tag=tag,
-                        ),
-                    )
-
-        items: list[DataItemType] = []
-        unique_item_ids = set()
-        for score_item in sorted(score_item_ids, key=lambda x: x, reverse=True):
-            item_id = score_item.item_id
-            try:
-                if remove_duplicates:
-                    if item_id in unique_item_ids:
-                        continue
-                    unique_item_ids.add(item_id)
-
-                item: DataItemType = self._item_id_to_item[item_id]
-                item = deepcopy(item)
-                item.score = score_item.score
-                items.append(item)
-            except KeyError:
-                logger.error(
-                    f"Key: `{item_id}`, "
-                    f"tag: `{score_item.tag}`, "
-                    f"score: `{score_item.score}`"
+        num_fetched = num_items * FUSION_GROWTH
+        dense_items = await self._query_dense(
+            query_embeddings,
+            tags,
+            num_fetched,
+            True,
+            search_params,
+            token_query_embeddings,
+        )
+        sparse_items = self._query_sparse(sparse_query_embeddings, tags, num_fetched)
+        # an item occurs once in a fused ranking
+        return fuse(
+            [dense_items, sparse_items],
+            weights=[1.0, self._config.sparse_weight],
+            method=self._config.fusion,
+            rrf_k=self._config.rrf_k,
+        )[:num_items]
+
+    async def _query_dense(
+        self,
+        query_embeddings: list[np.ndarray],
+        tags: list[str],
+        num_items: int,
+        remove_duplicates: bool,
+        search_params: dict[str, int],
+        token_query_embeddings: list[np.ndarray] | None = None,
+    ) -> list[ScoredItem]:
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        k = num_items
+        if token_query_embeddings is not None:
+            k = max(k, self._config.late_interaction_candidates)
+        if self._num_chunk_vectors:
+            k = min(k * CHUNK_GROWTH, self._faiss_index.ntotal)
+        num_kept = k
+        if self._vector_store is not None and token_query_embeddings is None:
+            # the scores of a lossy index may misorder the candidates at the cut
+            k *= self._config.rescore_factor
+        try:
+            if self._search_batcher is None:
+                scores, indexes = self._search(query_embeddings, k, tags, search_params)
+            else:
+                # concurrent queries with the same filter share one search
+                key = (tuple(sorted(tags)), tuple(sorted(search_params.items())))
+                scores, indexes = await self._search_batcher.search(
+                    key, query_embeddings, k
                 )
-                raise KeyError
-        return items[:num_items]
+        except KeyError:
+            return []
+        if token_query_embeddings is not None:
+            scores, indexes = await self._rescore_tokens(
+                token_query_embeddings, indexes
+            )
+        elif self._vector_store is not None:
+            scores, indexes = self._rescore(query_embeddings, indexes, num_kept)
+        if self._num_chunk_vectors:
+            return self._aggregate_chunks(scores, indexes, num_items, remove_duplicates)
+        # filtered searches pad missing results with -1, the merge drops them
+        scores, indexes = merge_top_k(scores, indexes, num_items, remove_duplicates)
+        item_ids = self._vector_ids.keys(indexes)
+        # stored items are immutable and returned without copying
+        return [
+            ScoredItem(item=self._items[item_id], score=score)
+            for item_id, score in zip(item_ids, scores.tolist())
+        ]
+
+    def _rescore(
+        self, query_embeddings: np.ndarray, indexes: np.ndarray, k: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Score the nearest vectors of every query embedding by their float32
+        copies and keep the best k of them.
+        """
+        scores = self._vector_store.score(query_embeddings, indexes)
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return (
+            np.take_along_axis(scores, order, axis=1),
+            np.take_along_axis(indexes, order, axis=1),
+        )
+
+    async def _rescore_tokens(
+        self, token_query_embeddings: list[np.ndarray], indexes: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Replace the scores of the nearest vectors of every query embedding with
+        their late interaction scores and reorder them. Vectors without token
+        embeddings are dropped like filtered out results.
+        """
+        # compaction swaps in a purged store, writes only append to this one
+        token_store = self._token_store
+
+        def maxsim() -> np.ndarray:
+            scores = np.empty(indexes.shape, dtype=np.float32)
+            for row, query in enumerate(token_query_embeddings):
+                scores[row] = token_store.maxsim(query, indexes[row])
+            return scores
+
+        # scoring many candidates would stall other requests on the loop
+        scores = await asyncio.to_thread(maxsim)
+        indexes = np.where(np.isfinite(scores), indexes, -1)
+        order = np.argsort(-scores, axis=1, kind="stable")
+        return (
+            np.take_along_axis(scores, order, axis=1),
+            np.take_along_axis(indexes, order, axis=1),
+        )
+
+    def _query_sparse(
+        self,
+        sparse_query_embeddings: list[SparseVector],
+        tags: list[str],
+        num_items: int,
+    ) -> list[ScoredItem]:
+        try:
+            included, excluded = self._filter(tags)
+        except KeyError:
+            return []
+        k = num_items * CHUNK_GROWTH if self._num_chunk_vectors else num_items
+        results = [
+            self._sparse_index.search(query, k, included, excluded)
+            for query in sparse_query_embeddings
+        ]
+        # pad the rows like filtered dense searches
+        scores = np.zeros((len(results), k), dtype=np.float32)
+        indexes = np.full((len(results), k), -1, dtype=np.int64)
+        for row, (row_scores, row_indexes) in enumerate(results):
+            scores[row, : len(row_scores)] = row_scores
+            indexes[row, : len(row_indexes)] = row_indexes
+        return self._aggregate_chunks(scores, indexes, num_items, True)
+
+    def _aggregate_chunks(
+        self,
+        scores: np.ndarray,
+        indexes: np.ndarray,
+        num_items: int,
+        remove_duplicates: bool,
+    ) -> list[ScoredItem]:
+        """
+        Turn the chunk hits of every query embedding into one score per item,
+        the best or the sum of its chunk scores, and merge them.
+        """
+        aggregate = max if self._config.chunk_aggregation == "max" else sum
+        item_scores: list[tuple[float, str]] = []
+        for row_scores, row_indexes in zip(scores.tolist(), indexes):
+            valid = row_indexes >= 0
+            item_to_scores: dict[str, list[float]] = {}
+            for key, score in zip(
+                self._vector_ids.keys(row_indexes[valid]),
+                np.asarray(row_scores)[valid].tolist(),
+            ):
+                item_id = key.partition(CHUNK_SEPARATOR)[0]
+                item_to_scores.setdefault(item_id, []).append(score)
+            item_scores.extend(
+                (aggregate(chunk_scores), item_id)
+                for item_id, chunk_scores in item_to_scores.items()
+            )
+        item_scores.sort(key=lambda x: x[0], reverse=True)
+        results: list[ScoredItem] = []
+        seen_item_ids: set[str] = set()
+        for score, item_id in item_scores:
+            if len(results) == num_items:
+                break
+            if remove_duplicates:
+                # the first occurrence of an item in score order is its best one
+                if item_id in seen_item_ids:
+                    continue
+                seen_item_ids.add(item_id)
+            results.append(ScoredItem(item=self._items[item_id], score=score))
+        return results
 
     async def _save_item(
         self,
-        item: DataItemType,
+        item: StoredItem,
     ) -> None:
-        self._item_id_to_item[item.item_id] = item
+        self._items[item.item_id] = item
+
+    def _manifest(self) -> dict:
+        return {
+            "embedding_size": self._embedding_size,
+            "index_factory": self._index_factory,
+            "is_trained": self._is_trained,
+            "is_ivf": faiss.try_extract_index_ivf(self._faiss_index) is not None,
+            "supports_remove": self._supports_remove,
+            "supports_selector": self._supports_selector,
+            "num_dead_ids": self._num_dead_ids,
+            "num_chunk_vectors": self._num_chunk_vectors,
+        }
+
+    async def save_snapshot(self) -> None:
+        """
+        Persist the database to a new snapshot in the configured directory.
+        """
+        if not self._config.snapshot_dir:
+            raise ValueError("FAISS_SNAPSHOT_DIR is not configured.")
+        async with self._write_lock:
+            await self._write_snapshot()
+
+    async def _write_snapshot(self) -> None:
+        # queries keep running while the snapshot is written, writes wait
+        index_path = await asyncio.to_thread(
+            snapshot.write_snapshot,
+            snapshot_dir=self._config.snapshot_dir,
+            manifest=self._manifest(),
+            faiss_index=self._faiss_index,
+            vector_ids=self._vector_ids,
+            dead_ids=self._dead_ids,
+            tag_to_bitmap=self._tag_to_bitmap,
+            sparse_index=self._sparse_index,
+            token_store=self._token_store,
+            vector_store=self._vector_store,
+            items=self._items,
+        )
+        # older snapshots are gone, a mapped index reloads from the new one
+        self._index_path = index_path
+        self._snapshot_path = os.path.dirname(index_path)
+
+    def _restore_snapshot(self) -> None:
+        self._apply_snapshot(self._read_snapshot())
+
+    async def _refresh_snapshot(self) -> None:
+        """Restore the latest snapshot, reading it in a thread."""
+        self._apply_snapshot(await asyncio.to_thread(self._read_snapshot))
+
+    def _read_snapshot(self) -> snapshot.SnapshotState | None:
+        return snapshot.read_snapshot(
+            self._config.snapshot_dir,
+            # every worker of a shared database maps the same files
+            mmap=self._config.snapshot_mmap or self._config.shared,
+        )
+
+    def _apply_snapshot(self, state: snapshot.SnapshotState | None) -> None:
+        if state is None:
+            return
+        manifest = state.manifest
+        if (
+            manifest["embedding_size"] != self._embedding_size
+            or manifest["index_factory"] != self._index_factory
+        ):
+            raise ValueError(
+                f"Snapshot of a `{manifest['index_factory']}` index with embedding "
+                f"size {manifest['embedding_size']} doesn't match the configured "
+                f"`{self._index_factory}` index with embedding size "
+                f"{self._embedding_size}."
+            )
+        self._faiss_index = state.faiss_index
+        self._is_trained = manifest["is_trained"]
+        self._supports_remove = manifest["supports_remove"]
+        self._supports_selector = manifest["supports_selector"]
+        self._num_dead_ids = manifest["num_dead_ids"]
+        self._num_chunk_vectors = manifest.get("num_chunk_vectors", 0)
+        self._vector_ids = state.vector_ids
+        self._dead_ids = state.dead_ids
+        self._tag_to_bitmap = state.tag_to_bitmap
+        self._sparse_index = state.sparse_index
+        self._token_store = state.token_store
+        if self._vector_store is not None:
+            if state.vector_store is None:
+                # the vectors are gone once the index stored them lossily
+                logger.warning(
+                    "FAISS: snapshot has no float32 vectors, rescoring is disabled."
+                )
+            self._vector_store = state.vector_store
+        self._items = state.items
+        self._is_mapped = state.is_mapped
+        self._index_path = state.index_path
+        self._snapshot_path = state.path
+
+    def _is_stale(self) -> bool:
+        """Check whether another process published a newer snapshot."""
+        return (
+            snapshot.latest_snapshot(self._config.snapshot_dir) != self._snapshot_path
+        )
+
+    async def _ensure_writable(self) -> None:
+        if not self._is_mapped:
+            return
+        start_time = time.time()
+        # FAISS aborts on writes to mapped storage, read the index into memory
+        self._faiss_index = await asyncio.to_thread(faiss.read_index, self._index_path)
+        self._is_mapped = False
+        end_time = time.time()
+        logger.info(
+            f"FAISS: memory-mapped index loaded into memory for writing in "
+            f"{end_time - start_time:.3f} s."
+        )
+
+    async def close(self) -> None:
+        if self._compaction is not None:
+            await self._compaction
+        # a shared database publishes every write as it happens
+        if self._config.snapshot_dir and not self._config.shared:
+            await self.save_snapshot()
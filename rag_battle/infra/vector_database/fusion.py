@@ -0,0 +1,42 @@
+from typing import Literal
+
+from rag_battle.domain.schemas import ScoredItem
+
+
+def fuse(
+    rankings: list[list[ScoredItem]],
+    weights: list[float],
+    method: Literal["rrf", "weighted"],
+    rrf_k: int = 60,
+) -> list[ScoredItem]:
+    """
+    Fuse rankings of the same items into one.
+
+    Reciprocal rank fusion scores an item by the sum of weight / (rrf_k + rank)
+    over the rankings it occurs in, which needs no comparable scores. Weighted
+    fusion sums weight * score, missing from a ranking counts as 0.
+
+    :param rankings: Items ordered by descending score, every item at most once
+    per ranking.
+    :param weights: Weight of every ranking.
+
+    :return: list[ScoredItem]: The items of all rankings ordered by descending
+    fused score.
+    """
+    item_scores: dict[str, float] = {}
+    items: dict[str, ScoredItem] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, scored_item in enumerate(ranking, start=1):
+            item_id = scored_item.item.item_id
+            if method == "rrf":
+                score = weight / (rrf_k + rank)
+            else:
+                score = weight * scored_item.score
+            item_scores[item_id] = item_scores.get(item_id, 0.0) + score
+            items.setdefault(item_id, scored_item)
+    return [
+        ScoredItem(item=items[item_id].item, score=score)
+        for item_id, score in sorted(
+            item_scores.items(), key=lambda x: x[1], reverse=True
+        )
+    ]
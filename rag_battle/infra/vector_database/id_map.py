@@ -0,0 +1,179 @@
+import os
+import hashlib
+import numpy as np
+
+from rag_battle.infra.vector_database.packed_strings import PackedStrings
+
+
+def _key_hash(key: str) -> int:
+    # stable across processes, unlike `hash`
+    return int.from_bytes(
+        hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+
+class IdMap:
+    """
+    Bidirectional map between external string ids and internal int64 ids.
+
+    Ids restored from a snapshot stay in packed (possibly memory-mapped)
+    arrays: the keys by internal id for reverse lookups, and a sorted table of
+    key hashes for forward lookups. Keys added or removed afterwards live in
+    dicts that shadow the packed ones, so workers mapping the same snapshot
+    share one copy of it. Ids released by `remove` are recycled by later
+    insertions to keep the id space compact.
+    """
+
+    def __init__(self):
+        self._key_to_id: dict[str, int] = {}
+        # internal ids changed since the packed map, None for removed keys
+        self._id_to_key: dict[int, str | None] = {}
+        self._free_ids: list[int] = []
+        self._next_id: int = 0
+        self._num_keys: int = 0
+        self._packed_keys: PackedStrings | None = None
+        self._packed_assigned: np.ndarray = np.zeros(0, dtype=bool)
+        self._packed_hashes: np.ndarray = np.zeros(0, dtype=np.uint64)
+        self._packed_hash_ids: np.ndarray = np.zeros(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self._num_keys
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    @property
+    def capacity(self) -> int:
+        """Upper bound (exclusive) of the internal ids handed out so far."""
+        return self._next_id
+
+    def get(self, key: str) -> int | None:
+        int_id = self._key_to_id.get(key)
+        if int_id is not None:
+            return int_id
+        int_id = self._packed_get(key)
+        # the key was removed, and its id possibly reused, since
+        if int_id is None or int_id in self._id_to_key:
+            return None
+        return int_id
+
+    def _packed_get(self, key: str) -> int | None:
+        if self._packed_keys is None:
+            return None
+        key_hash = np.uint64(_key_hash(key))
+        start = np.searchsorted(self._packed_hashes, key_hash, side="left")
+        stop = np.searchsorted(self._packed_hashes, key_hash, side="right")
+        for int_id in self._packed_hash_ids[start:stop].tolist():
+            if self._packed_keys[int_id] == key:
+                return int_id
+        return None
+
+    def get_or_add(self, key: str) -> tuple[int, bool]:
+        """
+        Return the internal id of a key, allocating one if the key is new.
+
+        :return: tuple[int, bool]: The internal id and whether it was just created.
+        """
+        int_id = self.get(key)
+        if int_id is not None:
+            return int_id, False
+        if self._free_ids:
+            int_id = self._free_ids.pop()
+        else:
+            int_id = self._next_id
+            self._next_id += 1
+        self._key_to_id[key] = int_id
+        self._id_to_key[int_id] = key
+        self._num_keys += 1
+        return int_id, True
+
+    def remove(self, key: str, reuse: bool = True) -> int:
+        """
+        Forget a key and release its internal id.
+
+        :param key: The external id to forget.
+        :param reuse: Whether the internal id may be handed out again. Ids whose
+        vectors can't be removed from the index must not be reused.
+
+        :return: int: The internal id the key was mapped to.
+        """
+        int_id = self.get(key)
+        if int_id is None:
+            raise KeyError(key)
+        self._key_to_id.pop(key, None)
+        if int_id < len(self._packed_assigned):
+            # shadows the packed key
+            self._id_to_key[int_id] = None
+        else:
+            del self._id_to_key[int_id]
+        self._num_keys -= 1
+        if reuse:
+            self._free_ids.append(int_id)
+        return int_id
+
+    def release(self, int_ids: np.ndarray) -> None:
+        """
+        Allow internal ids of keys removed with `reuse=False` to be handed out
+        again, once their vectors are gone from the index.
+        """
+        self._free_ids.extend(int(int_id) for int_id in int_ids)
+
+    def key(self, int_id: int) -> str | None:
+        try:
+            return self._id_to_key[int_id]
+        except KeyError:
+            pass
+        if int_id < len(self._packed_assigned) and self._packed_assigned[int_id]:
+            return self._packed_keys[int_id]
+        return None
+
+    def keys(self, int_ids: np.ndarray) -> np.ndarray:
+        keys = np.empty(len(int_ids), dtype=object)
+        keys[:] = [self.key(int_id) for int_id in int_ids.tolist()]
+        return keys
+
+    def write(self, path: str) -> None:
+        """
+        Write the map to files under the `path` prefix.
+        """
+        keys = [self.key(int_id) for int_id in range(self._next_id)]
+        PackedStrings.write(f"{path}.keys", (key or "" for key in keys))
+        assigned = np.array([key is not None for key in keys], dtype=bool)
+        np.save(f"{path}.assigned.npy", assigned)
+        np.save(f"{path}.free.npy", np.array(self._free_ids, dtype=np.int64))
+        int_ids = np.flatnonzero(assigned)
+        hashes = np.array(
+            [_key_hash(keys[int_id]) for int_id in int_ids.tolist()], dtype=np.uint64
+        )
+        order = np.argsort(hashes, kind="stable")
+        np.save(f"{path}.hashes.npy", hashes[order])
+        np.save(f"{path}.hash_ids.npy", int_ids[order])
+
+    @classmethod
+    def read(cls, path: str, mmap: bool = True) -> "IdMap":
+        """
+        Read a map written by `write`.
+
+        :param mmap: Whether to memory-map the packed arrays instead of reading
+        them into memory.
+        """
+        mmap_mode = "r" if mmap else None
+        self = cls()
+        self._packed_keys = PackedStrings.read(f"{path}.keys", mmap=mmap)
+        self._packed_assigned = np.load(f"{path}.assigned.npy", mmap_mode=mmap_mode)
+        self._next_id = len(self._packed_keys)
+        self._num_keys = int(np.count_nonzero(self._packed_assigned))
+        self._free_ids = np.load(f"{path}.free.npy").tolist()
+        if os.path.exists(f"{path}.hashes.npy"):
+            self._packed_hashes = np.load(f"{path}.hashes.npy", mmap_mode=mmap_mode)
+            self._packed_hash_ids = np.load(f"{path}.hash_ids.npy", mmap_mode=mmap_mode)
+        else:
+            # snapshots written before the hash table
+            int_ids = np.flatnonzero(self._packed_assigned)
+            hashes = np.array(
+                [_key_hash(self._packed_keys[int_id]) for int_id in int_ids.tolist()],
+                dtype=np.uint64,
+            )
+            order = np.argsort(hashes, kind="stable")
+            self._packed_hashes, self._packed_hash_ids = hashes[order], int_ids[order]
+        return self
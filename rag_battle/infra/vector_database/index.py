@@ -0,0 +1,183 @@
+import re
+import faiss
+import numpy as np
+from typing import Callable
+
+# FAISS warns when k-means gets fewer training points than this per centroid
+MIN_POINTS_PER_CENTROID = 39
+# training a product or scalar quantizer codebook of 256 centroids
+DEFAULT_TRAIN_SIZE = MIN_POINTS_PER_CENTROID * 256
+# factory encodings of the vectors stored in flat, HNSW and IVF indexes
+STORAGE_ENCODINGS = {"fp32": "Flat", "fp16": "SQfp16", "sq8": "SQ8"}
+HNSW_PATTERN = re.compile(r"HNSW\d+")
+
+
+def _wrap_id_map(index: faiss.Index) -> faiss.IndexIDMap:
+    id_map = faiss.IndexIDMap(index)
+    # hand ownership of the wrapped index over to the C++ side
+    id_map.own_fields = True
+    index.thisown = False
+    return id_map
+
+
+def _with_ids(index: faiss.Index) -> faiss.Index:
+    if isinstance(index, faiss.IndexIVF):
+        # inverted lists store ids natively and, unlike an id map, stay
+        # consistent when vectors are removed
+        return index
+    return _wrap_id_map(index)
+
+
+def with_storage(index_factory: str, storage: str) -> str:
+    """
+    Change the encoding of the vectors in a FAISS factory string, e.g. `Flat` to
+    `SQ8`, `HNSW32` to `HNSW32,SQ8` or `IVF4096,Flat` to `IVF4096,SQ8`.
+
+    Raises ValueError for factory strings that already compress the vectors
+    in another way, e.g. with product quantization.
+    """
+    if storage == "fp32":
+        return index_factory
+    components = index_factory.split(",")
+    encoding = STORAGE_ENCODINGS[storage]
+    if components[-1] == "Flat":
+        components[-1] = encoding
+    elif HNSW_PATTERN.fullmatch(components[-1]):
+        components.append(encoding)
+    else:
+        raise ValueError(
+            f"`{index_factory}` doesn't store flat vectors, they can't be stored "
+            f"as {storage}."
+        )
+    return ",".join(components)
+
+
+def create_index(index_factory: str, embedding_size: int) -> faiss.Index:
+    """
+    Create an inner product index from a FAISS factory string.
+
+    The returned index accepts arbitrary int64 ids. For indexes with a
+    pre-transform (OPQ, PCA, ...) ids are handled below the transform, so that
+    id selectors reach the index that actually runs the search.
+    """
+    index = faiss.index_factory(
+        embedding_size, index_factory, faiss.METRIC_INNER_PRODUCT
+    )
+    if isinstance(index, faiss.IndexPreTransform):
+        inner_index = faiss.downcast_index(index.index)
+        inner_index_with_ids = _with_ids(inner_index)
+        if inner_index_with_ids is not inner_index:
+            index.index = inner_index_with_ids
+            # the pre-transform owns its sub-index
+            inner_index_with_ids.thisown = False
+        return index
+    return _with_ids(index)
+
+
+def create_flat_index(embedding_size: int) -> faiss.Index:
+    return _wrap_id_map(faiss.IndexFlatIP(embedding_size))
+
+
+def default_train_size(index: faiss.Index) -> int:
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None:
+        return DEFAULT_TRAIN_SIZE
+    return max(MIN_POINTS_PER_CENTROID * ivf.nlist, DEFAULT_TRAIN_SIZE)
+
+
+def search_parameters(
+    index: faiss.Index,
+    sel: faiss.IDSelector | None = None,
+    nprobe: int | None = None,
+    ef_search: int | None = None,
+) -> faiss.SearchParameters | None:
+    """
+    Build search parameters matching the structure of an index.
+
+    :return: faiss.SearchParameters | None: Parameters to pass to `search`, or
+    None if there is nothing to set.
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIDMap):
+        # the id map translates the selector and forwards the same parameters
+        return search_parameters(index.index, sel, nprobe, ef_search)
+    if isinstance(index, faiss.IndexPreTransform):
+        index_params = search_parameters(index.index, sel, nprobe, ef_search)
+        if index_params is None:
+            return None
+        params = faiss.SearchParametersPreTransform()
+        params.index_params = index_params
+        params.referenced_objects = [index_params]
+        return params
+    if isinstance(index, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF(sel=sel)
+        if nprobe is not None:
+            params.nprobe = nprobe
+        return params
+    if isinstance(index, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=sel)
+        if ef_search is not None:
+            params.efSearch = ef_search
+        return params
+    if sel is None:
+        return None
+    return faiss.SearchParameters(sel=sel)
+
+
+def reconstruct_all(index: faiss.Index) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Read all vectors and their ids back from an index with an id map.
+
+    :return: tuple[np.ndarray, np.ndarray]: The (possibly lossy) vectors and
+    their ids. Raises RuntimeError for indexes that can't reconstruct vectors.
+    """
+    index = faiss.downcast_index(index)
+    if not isinstance(index, faiss.IndexIDMap):
+        raise RuntimeError(f"Can't reconstruct vectors of {type(index).__name__}.")
+    ids = faiss.vector_to_array(index.id_map)
+    return index.index.reconstruct_n(0, index.ntotal), ids
+
+
+def remove_or_rebuild(
+    index: faiss.Index,
+    ids: np.ndarray,
+    create_index: Callable[[], faiss.Index],
+    can_remove: bool,
+) -> faiss.Index:
+    """
+    Get rid of the vectors with the given ids in one pass.
+
+    Indexes supporting removal are modified in place, others are rebuilt from
+    their reconstructed vectors into a new index.
+
+    :return: faiss.Index: The index without the vectors.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if can_remove:
+        index.remove_ids(ids)
+        return index
+    vectors, vector_ids = reconstruct_all(index)
+    keep = ~np.isin(vector_ids, ids)
+    rebuilt = create_index()
+    if not rebuilt.is_trained:
+        rebuilt.train(vectors[keep])
+    rebuilt.add_with_ids(vectors[keep], vector_ids[keep])
+    return rebuilt
+
+
+def supports_remove(index: faiss.Index) -> bool:
+    try:
+        index.remove_ids(np.empty(0, dtype=np.int64))
+    except RuntimeError:
+        return False
+    return True
+
+
+def supports_selector(index: faiss.Index) -> bool:
+    """Check whether a trained index accepts an id selector at search time."""
+    params = search_parameters(index, sel=faiss.IDSelectorAll())
+    try:
+        index.search(np.zeros((1, index.d), dtype=np.float32), 1, params=params)
+    except RuntimeError:
+        return False
+    return True
@@ -0,0 +1,81 @@
+import json
+from typing import Iterator
+
+from rag_battle.domain.schemas import StoredItem
+from rag_battle.infra.vector_database.packed_strings import PackedStrings
+
+
+class ItemStore:
+    """
+    Stored items by item id.
+
+    Items restored from a snapshot stay in packed (possibly memory-mapped)
+    arrays and are decoded on access, items saved afterwards live in a dict
+    that shadows the packed ones.
+    """
+
+    def __init__(
+        self,
+        packed_item_ids: PackedStrings | None = None,
+        packed_contents: PackedStrings | None = None,
+        packed_tags: PackedStrings | None = None,
+    ):
+        self._items: dict[str, StoredItem] = {}
+        self._packed_contents = packed_contents
+        self._packed_tags = packed_tags
+        self._packed_rows: dict[str, int] = {}
+        if packed_item_ids is not None:
+            self._packed_rows = {
+                item_id: row for row, item_id in enumerate(packed_item_ids.tolist())
+            }
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._items or item_id in self._packed_rows
+
+    def __getitem__(self, item_id: str) -> StoredItem:
+        try:
+            return self._items[item_id]
+        except KeyError:
+            pass
+        row = self._packed_rows[item_id]
+        return StoredItem(
+            item_id=item_id,
+            content=self._packed_contents[row],
+            tags=tuple(json.loads(self._packed_tags[row])),
+        )
+
+    def __setitem__(self, item_id: str, item: StoredItem) -> None:
+        self._items[item_id] = item
+
+    def __delitem__(self, item_id: str) -> None:
+        found = self._items.pop(item_id, None) is not None
+        found = self._packed_rows.pop(item_id, None) is not None or found
+        if not found:
+            raise KeyError(item_id)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._items
+        for item_id in self._packed_rows:
+            if item_id not in self._items:
+                yield item_id
+
+    def write(self, path: str) -> None:
+        """
+        Write all items to packed arrays under the `path` prefix.
+        """
+        item_ids = list(self)
+        PackedStrings.write(f"{path}.ids", item_ids)
+        PackedStrings.write(
+            f"{path}.contents", (self[item_id].content for item_id in item_ids)
+        )
+        PackedStrings.write(
+            f"{path}.tags", (json.dumps(self[item_id].tags) for item_id in item_ids)
+        )
+
+    @classmethod
+    def read(cls, path: str, mmap: bool = True) -> "ItemStore":
+        return cls(
+            packed_item_ids=PackedStrings.read(f"{path}.ids", mmap=mmap),
+            packed_contents=PackedStrings.read(f"{path}.contents", mmap=mmap),
+            packed_tags=PackedStrings.read(f"{path}.tags", mmap=mmap),
+        )
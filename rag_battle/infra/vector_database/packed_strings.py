@@ -0,0 +1,56 @@
+import os
+import numpy as np
+from typing import Iterable
+
+
+class PackedStrings:
+    """
+    Immutable sequence of strings stored as one utf-8 buffer plus offsets.
+
+    Both arrays can be memory-mapped from disk, in which case a string is only
+    read and decoded when it is accessed.
+    """
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self._offsets: np.ndarray = offsets
+        self._data: np.ndarray = data
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        start, end = self._offsets[i], self._offsets[i + 1]
+        return self._data[start:end].tobytes().decode("utf-8")
+
+    def tolist(self) -> list[str]:
+        data = self._data.tobytes()
+        offsets = self._offsets.tolist()
+        return [
+            data[start:end].decode("utf-8")
+            for start, end in zip(offsets[:-1], offsets[1:])
+        ]
+
+    @staticmethod
+    def write(path: str, strings: Iterable[str]) -> None:
+        """
+        Write strings to `{path}.offsets.npy` and `{path}.data`.
+        """
+        offsets = [0]
+        with open(f"{path}.data", "wb") as f:
+            for string in strings:
+                encoded = string.encode("utf-8")
+                f.write(encoded)
+                offsets.append(offsets[-1] + len(encoded))
+        np.save(f"{path}.offsets.npy", np.array(offsets, dtype=np.int64))
+
+    @classmethod
+    def read(cls, path: str, mmap: bool = True) -> "PackedStrings":
+        offsets = np.load(f"{path}.offsets.npy", mmap_mode="r" if mmap else None)
+        if not mmap:
+            data = np.fromfile(f"{path}.data", dtype=np.uint8)
+        elif os.path.getsize(f"{path}.data") == 0:
+            # an empty file can't be memory-mapped
+            data = np.zeros(0, dtype=np.uint8)
+        else:
+            data = np.memmap(f"{path}.data", dtype=np.uint8, mode="r")
+        return cls(offsets=offsets, data=data)
@@ -0,0 +1,79 @@
+import asyncio
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Callable, Hashable
+
+SearchFunction = Callable[[np.ndarray, int, Hashable], tuple[np.ndarray, np.ndarray]]
+
+
+@dataclass
+class _Batch:
+    queries: list[tuple[np.ndarray, int, asyncio.Future]] = field(default_factory=list)
+    size: int = 0
+    timer: asyncio.TimerHandle | None = None
+
+
+class SearchBatcher:
+    """
+    Coalesces concurrent searches into one matrix search per search key.
+
+    Searches with the same key (e.g. the same filter and search parameters) that
+    arrive within `max_wait` seconds of the first one are stacked and run as a
+    single search for the largest requested k, which lets BLAS multiply a
+    matrix of queries at once instead of one vector at a time. A batch is run
+    early once it holds `max_size` query vectors.
+    """
+
+    def __init__(self, search: SearchFunction, max_wait: float, max_size: int):
+        """
+        :param search: Runs a search of a matrix of query vectors for k hits
+        under a search key and returns the scores and ids, one row per query.
+        :param max_wait: Seconds to wait for other searches after the first one.
+        :param max_size: Number of query vectors that triggers the search early.
+        """
+        self._search = search
+        self._max_wait = max_wait
+        self._max_size = max_size
+        self._batches: dict[Hashable, _Batch] = {}
+
+    async def search(
+        self,
+        key: Hashable,
+        query_embeddings: np.ndarray,
+        k: int,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        loop = asyncio.get_running_loop()
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = _Batch()
+            self._batches[key] = batch
+            batch.timer = loop.call_later(self._max_wait, self._run, key)
+        future = loop.create_future()
+        batch.queries.append((query_embeddings, k, future))
+        batch.size += len(query_embeddings)
+        if batch.size >= self._max_size:
+            batch.timer.cancel()
+            self._run(key)
+        return await future
+
+    def _run(self, key: Hashable) -> None:
+        batch = self._batches.pop(key)
+        k = max(k for _, k, _ in batch.queries)
+        try:
+            scores, ids = self._search(
+                np.concatenate([embeddings for embeddings, _, _ in batch.queries]),
+                k,
+                key,
+            )
+        except Exception as e:
+            for _, _, future in batch.queries:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        # scatter the rows back, trimmed to the k each caller asked for
+        start = 0
+        for embeddings, k, future in batch.queries:
+            end = start + len(embeddings)
+            if not future.done():
+                future.set_result((scores[start:end, :k], ids[start:end, :k]))
+            start = end
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import fcntl
+import faiss
+import shutil
+import asyncio
+import numpy as np
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from loguru import logger
+
+from rag_battle.infra.vector_database.bitmap import IdBitmap
+from rag_battle.infra.vector_database.id_map import IdMap
+from rag_battle.infra.vector_database.item_store import ItemStore
+from rag_battle.infra.vector_database.packed_strings import PackedStrings
+from rag_battle.infra.vector_database.sparse_index import SparseIndex
+from rag_battle.infra.vector_database.token_store import TokenStore
+from rag_battle.infra.vector_database.vector_store import VectorStore
+
+# bump when the on-disk layout changes
+SNAPSHOT_VERSION = 1
+# file in the snapshot directory naming the most recent complete snapshot
+LATEST = "LATEST"
+# lock file serializing writers that share the snapshot directory
+WRITER_LOCK = "WRITER.lock"
+
+
+@dataclass
+class SnapshotState:
+    """
+    Everything FaissVectorDatabase needs to serve queries after a restart.
+    """
+
+    manifest: dict
+    faiss_index: faiss.Index
+    vector_ids: IdMap
+    dead_ids: IdBitmap
+    tag_to_bitmap: dict[str, IdBitmap]
+    sparse_index: SparseIndex
+    token_store: TokenStore
+    vector_store: VectorStore | None
+    items: ItemStore
+    path: str
+    index_path: str
+    is_mapped: bool
+
+
+def _write_bitmaps(path: str, tag_to_bitmap: dict[str, IdBitmap]) -> None:
+    tags = list(tag_to_bitmap)
+    PackedStrings.write(f"{path}.tags", tags)
+    bitmaps = [tag_to_bitmap[tag].bits for tag in tags]
+    offsets = np.cumsum([0] + [len(bits) for bits in bitmaps], dtype=np.int64)
+    np.save(f"{path}.offsets.npy", offsets)
+    np.save(
+        f"{path}.bits.npy",
+        np.concatenate(bitmaps) if bitmaps else np.zeros(0, dtype=np.uint8),
+    )
+
+
+def _read_bitmaps(path: str, mmap: bool) -> dict[str, IdBitmap]:
+    tags = PackedStrings.read(f"{path}.tags", mmap=False)
+    offsets = np.load(f"{path}.offsets.npy")
+    # mapped bitmaps are views of the file, copied when they are written to
+    bits = np.load(f"{path}.bits.npy", mmap_mode="r" if mmap else None)
+    return {
+        tags[i]: IdBitmap(bits[offsets[i] : offsets[i + 1]]) for i in range(len(tags))
+    }
+
+
+def write_snapshot(
+    snapshot_dir: str,
+    manifest: dict,
+    faiss_index: faiss.Index,
+    vector_ids: IdMap,
+    dead_ids: IdBitmap,
+    tag_to_bitmap: dict[str, IdBitmap],
+    sparse_index: SparseIndex,
+    token_store: TokenStore,
+    vector_store: VectorStore | None,
+    items: ItemStore,
+) -> str:
+    """
+    Write a new snapshot and make it the latest one.
+
+    The snapshot is written to a fresh directory and published by atomically
+    replacing the LATEST pointer, so a crash never leaves a partial snapshot
+    behind the pointer. Older snapshots are removed afterwards.
+
+    :return: str: The path of the written FAISS index file.
+    """
+    start_time = time.time()
+    os.makedirs(snapshot_dir, exist_ok=True)
+    name = f"snapshot-{time.time_ns()}"
+    path = os.path.join(snapshot_dir, name)
+    os.makedirs(path)
+
+    faiss.write_index(faiss_index, os.path.join(path, "index.faiss"))
+    vector_ids.write(os.path.join(path, "vector_ids"))
+    np.save(os.path.join(path, "dead_ids.npy"), dead_ids.bits)
+    _write_bitmaps(os.path.join(path, "tag_bitmaps"), tag_to_bitmap)
+    sparse_index.write(os.path.join(path, "sparse_index"))
+    token_store.write(os.path.join(path, "token_store"))
+    if vector_store is not None:
+        vector_store.write(os.path.join(path, "vectors"))
+    items.write(os.path.join(path, "items"))
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump({**manifest, "version": SNAPSHOT_VERSION}, f)
+
+    latest_tmp = os.path.join(snapshot_dir, f"{LATEST}.tmp")
+    with open(latest_tmp, "w") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(latest_tmp, os.path.join(snapshot_dir, LATEST))
+
+    for old_name in os.listdir(snapshot_dir):
+        if old_name.startswith("snapshot-") and old_name != name:
+            # processes that memory-mapped old files keep them until unmapped
+            shutil.rmtree(os.path.join(snapshot_dir, old_name), ignore_errors=True)
+    end_time = time.time()
+    logger.info(f"FAISS: snapshot `{path}` written in {end_time - start_time:.3f} s.")
+    return os.path.join(path, "index.faiss")
+
+
+def latest_snapshot(snapshot_dir: str) -> str | None:
+    try:
+        with open(os.path.join(snapshot_dir, LATEST)) as f:
+            return os.path.join(snapshot_dir, f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+def _read_snapshot(path: str, mmap: bool) -> SnapshotState:
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest["version"] != SNAPSHOT_VERSION:
+        raise ValueError(
+            f"Unsupported snapshot version {manifest['version']} in `{path}`, "
+            f"expected {SNAPSHOT_VERSION}."
+        )
+
+    index_path = os.path.join(path, "index.faiss")
+    io_flags = 0
+    if mmap:
+        # inverted lists are mapped as on-disk lists, flat codes as views
+        io_flags = faiss.IO_FLAG_MMAP if manifest["is_ivf"] else faiss.IO_FLAG_MMAP_IFC
+    return SnapshotState(
+        manifest=manifest,
+        faiss_index=faiss.read_index(index_path, io_flags),
+        vector_ids=IdMap.read(os.path.join(path, "vector_ids"), mmap=mmap),
+        dead_ids=IdBitmap(
+            np.load(os.path.join(path, "dead_ids.npy"), mmap_mode="r" if mmap else None)
+        ),
+        tag_to_bitmap=_read_bitmaps(os.path.join(path, "tag_bitmaps"), mmap=mmap),
+        # snapshots of databases without sparse vectors or token embeddings
+        # read as empty ones
+        sparse_index=SparseIndex.read(os.path.join(path, "sparse_index"), mmap=mmap),
+        token_store=TokenStore.read(os.path.join(path, "token_store"), mmap=mmap),
+        vector_store=VectorStore.read(os.path.join(path, "vectors"), mmap=mmap),
+        items=ItemStore.read(os.path.join(path, "items"), mmap=mmap),
+        path=path,
+        index_path=index_path,
+        is_mapped=mmap,
+    )
+
+
+def read_snapshot(snapshot_dir: str, mmap: bool = True) -> SnapshotState | None:
+    """
+    Read the latest snapshot.
+
+    :param snapshot_dir: Directory the snapshots are written to.
+    :param mmap: Whether to memory-map the index and item contents instead of
+    reading them into memory. Mapped indexes are read-only.
+
+    :return: SnapshotState | None: The restored state or None if there is no
+    snapshot yet.
+    """
+    start_time = time.time()
+    while True:
+        path = latest_snapshot(snapshot_dir)
+        if path is None:
+            return None
+        try:
+            state = _read_snapshot(path, mmap)
+            break
+        except FileNotFoundError:
+            # another process published a newer snapshot and removed this one
+            # while it was being read
+            if latest_snapshot(snapshot_dir) == path:
+                raise
+    end_time = time.time()
+    logger.info(f"FAISS: snapshot `{path}` read in {end_time - start_time:.3f} s.")
+    return state
+
+
+@asynccontextmanager
+async def writer_lock(snapshot_dir: str):
+    """
+    Hold the exclusive writer lock of a snapshot directory shared between
+    processes.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    fd = os.open(os.path.join(snapshot_dir, WRITER_LOCK), os.O_RDWR | os.O_CREAT)
+    try:
+        # another process may hold the lock for a whole write
+        await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # closing the descriptor releases the lock
+        os.close(fd)
@@ -0,0 +1,228 @@
+import os
+import numpy as np
+
+from rag_battle.domain.schemas import SparseVector
+from rag_battle.infra.vector_database.bitmap import IdBitmap
+
+# a posting list is probed for the candidates instead of scanned once it is
+# this many times longer than the candidate list
+PROBE_RATIO = 16
+
+
+class SparseIndex:
+    """
+    Inverted index of sparse vectors over internal int64 vector ids.
+
+    Every term keeps its posting list as an int32 id array sorted by id and a
+    float32 weight array. Postings of added vectors are buffered and merged
+    into the lists on the next search. Searches run MaxScore term at a time:
+    terms are visited by descending score bound, and once the bounds of the
+    remaining terms can't lift an unseen vector into the top k, the remaining
+    lists are only probed for the candidates found so far.
+
+    Removed vectors stay in the lists until `without`, searches filter them out
+    with the tombstones of the caller.
+    """
+
+    def __init__(self):
+        self._postings: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+        self._max_weights: dict[int, float] = {}
+        self._pending: dict[int, list[tuple[np.ndarray, np.ndarray]]] = {}
+        # one past the largest vector id, the size of the score accumulator
+        self._size: int = 0
+
+    @property
+    def is_empty(self) -> bool:
+        return not self._postings and not self._pending
+
+    def add(self, ids: np.ndarray, vectors: list[SparseVector]) -> None:
+        lengths = [len(vector.indices) for vector in vectors]
+        if not sum(lengths):
+            return
+        terms = np.concatenate([vector.indices for vector in vectors]).astype(np.int64)
+        weights = np.concatenate([vector.values for vector in vectors]).astype(
+            np.float32
+        )
+        posting_ids = np.repeat(np.asarray(ids, dtype=np.int32), lengths)
+        order = np.argsort(terms, kind="stable")
+        terms, weights, posting_ids = terms[order], weights[order], posting_ids[order]
+        unique_terms, starts = np.unique(terms, return_index=True)
+        ends = np.append(starts[1:], len(terms))
+        for term, start, end in zip(unique_terms.tolist(), starts, ends):
+            self._pending.setdefault(term, []).append(
+                (posting_ids[start:end], weights[start:end])
+            )
+        self._size = max(self._size, int(np.max(ids)) + 1)
+
+    def without(self, ids: np.ndarray) -> "SparseIndex":
+        """
+        Return a copy of the index without the postings of vectors, e.g. before
+        their ids are reused. Besides merging buffered postings the index is
+        left unchanged, it can be searched while the copy is built in another
+        thread if they were merged before and nothing is added.
+        """
+        self.merge()
+        index = SparseIndex()
+        index._size = self._size
+        ids = np.asarray(ids, dtype=np.int32)
+        for term, (term_ids, weights) in self._postings.items():
+            keep = ~np.isin(term_ids, ids)
+            if keep.all():
+                # lists are never changed in place, the copy shares them
+                index._postings[term] = (term_ids, weights)
+                index._max_weights[term] = self._max_weights[term]
+            elif keep.any():
+                index._postings[term] = (term_ids[keep], weights[keep])
+                index._max_weights[term] = float(weights[keep].max())
+        return index
+
+    def merge(self) -> None:
+        """Merge the buffered postings into the lists. Searches merge on their own."""
+        for term, chunks in self._pending.items():
+            old = self._postings.get(term)
+            if old is not None:
+                chunks = [old] + chunks
+            ids = np.concatenate([ids for ids, _ in chunks])
+            weights = np.concatenate([weights for _, weights in chunks])
+            # new vectors mostly get larger ids, the lists are rarely unsorted
+            if len(ids) > 1 and (np.diff(ids) < 0).any():
+                order = np.argsort(ids, kind="stable")
+                ids, weights = ids[order], weights[order]
+            self._postings[term] = (ids, weights)
+            self._max_weights[term] = float(weights.max())
+        self._pending.clear()
+
+    def search(
+        self,
+        query: SparseVector,
+        k: int,
+        included: IdBitmap | None = None,
+        excluded: IdBitmap | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the vectors with the largest dot products with a query.
+
+        :param included: Ids a search may return, None for all.
+        :param excluded: Ids a search must not return.
+
+        :return: tuple[np.ndarray, np.ndarray]: float32 scores and int64 ids of
+        at most k vectors ordered by descending score. Vectors sharing no term
+        with the query are not returned.
+        """
+        self.merge()
+        terms = [
+            (weight * self._max_weights[term], term, weight)
+            for term, weight in zip(query.indices.tolist(), query.values.tolist())
+            if term in self._postings and weight > 0
+        ]
+        terms.sort(reverse=True)
+        # bound of what the terms from i on can add to a score
+        rest = np.cumsum([bound for bound, _, _ in terms][::-1])[::-1].tolist() + [0.0]
+
+        def eligible(ids: np.ndarray) -> np.ndarray:
+            if included is None and excluded is None:
+                return ids
+            mask = np.ones(len(ids), dtype=bool)
+            if included is not None:
+                mask &= included.contains(ids)
+            if excluded is not None:
+                mask &= ~excluded.contains(ids)
+            return ids[mask]
+
+        def top_k(ids: np.ndarray) -> np.ndarray:
+            if len(ids) <= k:
+                return ids
+            return ids[np.argpartition(-scores[ids], k - 1)[:k]]
+
+        # zeroed pages are only allocated where scores are written
+        scores = np.zeros(self._size, dtype=np.float32)
+        # the k best vectors seen so far, only vectors of a scanned list can
+        # join them since all other scores stay the same
+        top = np.empty(0, dtype=np.int32)
+        threshold = -np.inf
+        i = 0
+        # scan the lists while unseen vectors may still reach the top k
+        while i < len(terms) and rest[i] > threshold:
+            _, term, weight = terms[i]
+            ids, weights = self._postings[term]
+            scores[ids] += weight * weights
+            top = top_k(np.union1d(top, top_k(eligible(ids))))
+            if len(top) == k:
+                threshold = float(scores[top].min())
+            i += 1
+        # the vectors seen with a chance to make it, unseen ones score 0
+        candidates = np.union1d(
+            top, eligible(np.flatnonzero(scores > max(threshold - rest[i], 0.0)))
+        ).astype(np.int32)
+        # probe the remaining lists for the candidates
+        while i < len(terms) and len(candidates):
+            candidates = candidates[scores[candidates] + rest[i] >= threshold]
+            _, term, weight = terms[i]
+            ids, weights = self._postings[term]
+            if len(candidates) * PROBE_RATIO < len(ids):
+                positions = np.searchsorted(ids, candidates)
+                positions[positions == len(ids)] = 0
+                hits = ids[positions] == candidates
+                scores[candidates[hits]] += weight * weights[positions[hits]]
+            else:
+                # vectors outside the candidates get scores that are never read
+                scores[ids] += weight * weights
+            if len(candidates) >= k:
+                threshold = float(np.partition(scores[candidates], -k)[-k])
+            i += 1
+
+        candidate_scores = scores[candidates]
+        if len(candidates) > k:
+            top = np.argpartition(-candidate_scores, k - 1)[:k]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-candidate_scores[top], kind="stable")]
+        return candidate_scores[top], candidates[top].astype(np.int64)
+
+    def write(self, path: str) -> None:
+        """Write the index as CSR arrays of postings ordered by term."""
+        self.merge()
+        terms = np.array(sorted(self._postings), dtype=np.int64)
+        lists = [self._postings[term] for term in terms.tolist()]
+        offsets = np.cumsum([0] + [len(ids) for ids, _ in lists], dtype=np.int64)
+        np.save(f"{path}.terms.npy", terms)
+        np.save(f"{path}.offsets.npy", offsets)
+        np.save(
+            f"{path}.ids.npy",
+            (
+                np.concatenate([ids for ids, _ in lists])
+                if lists
+                else np.zeros(0, dtype=np.int32)
+            ),
+        )
+        np.save(
+            f"{path}.weights.npy",
+            (
+                np.concatenate([weights for _, weights in lists])
+                if lists
+                else np.zeros(0, dtype=np.float32)
+            ),
+        )
+
+    @classmethod
+    def read(cls, path: str, mmap: bool = True) -> "SparseIndex":
+        """
+        Read an index written by `write`, an empty one if there is none.
+
+        :param mmap: Whether to memory-map the postings. Posting lists are views
+        of the mapped arrays and copied on the first write to them.
+        """
+        self = cls()
+        if not os.path.exists(f"{path}.terms.npy"):
+            return self
+        mmap_mode = "r" if mmap else None
+        terms = np.load(f"{path}.terms.npy")
+        offsets = np.load(f"{path}.offsets.npy")
+        ids = np.load(f"{path}.ids.npy", mmap_mode=mmap_mode)
+        weights = np.load(f"{path}.weights.npy", mmap_mode=mmap_mode)
+        for i, term in enumerate(terms.tolist()):
+            start, end = offsets[i], offsets[i + 1]
+            self._postings[term] = (ids[start:end], weights[start:end])
+            self._max_weights[term] = float(weights[start:end].max())
+            self._size = max(self._size, int(ids[end - 1]) + 1)
+        return self
@@ -0,0 +1,177 @@
+import os
+import numpy as np
+
+# token rows converted to float32 and multiplied at a time by `maxsim`, bounds
+# the temporary memory of scoring many candidates with long documents
+MAXSIM_CHUNK_ROWS = 8192
+
+
+class TokenStore:
+    """
+    Token embeddings of vectors, packed into one float16 matrix.
+
+    The tokens of a vector are consecutive rows of the matrix, located by start
+    and length arrays indexed by the internal int64 vector id. Tokens of added
+    vectors are appended, removed vectors leave their rows behind until more
+    than half of the rows are dead and the matrix is repacked.
+    """
+
+    def __init__(self):
+        self._tokens: np.ndarray | None = None
+        # rows of the matrix in use, the rest is room to append to
+        self._num_rows: int = 0
+        self._num_dead_rows: int = 0
+        self._starts: np.ndarray = np.zeros(0, dtype=np.int64)
+        self._lengths: np.ndarray = np.zeros(0, dtype=np.int32)
+
+    @property
+    def is_empty(self) -> bool:
+        return self._num_rows == self._num_dead_rows
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes taken by the rows in use and the location arrays."""
+        tokens = 0 if self._tokens is None else self._tokens[: self._num_rows].nbytes
+        return tokens + self._starts.nbytes + self._lengths.nbytes
+
+    def add(self, ids: np.ndarray, matrices: list[np.ndarray]) -> None:
+        lengths = np.array([len(matrix) for matrix in matrices], dtype=np.int32)
+        num_rows = int(lengths.sum())
+        if num_rows == 0:
+            return
+        size = next(matrix.shape[1] for matrix in matrices if len(matrix))
+        self._reserve(self._num_rows + num_rows, size, int(np.max(ids)) + 1)
+        # replaced vectors, e.g. reused ids, leave their rows behind
+        self._num_dead_rows += int(self._lengths[ids].sum())
+        end = self._num_rows + num_rows
+        self._tokens[self._num_rows : end] = np.concatenate(
+            [matrix for matrix in matrices if len(matrix)]
+        )
+        self._starts[ids] = self._num_rows + np.cumsum(lengths) - lengths
+        self._lengths[ids] = lengths
+        self._num_rows = end
+
+    def without(self, ids: np.ndarray) -> "TokenStore":
+        """
+        Return a copy of the store without the tokens of vectors. The store
+        itself is left unchanged, the copy shares its token matrix unless it is
+        repacked.
+        """
+        store = TokenStore()
+        store._tokens = self._tokens
+        store._num_rows = self._num_rows
+        store._starts = self._starts.copy()
+        store._lengths = self._lengths.copy()
+        ids = ids[ids < len(store._lengths)]
+        store._num_dead_rows = self._num_dead_rows + int(store._lengths[ids].sum())
+        store._lengths[ids] = 0
+        if store._num_dead_rows * 2 > store._num_rows:
+            store._repack()
+        return store
+
+    def _reserve(self, num_rows: int, size: int, num_ids: int) -> None:
+        if self._tokens is None:
+            self._tokens = np.empty((0, size), dtype=np.float16)
+        if size != self._tokens.shape[1]:
+            raise ValueError(
+                f"Token embeddings of size {size} don't match the stored ones of "
+                f"size {self._tokens.shape[1]}."
+            )
+        # a memory-mapped matrix is read-only, grow copies it into memory
+        if num_rows > len(self._tokens) or not self._tokens.flags.writeable:
+            tokens = np.empty(
+                (max(num_rows, 2 * len(self._tokens)), size), dtype=np.float16
+            )
+            tokens[: self._num_rows] = self._tokens[: self._num_rows]
+            self._tokens = tokens
+        if num_ids > len(self._lengths):
+            padding = (0, max(num_ids, 2 * len(self._lengths)) - len(self._lengths))
+            self._starts = np.pad(self._starts, padding)
+            self._lengths = np.pad(self._lengths, padding)
+
+    def _rows(self, ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :return: tuple[np.ndarray, np.ndarray]: The matrix rows of the tokens of
+        the vectors, and the offset of the first token of every vector in them.
+        """
+        lengths = self._lengths[ids].astype(np.int64)
+        offsets = np.cumsum(lengths) - lengths
+        rows = np.arange(offsets[-1] + lengths[-1] if len(ids) else 0)
+        rows += np.repeat(self._starts[ids] - offsets, lengths)
+        return rows, offsets
+
+    def _repack(self) -> None:
+        ids = np.flatnonzero(self._lengths)
+        rows, offsets = self._rows(ids)
+        tokens = np.empty((max(len(rows), 1), self._tokens.shape[1]), np.float16)
+        tokens[: len(rows)] = self._tokens[rows]
+        self._tokens = tokens
+        self._starts[ids] = offsets
+        self._num_rows, self._num_dead_rows = len(rows), 0
+
+    def maxsim(self, query: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        """
+        Score vectors by late interaction with a query: the sum over the query
+        tokens of their largest inner product with a token of the vector.
+
+        :param query: (tokens, size) matrix of the query tokens.
+        :param ids: Vector ids to score.
+
+        :return: np.ndarray: float32 scores of the vectors, -inf for vectors
+        without tokens.
+
+        The candidates are scored in chunks of MAXSIM_CHUNK_ROWS token rows.
+        Only rows of the chunk being scored are converted to float32.
+        """
+        scores = np.full(len(ids), -np.inf, dtype=np.float32)
+        known = (ids >= 0) & (ids < len(self._lengths))
+        known[known] = self._lengths[ids[known]] > 0
+        if not known.any() or len(query) == 0:
+            return scores
+        query = np.asarray(query, dtype=np.float32).T
+        positions = np.flatnonzero(known)
+        ends = np.cumsum(self._lengths[ids[positions]])
+        start = 0
+        while start < len(positions):
+            # vectors whose tokens fit into a chunk, at least one
+            first_row = ends[start - 1] if start else 0
+            stop = int(
+                np.searchsorted(ends, first_row + MAXSIM_CHUNK_ROWS, side="right")
+            )
+            stop = max(stop, start + 1)
+            chunk = positions[start:stop]
+            rows, offsets = self._rows(ids[chunk])
+            # numpy has no BLAS for float16, the gathered rows are multiplied as
+            # float32
+            similarities = self._tokens[rows].astype(np.float32) @ query
+            scores[chunk] = np.maximum.reduceat(similarities, offsets, axis=0).sum(
+                axis=1
+            )
+            start = stop
+        return scores
+
+    def write(self, path: str) -> None:
+        """Write the rows in use and the location arrays."""
+        if self._tokens is None:
+            return
+        np.save(f"{path}.tokens.npy", self._tokens[: self._num_rows])
+        np.save(f"{path}.starts.npy", self._starts)
+        np.save(f"{path}.lengths.npy", self._lengths)
+
+    @classmethod
+    def read(cls, path: str, mmap: bool = True) -> "TokenStore":
+        """
+        Read a store written by `write`, an empty one if there is none.
+
+        :param mmap: Whether to memory-map the token matrix. It is copied into
+        memory on the first write.
+        """
+        self = cls()
+        if not os.path.exists(f"{path}.tokens.npy"):
+            return self
+        self._tokens = np.load(f"{path}.tokens.npy", mmap_mode="r" if mmap else None)
+        self._starts = np.load(f"{path}.starts.npy")
+        self._lengths = np.load(f"{path}.lengths.npy")
+        self._num_rows = len(self._tokens)
+        self._num_dead_rows = self._num_rows - int(self._lengths.sum())
+        return self
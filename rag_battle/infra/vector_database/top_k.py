@@ -0,0 +1,49 @@
+import numpy as np
+
+
+def _top(scores: np.ndarray, m: int) -> np.ndarray:
+    """Positions of the m best scores ordered by descending score."""
+    if m < len(scores):
+        positions = np.argpartition(-scores, m - 1)[:m]
+    else:
+        positions = np.arange(len(scores))
+    return positions[np.argsort(-scores[positions], kind="stable")]
+
+
+def merge_top_k(
+    scores: np.ndarray,
+    ids: np.ndarray,
+    k: int,
+    remove_duplicates: bool,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Merge the hits of several result lists into one list of the k best hits.
+
+    :param scores: Scores of the hits, one row per result list, higher is better.
+    :param ids: Internal ids of the hits in the same layout, -1 for padding.
+    :param k: Maximum number of hits to return.
+    :param remove_duplicates: Whether to keep only the best hit of every id.
+
+    :return: tuple[np.ndarray, np.ndarray]: Scores and ids of at most k hits
+    ordered by descending score.
+    """
+    scores = scores.ravel()
+    ids = ids.ravel()
+    valid = ids >= 0
+    scores, ids = scores[valid], ids[valid]
+    if not remove_duplicates:
+        top = _top(scores, k)
+        return scores[top], ids[top]
+
+    # an id with a hit among the m best hits has its best hit there as well, so
+    # deduplicating them is exact once they contain k distinct ids
+    m = k
+    while True:
+        top = _top(scores, m)
+        # the first occurrence of an id in score order is its best hit
+        unique_ids, first = np.unique(ids[top], return_index=True)
+        if len(unique_ids) >= k or m >= len(scores):
+            break
+        m *= 2
+    top = top[np.sort(first)[:k]]
+    return scores[top], ids[top]
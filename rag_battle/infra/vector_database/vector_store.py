@@ -0,0 +1,71 @@
+import os
+import numpy as np
+
+
+class VectorStore:
+    """
+    Float32 copies of the vectors of a lossy index, by internal int64 vector id.
+
+    Rows are overwritten when ids are reused, so the store holds a row per id
+    ever handed out and needs no removal. The rows are held in memory, as much
+    as a float32 index takes, except when they are memory-mapped by `read`
+    and until the next write.
+    """
+
+    def __init__(self, embedding_size: int):
+        self._vectors: np.ndarray = np.zeros((0, embedding_size), dtype=np.float32)
+        # rows up to the largest id, the rest is room to grow into
+        self._num_ids: int = 0
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes taken by the rows in use."""
+        return self._vectors[: self._num_ids].nbytes
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        num_ids = int(np.max(ids)) + 1
+        # a memory-mapped matrix is read-only, grow copies it into memory
+        if num_ids > len(self._vectors) or not self._vectors.flags.writeable:
+            grown = np.zeros(
+                (max(num_ids, 2 * len(self._vectors)), self._vectors.shape[1]),
+                dtype=np.float32,
+            )
+            grown[: self._num_ids] = self._vectors[: self._num_ids]
+            self._vectors = grown
+        self._vectors[ids] = vectors
+        self._num_ids = max(self._num_ids, num_ids)
+
+    def score(self, query_embeddings: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        """
+        Score the results of a search by the inner products of their vectors.
+
+        :param query_embeddings: (queries, size) matrix of the query vectors.
+        :param ids: (queries, k) ids found for every query, -1 for no result.
+
+        :return: np.ndarray: (queries, k) float32 scores, -inf for no result.
+        """
+        found = ids >= 0
+        scores = np.einsum(
+            "qkd,qd->qk", self._vectors[np.where(found, ids, 0)], query_embeddings
+        )
+        scores[~found] = -np.inf
+        return scores
+
+    def write(self, path: str) -> None:
+        np.save(f"{path}.npy", self._vectors[: self._num_ids])
+
+    @classmethod
+    def read(cls, path: str, mmap: bool = True) -> "VectorStore | None":
+        """
+        Read a store written by `write`, None if there is none.
+
+        :param mmap: Whether to memory-map the vectors. They are copied into
+        memory on the first write.
+        """
+        if not os.path.exists(f"{path}.npy"):
+            return None
+        vectors = np.load(f"{path}.npy", mmap_mode="r" if mmap else None)
+        self = cls(vectors.shape[1])
+        self._vectors = vectors
+        self._num_ids = len(vectors)
+        return self
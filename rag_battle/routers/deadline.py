@@ -0,0 +1,40 @@
+from typing import AsyncIterator
+from fastapi import Header
+from pydantic import Field
+from pydantic_settings import BaseSettings
+
+from rag_battle.domain.deadline import deadline_scope
+
+
+class RequestDeadlineConfig(BaseSettings):
+    timeout_ms: float | None = Field(
+        default=None,
+        validation_alias="REQUEST_TIMEOUT_MS",
+        description=(
+            "Time to answer a request in, spent by all calls it makes. None "
+            "leaves requests without deadline unless a client sets one."
+        ),
+    )
+
+
+REQUEST_DEADLINE_CONFIG = RequestDeadlineConfig()
+
+
+async def request_deadline(
+    x_request_timeout_ms: float | None = Header(
+        default=None,
+        gt=0,
+        description="Time the client waits for the response, in milliseconds.",
+    ),
+) -> AsyncIterator[None]:
+    """
+    Set the deadline of a request to the shorter of the configured timeout and
+    the one of the client.
+    """
+    timeouts = [
+        timeout
+        for timeout in (REQUEST_DEADLINE_CONFIG.timeout_ms, x_request_timeout_ms)
+        if timeout is not None
+    ]
+    with deadline_scope(min(timeouts) / 1000 if timeouts else None):
+        yield
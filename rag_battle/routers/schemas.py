@@ -1,5 +1,5 @@
 import uuid
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
 
 
 class DocumentDTO(BaseModel):
@@ -47,6 +47,10 @@ class RAGQueryDTO(BaseModel):
     tags: list[str]
     num_items: int
     remove_duplicates: bool = True
+    search_params: dict[str, int] | None = None
+    rerank: bool | None = None
+    # bounded by RERANK_MAX_CANDIDATES in the rerank stage
+    rerank_candidates: int | None = Field(default=None, gt=0)
 
     model_config = {
         "json_schema_extra": {
@@ -56,6 +60,9 @@ class RAGQueryDTO(BaseModel):
                     "tags": ["films", "movies"],
                     "num_items": 3,
                     "remove_duplicates": True,
+                    "search_params": {"nprobe": 16, "ef_search": 64},
+                    "rerank": True,
+                    "rerank_candidates": 30,
                 },
             ]
         }
@@ -133,3 +140,25 @@ class RAGAddDocumentsDTO(BaseModel):
             ]
         }
     }
+
+
+class RAGDeleteDocumentsDTO(BaseModel):
+    item_ids: list[str]
+
+    @field_validator("item_ids")
+    @classmethod
+    def item_ids_must_be_hex(cls, value: list[str]):
+        return [uuid.UUID(item_id, version=4).hex for item_id in value]
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "item_ids": [
+                        "0e556d891af44b139c34322ea21ff382",
+                        "ecd5b5d8f85d4ef8899202080efeaf74",
+                    ]
+                }
+            ]
+        }
+    }
@@ -8,9 +8,14 @@ from rag_battle.services.ingestion import (
     DocumentIngestionService,
     get_document_ingestion_service,
 )
-from rag_battle.domain.exceptions import InvalidInputException
+from rag_battle.domain.exceptions import (
+    DeadlineExceededException,
+    InvalidInputException,
+    OverloadedException,
+)
+from rag_battle.routers.deadline import request_deadline
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(request_deadline)])
 
 
 @router.post(
@@ -34,6 +39,12 @@ router = APIRouter()
         fastapi.status.HTTP_500_INTERNAL_SERVER_ERROR: {
             "description": "Internal server error during document ingestion."
         },
+        fastapi.status.HTTP_503_SERVICE_UNAVAILABLE: {
+            "description": "Embeddings service overloaded – retry later.",
+        },
+        fastapi.status.HTTP_504_GATEWAY_TIMEOUT: {
+            "description": "Request timeout exceeded.",
+        },
     },
 )
 async def query_api(
@@ -48,6 +59,16 @@ async def query_api(
             status_code=fastapi.status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail=str(e),
         )
+    except OverloadedException as e:
+        raise fastapi.HTTPException(
+            status_code=fastapi.status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+        )
+    except DeadlineExceededException as e:
+        raise fastapi.HTTPException(
+            status_code=fastapi.status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e),
+        )
     except Exception:
         raise fastapi.HTTPException(
             status_code=fastapi.status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -55,13 +76,13 @@ async def query_api(
         )
 
     dto_items: list[schemas.DocumentWithScoreDTO] = []
-    for item in items:
+    for scored_item in items:
         dto_items.append(
             schemas.DocumentWithScoreDTO(
-                item_id=item.item_id,
-                content=item.content,
-                tags=item.tags,
-                score=item.score,
+                item_id=scored_item.item.item_id,
+                content=scored_item.item.content,
+                tags=scored_item.item.tags,
+                score=scored_item.score,
             )
         )
 
@@ -89,6 +110,12 @@ async def query_api(
         fastapi.status.HTTP_500_INTERNAL_SERVER_ERROR: {
             "description": "Internal server error during document ingestion."
         },
+        fastapi.status.HTTP_503_SERVICE_UNAVAILABLE: {
+            "description": "Embeddings service overloaded – retry later.",
+        },
+        fastapi.status.HTTP_504_GATEWAY_TIMEOUT: {
+            "description": "Request timeout exceeded.",
+        },
     },
 )
 async def add_documents_api(
@@ -109,8 +136,55 @@ async def add_documents_api(
             status_code=fastapi.status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail=str(e),
         )
+    except OverloadedException as e:
+        raise fastapi.HTTPException(
+            status_code=fastapi.status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+        )
+    except DeadlineExceededException as e:
+        raise fastapi.HTTPException(
+            status_code=fastapi.status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e),
+        )
     except Exception:
         raise fastapi.HTTPException(
             status_code=fastapi.status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error during document ingestion.",
         )
+
+
+@router.delete(
+    "/items",
+    response_model=None,
+    tags=["RAG"],
+    summary="Delete documents from knowledge base",
+    description=(
+        "Deletes a batch of documents from the vector database by their "
+        "identifiers. Unknown identifiers are ignored."
+    ),
+    status_code=fastapi.status.HTTP_204_NO_CONTENT,
+    responses={
+        fastapi.status.HTTP_204_NO_CONTENT: {
+            "description": "Documents successfully deleted from the knowledge base.",
+        },
+        fastapi.status.HTTP_422_UNPROCESSABLE_ENTITY: {
+            "description": "Validation error – invalid input format.",
+        },
+        fastapi.status.HTTP_500_INTERNAL_SERVER_ERROR: {
+            "description": "Internal server error during document deletion."
+        },
+    },
+)
+async def delete_documents_api(
+    payload: schemas.RAGDeleteDocumentsDTO,
+    ingestion_service: DocumentIngestionService = Depends(
+        get_document_ingestion_service
+    ),
+) -> None:
+    try:
+        await ingestion_service.delete_documents(payload.item_ids)
+    except Exception:
+        raise fastapi.HTTPException(
+            status_code=fastapi.status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error during document deletion.",
+        )
@@ -1,14 +1,30 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 from rag_battle import __version__
 from rag_battle.routers import v1_router
 from rag_battle.logs import replace_log_handler
+from rag_battle.services.common.dependencies import (
+    close_channel_pools,
+    close_embeddings_models,
+    open_vector_database,
+)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    vector_database = await open_vector_database()
+    yield
+    await close_embeddings_models()
+    await close_channel_pools()
+    await vector_database.close()
 
 
 app = FastAPI(
     title="RAG battle.",
     version=__version__,
     redoc_url=None,
+    lifespan=lifespan,
 )
 
 app = replace_log_handler(app)
@@ -1,23 +1,194 @@
-from rag_battle.domain.embeddings_model import BaseEmbeddingsModel
+import asyncio
+
+from rag_battle.domain.chunker import BaseChunker
+from rag_battle.domain.embeddings_model import (
+    BaseEmbeddingsModel,
+    BaseSparseEmbeddingsModel,
+    BaseTokenEmbeddingsModel,
+)
+from rag_battle.domain.reranker import BaseReranker
 from rag_battle.domain.vector_database import VectorDatabase
 
-from rag_battle.infra.vector_database import FaissVectorDatabase
-from rag_battle.infra.embeddings import TEIEmbeddingsModel
-from rag_battle.infra.embeddings.service import TEIService
-from rag_battle.infra.embeddings.tei import TEIEmbeddingsModelConfig
+from rag_battle.infra.vector_database import (
+    FaissVectorDatabase,
+    FaissVectorDatabaseConfig,
+)
+from rag_battle.infra.embeddings import (
+    BatchingEmbeddingsModel,
+    CachingEmbeddingsModel,
+    DocumentCachingEmbeddingsModel,
+    DocumentEmbeddingsCacheConfig,
+    EmbeddingsBackendConfig,
+    HashingEmbeddingsModel,
+    HashingEmbeddingsModelConfig,
+    EmbeddingsBatchingConfig,
+    LateInteractionConfig,
+    EmbeddingsCacheConfig,
+    SparseEmbeddingsConfig,
+    TEIEmbeddingsModel,
+)
+from rag_battle.infra.embeddings.service import TEIRerankerService, TEIService
+from rag_battle.infra.embeddings.tei import (
+    TEIChunker,
+    TEIChunkerConfig,
+    TEIEmbeddingsModelConfig,
+)
+from rag_battle.infra.embeddings.text_embeddings_inference.channel_pool import (
+    TEIChannelPool,
+)
+from rag_battle.infra.rerankers import (
+    CachingReranker,
+    RerankCacheConfig,
+    TEIReranker,
+    TEIRerankerConfig,
+)
 
 
 async def get_embeddings_model() -> BaseEmbeddingsModel:
+    return EMBEDDINGS_MODEL
+
+
+async def get_vector_database() -> VectorDatabase:
+    if VECTOR_DATABASE is None:
+        raise RuntimeError("The vector database is opened by the app lifespan.")
+    return VECTOR_DATABASE
+
+
+def create_tei_channel_pool() -> TEIChannelPool | None:
+    # the hashing backend runs without a TEI server to connect to
+    if EmbeddingsBackendConfig().backend != "tei":
+        return None
+    return TEIChannelPool(TEIService())
+
+
+def create_reranker_channel_pool() -> TEIChannelPool | None:
+    service = TEIRerankerService()
+    if not service.host:
+        return None
+    return TEIChannelPool(service)
+
+
+def create_base_embeddings_model() -> BaseEmbeddingsModel:
+    if EmbeddingsBackendConfig().backend == "hashing":
+        return HashingEmbeddingsModel(config=HashingEmbeddingsModelConfig())
     return TEIEmbeddingsModel(
-        service=TEIService(),
+        channel_pool=TEI_CHANNEL_POOL,
         config=TEIEmbeddingsModelConfig(),
     )
 
 
-def create_vector_database() -> VectorDatabase:
+def create_embeddings_model(model: BaseEmbeddingsModel) -> BaseEmbeddingsModel:
+    batching_config = EmbeddingsBatchingConfig()
+    if batching_config.max_wait_ms > 0:
+        # batches are only formed by a model shared between requests
+        model = BatchingEmbeddingsModel(model, config=batching_config)
+    cache_config = EmbeddingsCacheConfig()
+    if cache_config.max_bytes > 0:
+        # cached queries skip the batching window as well
+        model = CachingEmbeddingsModel(model, config=cache_config)
+    document_cache_config = DocumentEmbeddingsCacheConfig()
+    if document_cache_config.path:
+        model = DocumentCachingEmbeddingsModel(model, config=document_cache_config)
+    return model
+
+
+def create_sparse_embeddings_model(
+    model: BaseEmbeddingsModel,
+) -> BaseSparseEmbeddingsModel | None:
+    if not SparseEmbeddingsConfig().enabled:
+        return None
+    if not isinstance(model, BaseSparseEmbeddingsModel):
+        raise ValueError(
+            f"EMBEDDINGS_SPARSE is set, but {type(model).__name__} has no sparse "
+            f"embeddings."
+        )
+    # the sparse calls share the limits of the dense ones to the same server
+    return model
+
+
+def create_token_embeddings_model(
+    model: BaseEmbeddingsModel,
+) -> BaseTokenEmbeddingsModel | None:
+    if not LateInteractionConfig().enabled:
+        return None
+    if not isinstance(model, BaseTokenEmbeddingsModel):
+        raise ValueError(
+            f"EMBEDDINGS_LATE_INTERACTION is set, but {type(model).__name__} has "
+            f"no token embeddings."
+        )
+    return model
+
+
+def create_chunker() -> BaseChunker | None:
+    config = TEIChunkerConfig()
+    # the hashing model has no input limit to chunk for
+    if config.max_tokens is None or EmbeddingsBackendConfig().backend != "tei":
+        return None
+    return TEIChunker(config=config, channel_pool=TEI_CHANNEL_POOL)
+
+
+def create_reranker() -> BaseReranker | None:
+    if RERANKER_CHANNEL_POOL is None:
+        return None
+    reranker = TEIReranker(
+        config=TEIRerankerConfig(), channel_pool=RERANKER_CHANNEL_POOL
+    )
+    cache_config = RerankCacheConfig()
+    if cache_config.max_entries > 0:
+        reranker = CachingReranker(reranker, config=cache_config)
+    return reranker
+
+
+async def get_embedding_size() -> int:
+    """
+    Embedding size of the configured model, asked from the TEI server when
+    EMBEDDINGS_SIZE is not set.
+    """
+    model = BASE_EMBEDDINGS_MODEL
+    if model.config.embedding_size is None and isinstance(model, TEIEmbeddingsModel):
+        await model.configure()
+    return model.config.embedding_size
+
+
+def create_vector_database(embedding_size: int) -> VectorDatabase:
     return FaissVectorDatabase(
-        embedding_size=TEIEmbeddingsModelConfig().embedding_size,
+        embedding_size=embedding_size,
+        config=FaissVectorDatabaseConfig(),
     )
 
 
-VECTOR_DATABASE = create_vector_database()
+async def open_vector_database() -> VectorDatabase:
+    """Create the vector database once the embedding size is known."""
+    global VECTOR_DATABASE
+    if VECTOR_DATABASE is None:
+        VECTOR_DATABASE = create_vector_database(await get_embedding_size())
+    return VECTOR_DATABASE
+
+
+async def close_channel_pools() -> None:
+    """Close the channels to the TEI services, called by the app lifespan."""
+    for channel_pool in (TEI_CHANNEL_POOL, RERANKER_CHANNEL_POOL):
+        if channel_pool is not None:
+            await channel_pool.close(grace=5.0)
+
+
+async def close_embeddings_models() -> None:
+    """Release the resources of the embeddings models, called by the app lifespan."""
+    if isinstance(EMBEDDINGS_MODEL, DocumentCachingEmbeddingsModel):
+        await EMBEDDINGS_MODEL.close()
+    if isinstance(BASE_EMBEDDINGS_MODEL, HashingEmbeddingsModel):
+        # waits for the workers to exit
+        await asyncio.to_thread(BASE_EMBEDDINGS_MODEL.close)
+
+
+# opened by the app lifespan, the embedding size may come from the TEI server
+VECTOR_DATABASE: VectorDatabase | None = None
+# None for the services that are not configured
+TEI_CHANNEL_POOL = create_tei_channel_pool()
+BASE_EMBEDDINGS_MODEL = create_base_embeddings_model()
+EMBEDDINGS_MODEL = create_embeddings_model(BASE_EMBEDDINGS_MODEL)
+SPARSE_EMBEDDINGS_MODEL = create_sparse_embeddings_model(BASE_EMBEDDINGS_MODEL)
+TOKEN_EMBEDDINGS_MODEL = create_token_embeddings_model(BASE_EMBEDDINGS_MODEL)
+CHUNKER = create_chunker()
+RERANKER_CHANNEL_POOL = create_reranker_channel_pool()
+RERANKER = create_reranker()
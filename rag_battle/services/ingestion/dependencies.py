@@ -4,24 +4,35 @@ from rag_battle.services.ingestion import DocumentIngestionService
 
 from rag_battle.domain.embeddings_pipeline import EmbeddingsPipeline
 from rag_battle.domain.embeddings_model import BaseEmbeddingsModel
+from rag_battle.domain.vector_database import VectorDatabase
 
 from rag_battle.services.common.dependencies import (
     get_embeddings_model,
-    VECTOR_DATABASE,
+    get_vector_database,
+    CHUNKER,
+    SPARSE_EMBEDDINGS_MODEL,
+    TOKEN_EMBEDDINGS_MODEL,
 )
 
 
 async def get_embeddings_pipeline(
     embeddings_model: BaseEmbeddingsModel = Depends(get_embeddings_model),
+    vector_database: VectorDatabase = Depends(get_vector_database),
 ) -> EmbeddingsPipeline:
     return EmbeddingsPipeline(
-        embeddings_model=embeddings_model, vector_database=VECTOR_DATABASE
+        embeddings_model=embeddings_model,
+        vector_database=vector_database,
+        chunker=CHUNKER,
+        sparse_embeddings_model=SPARSE_EMBEDDINGS_MODEL,
+        token_embeddings_model=TOKEN_EMBEDDINGS_MODEL,
     )
 
 
 async def get_document_ingestion_service(
     embeddings_pipeline=Depends(get_embeddings_pipeline),
+    vector_database: VectorDatabase = Depends(get_vector_database),
 ) -> DocumentIngestionService:
     return DocumentIngestionService(
         embeddings_pipeline=embeddings_pipeline,
+        vector_database=vector_database,
     )
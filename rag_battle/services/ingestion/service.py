@@ -3,7 +3,7 @@ import time
 from loguru import logger
 
 from rag_battle.domain.embeddings_pipeline import EmbeddingsPipeline
-from rag_battle.domain.vector_database import DataItemType
+from rag_battle.domain.vector_database import DataItemType, VectorDatabase
 
 
 class DocumentIngestionService:
@@ -18,14 +18,17 @@ class DocumentIngestionService:
     def __init__(
         self,
         embeddings_pipeline: EmbeddingsPipeline,
+        vector_database: VectorDatabase,
     ):
         """
         Initialize the document ingestion service with required components.
 
         :param embeddings_pipeline: The pipeline that handles embedding and storage
         processes.
+        :param vector_database: The database documents are deleted from.
         """
         self._embeddings_pipeline = embeddings_pipeline
+        self._vector_database = vector_database
 
     async def ingest_documents(self, documents: list[DataItemType]) -> None:
         """
@@ -45,3 +48,16 @@ class DocumentIngestionService:
         logger.info(
             f"Document ingestion executing time: {end_time - start_time:.3f} s."
         )
+
+    async def delete_documents(self, item_ids: list[str]) -> None:
+        """
+        Delete documents from the RAG system.
+
+        :param item_ids: Ids of the documents to delete. Unknown ids are ignored.
+
+        :return: None: The documents are removed as a side effect.
+        """
+        start_time = time.time()
+        await self._vector_database.delete_items(item_ids)
+        end_time = time.time()
+        logger.info(f"Document deletion executing time: {end_time - start_time:.3f} s.")
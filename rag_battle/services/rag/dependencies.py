@@ -2,20 +2,31 @@ from fastapi import Depends
 
 from rag_battle.services.rag import RAGService
 
+from rag_battle.domain.reranker import RerankConfig, RerankStage
 from rag_battle.domain.retriever import BaseRetriever
 from rag_battle.domain.embeddings_model import BaseEmbeddingsModel
+from rag_battle.domain.vector_database import VectorDatabase
 
 from rag_battle.infra.retrievers import Retriever
 from rag_battle.services.common.dependencies import (
     get_embeddings_model,
-    VECTOR_DATABASE,
+    get_vector_database,
+    RERANKER,
+    SPARSE_EMBEDDINGS_MODEL,
+    TOKEN_EMBEDDINGS_MODEL,
 )
 
 
 async def get_retriever(
     embeddings_model: BaseEmbeddingsModel = Depends(get_embeddings_model),
+    vector_database: VectorDatabase = Depends(get_vector_database),
 ) -> BaseRetriever:
-    return Retriever(embeddings_model=embeddings_model, vector_database=VECTOR_DATABASE)
+    return Retriever(
+        embeddings_model=embeddings_model,
+        vector_database=vector_database,
+        sparse_embeddings_model=SPARSE_EMBEDDINGS_MODEL,
+        token_embeddings_model=TOKEN_EMBEDDINGS_MODEL,
+    )
 
 
 async def get_rag_service(
@@ -23,4 +34,8 @@ async def get_rag_service(
 ) -> RAGService:
     return RAGService(
         retriever=retriever,
+        rerank_stage=RERANK_STAGE,
     )
+
+
+RERANK_STAGE = RerankStage(reranker=RERANKER, config=RerankConfig())
@@ -1,9 +1,9 @@
 import time
 from loguru import logger
 
+from rag_battle.domain.reranker import RerankStage
 from rag_battle.domain.retriever import BaseRetriever
-from rag_battle.domain.schemas import RAGQuery
-from rag_battle.domain.vector_database import DataItemType
+from rag_battle.domain.schemas import RAGQuery, ScoredItem
 
 
 class RAGService:
@@ -15,16 +15,21 @@ class RAGService:
     query performance metrics.
     """
 
-    def __init__(self, retriever: BaseRetriever):
+    def __init__(
+        self, retriever: BaseRetriever, rerank_stage: RerankStage | None = None
+    ):
         """
         Initialize the RAG service with a retriever implementation.
 
         :param retriever: The retrieval component that will perform
         semantic search operations.
+        :param rerank_stage: Reranks the retrieved documents. None returns them
+        in retrieval order.
         """
         self.retriever = retriever
+        self.rerank_stage = rerank_stage
 
-    async def query(self, query: RAGQuery) -> list[DataItemType]:
+    async def query(self, query: RAGQuery) -> list[ScoredItem]:
         """
         Execute a RAG query to retrieve relevant documents.
 
@@ -33,11 +38,14 @@ class RAGService:
         :param query: The query object containing the search text,
         filtering tags, and retrieval parameters.
 
-        :return: list[DataItemType]: A list of retrieved documents that match the query,
-        ordered by relevance.
+        :return: list[ScoredItem]: A list of retrieved documents with their scores
+        that match the query, ordered by relevance.
         """
         start_time = time.time()
-        docs = await self.retriever.retrieve(query=query)
+        if self.rerank_stage is None:
+            docs = await self.retriever.retrieve(query=query)
+        else:
+            docs = await self.rerank_stage.retrieve(self.retriever, query)
         end_time = time.time()
         logger.info(f"RAG query executing time: {end_time - start_time:.3f} s.")
         return docs
@@ -0,0 +1,19 @@
+import pytest_asyncio
+
+from rag_battle.infra.embeddings.text_embeddings_inference.stand_in import (
+    TEIStandInConfig,
+    TEIStandInServer,
+)
+
+
+@pytest_asyncio.fixture
+async def tei_stand_in(monkeypatch):
+    """A TEI stand-in server the TEI settings point to."""
+    server = TEIStandInServer(TEIStandInConfig(embedding_size=64))
+    port = await server.start()
+    monkeypatch.setenv("EMBEDDINGS_HOST", "127.0.0.1")
+    monkeypatch.setenv("EMBEDDINGS_PORT", str(port))
+    monkeypatch.setenv("EMBEDDINGS_MODEL", server.config.model_id)
+    monkeypatch.setenv("EMBEDDINGS_SIZE", str(server.config.embedding_size))
+    yield server
+    await server.stop()
@@ -3,6 +3,8 @@ import fastapi
 from httpx import AsyncClient
 
 from rag_battle.server import app
+from rag_battle.infra.embeddings.tei import TEIChunker, TEIChunkerConfig
+from rag_battle.services.common.dependencies import TEI_CHANNEL_POOL
 from fixtures.query import VERY_LONG_QUERY, QUERY, TAGS, NUM_ITEMS, REMOVE_DUPLICATES
 from fixtures.documents import DOCUMENTS, VERY_LONG_DOCUMENTS
 from integration.utils import override_dependencies
@@ -88,6 +90,7 @@ async def test_ingestion(documents: list[dict]) -> None:
 @pytest.mark.asyncio(scope="session")
 @pytest.mark.parametrize("documents", VERY_LONG_DOCUMENTS)
 async def test_very_long_document_ingestion(documents: list[dict]) -> None:
+    # without chunking, longer documents than the model takes are rejected
     async for _ in override_dependencies(app):
         async with AsyncClient(app=app, base_url="http://test") as client:
             # Ingest
@@ -101,6 +104,42 @@ async def test_very_long_document_ingestion(documents: list[dict]) -> None:
             assert response.json()["detail"]
 
 
+@pytest.mark.asyncio(scope="session")
+@pytest.mark.parametrize("documents", VERY_LONG_DOCUMENTS)
+async def test_very_long_document_chunked_ingestion(documents: list[dict]) -> None:
+    chunker = TEIChunker(
+        config=TEIChunkerConfig(EMBEDDINGS_CHUNK_MAX_TOKENS=256),
+        channel_pool=TEI_CHANNEL_POOL,
+    )
+    async for _ in override_dependencies(app, chunker=chunker):
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            # Ingest
+            response = await client.put(
+                "/v1/",
+                json={
+                    "documents": documents,
+                },
+            )
+            assert response.status_code == fastapi.status.HTTP_204_NO_CONTENT
+
+            # Every document is found once, whole, by its chunks
+            response = await client.post(
+                "/v1/query",
+                json={
+                    "query": documents[0]["content"][:100],
+                    "tags": [],
+                    "num_items": len(documents) * 100,
+                    "remove_duplicates": True,
+                },
+            )
+            assert response.status_code == fastapi.status.HTTP_200_OK
+            extracted_items = response.json()["items"]
+            assert sorted(item["item_id"] for item in extracted_items) == sorted(
+                document["item_id"] for document in documents
+            )
+            assert extracted_items[0]["content"] == documents[0]["content"]
+
+
 @pytest.mark.asyncio(scope="session")
 @pytest.mark.parametrize("query", VERY_LONG_QUERY)
 async def test_very_long_query(
@@ -160,3 +199,44 @@ async def test_tags_query(documents: list[dict]) -> None:
                 assert len(extracted_items) == len(tags[tag])
                 for item in extracted_items:
                     assert tag in item["tags"]
+
+
+@pytest.mark.asyncio(scope="session")
+@pytest.mark.parametrize("documents", DOCUMENTS)
+async def test_delete(documents: list[dict]) -> None:
+    async for _ in override_dependencies(app):
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            # Ingest
+            response = await client.put(
+                "/v1/",
+                json={
+                    "documents": documents,
+                },
+            )
+            assert response.status_code == fastapi.status.HTTP_204_NO_CONTENT
+
+            # Delete the first document
+            response = await client.request(
+                "DELETE",
+                "/v1/items",
+                json={
+                    "item_ids": [documents[0]["item_id"]],
+                },
+            )
+            assert response.status_code == fastapi.status.HTTP_204_NO_CONTENT
+            assert response.content == b""
+
+            response = await client.post(
+                "/v1/query",
+                json={
+                    "query": "",
+                    "tags": [],
+                    "num_items": len(documents) * 100,  # very big number
+                    "remove_duplicates": True,
+                },
+            )
+            assert response.status_code == fastapi.status.HTTP_200_OK
+            extracted_items = response.json()["items"]
+            assert {item["item_id"] for item in extracted_items} == {
+                document["item_id"] for document in documents[1:]
+            }
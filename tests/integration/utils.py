@@ -1,5 +1,6 @@
 from fastapi import Depends
 
+from rag_battle.domain.chunker import BaseChunker
 from rag_battle.domain.embeddings_model import BaseEmbeddingsModel
 from rag_battle.domain.retriever import BaseRetriever
 from rag_battle.domain.embeddings_pipeline import EmbeddingsPipeline
@@ -11,17 +12,18 @@ from rag_battle.services.ingestion import DocumentIngestionService
 from rag_battle.services.rag import RAGService
 from rag_battle.services.common.dependencies import (
     create_vector_database,
+    get_embedding_size,
     get_embeddings_model,
 )
 from rag_battle.services.ingestion.dependencies import get_document_ingestion_service
 from rag_battle.services.rag.dependencies import get_rag_service
 
 
-async def override_dependencies(app):
-    vector_database = create_vector_database()
+async def override_dependencies(app, chunker: BaseChunker | None = None):
+    vector_database = create_vector_database(await get_embedding_size())
 
     await override_get_rag_service(app, vector_database)
-    await override_get_document_ingestion_service(app, vector_database)
+    await override_get_document_ingestion_service(app, vector_database, chunker)
 
     yield
 
@@ -51,12 +53,15 @@ async def override_get_rag_service(
 async def override_get_document_ingestion_service(
     app,
     vector_database: VectorDatabase,
+    chunker: BaseChunker | None = None,
 ) -> None:
     async def get_test_embeddings_pipeline(
         embeddings_model: BaseEmbeddingsModel = Depends(get_embeddings_model),
     ) -> EmbeddingsPipeline:
         return EmbeddingsPipeline(
-            embeddings_model=embeddings_model, vector_database=vector_database
+            embeddings_model=embeddings_model,
+            vector_database=vector_database,
+            chunker=chunker,
         )
 
     async def get_test_document_ingestion_service(
@@ -64,6 +69,7 @@ async def override_get_document_ingestion_service(
     ) -> DocumentIngestionService:
         return DocumentIngestionService(
             embeddings_pipeline=embeddings_pipeline,
+            vector_database=vector_database,
         )
 
     app.dependency_overrides[get_document_ingestion_service] = (
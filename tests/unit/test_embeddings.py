@@ -1,13 +1,49 @@
+import time
+import grpc
 import pytest
+import asyncio
+import numpy as np
 from abc import ABC, abstractmethod
 
+from rag_battle.domain.chunker import token_windows
 from rag_battle.domain.embeddings_model import (
     BaseEmbeddingsModel,
     EmbeddingsModelConfig,
 )
-from rag_battle.infra.embeddings.tei import TEIEmbeddingsModel, TEIEmbeddingsModelConfig
+from rag_battle.infra.embeddings import (
+    BatchingEmbeddingsModel,
+    CachingEmbeddingsModel,
+    DocumentCachingEmbeddingsModel,
+    DocumentEmbeddingsCacheConfig,
+    EmbeddingsBatchingConfig,
+    EmbeddingsCacheConfig,
+    HashingEmbeddingsModel,
+    HashingEmbeddingsModelConfig,
+)
+from rag_battle.infra.embeddings.hashing import embed_texts_sparse, embed_texts_tokens
+from rag_battle.infra.embeddings.tei import (
+    TEIChunker,
+    TEIChunkerConfig,
+    TEIEmbeddingsModel,
+    TEIEmbeddingsModelConfig,
+)
+from rag_battle.infra.embeddings.tei.limiter import AdaptiveLimiter, RetryBudget
 from rag_battle.infra.embeddings.service import TEIService
-from rag_battle.domain.exceptions import InvalidInputException
+from rag_battle.infra.embeddings.text_embeddings_inference.channel_pool import (
+    TEIChannelPool,
+)
+from rag_battle.infra.embeddings.text_embeddings_inference import tei_pb2, tei_pb2_grpc
+from rag_battle.infra.embeddings.text_embeddings_inference.stand_in import (
+    TEIStandInConfig,
+    TEIStandInServer,
+)
+from rag_battle.domain import deadline
+from rag_battle.domain.deadline import deadline_scope
+from rag_battle.domain.exceptions import (
+    DeadlineExceededException,
+    InvalidInputException,
+    OverloadedException,
+)
 
 
 class BaseTestEmbeddingsModel(ABC):
@@ -58,6 +94,19 @@ class BaseTestEmbeddingsModel(ABC):
         for embedding in embeddings:
             assert len(embedding) == config.embedding_size
 
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("texts", [[], ["hello", "how are you?"]])
+    async def test_embed_array(self, texts: list[str]):
+        config = await self._create_config()
+        model = await self._create()
+
+        for embeddings in [
+            await model.embed_queries_array(texts),
+            await model.embed_documents_array(texts),
+        ]:
+            assert embeddings.dtype == np.float32
+            assert embeddings.shape == (len(texts), config.embedding_size)
+
     @pytest.mark.asyncio
     @pytest.mark.parametrize(
         "query",
@@ -83,12 +132,582 @@ class BaseTestEmbeddingsModel(ABC):
             await model.embed_documents(documents)
 
 
+@pytest.mark.usefixtures("tei_stand_in")
 class TestTEIEmbeddingsModel(BaseTestEmbeddingsModel):
     async def _create(self):
         return TEIEmbeddingsModel(
             config=await self._create_config(),
-            service=TEIService(),
+            channel_pool=TEIChannelPool(TEIService()),
         )
 
     async def _create_config(self) -> TEIEmbeddingsModelConfig:
         return TEIEmbeddingsModelConfig()
+
+    @pytest.mark.asyncio
+    async def test_configure(self):
+        model = await self._create()
+        assert model.limits is None
+
+        limits = await model.configure()
+
+        assert model.limits == limits
+        assert limits.batch_size >= 1
+        assert limits.max_concurrent_batches >= 1
+        texts = ["text"] * (2 * limits.batch_size + 1)
+        assert len(await model.embed_documents(texts)) == len(texts)
+
+    @pytest.mark.asyncio
+    async def test_overloaded(self, tei_stand_in: TEIStandInServer, monkeypatch):
+        monkeypatch.setenv("EMBEDDINGS_RETRY_BUDGET_MAX", "1")
+        model = await self._create()
+        await model.configure()
+        tei_stand_in.config.failure_rate = 1.0
+
+        # one retry out of the budget, then the call fails fast
+        with pytest.raises(OverloadedException):
+            await model.embed_queries(["text"])
+        with pytest.raises(OverloadedException):
+            await model.embed_queries(["text"])
+
+    @pytest.mark.asyncio
+    async def test_deadline(self, tei_stand_in: TEIStandInServer):
+        model = await self._create()
+        await model.configure()
+        tei_stand_in.config.base_latency_s = 1.0
+
+        start_time = time.monotonic()
+        with deadline_scope(0.1):
+            with pytest.raises(DeadlineExceededException):
+                await model.embed_queries(["text"])
+
+        assert time.monotonic() - start_time < 0.5
+
+    @pytest.mark.asyncio
+    async def test_hedging(self, tei_stand_in: TEIStandInServer, monkeypatch):
+        async def num_stalled_calls(hedge_quantile: str) -> int:
+            monkeypatch.setenv("EMBEDDINGS_HEDGE_QUANTILE", hedge_quantile)
+            model = await self._create()
+            tei_stand_in.config.stall_rate = 0.0
+            # fast calls the hedge delay is derived from
+            for _ in range(20):
+                await model.embed_queries(["text"])
+            tei_stand_in.config.stall_rate = 0.2
+            latencies = []
+            for _ in range(30):
+                start_time = time.monotonic()
+                await model.embed_queries(["text"])
+                latencies.append(time.monotonic() - start_time)
+            return sum(latency > 0.1 for latency in latencies)
+
+        tei_stand_in.config.stall_latency_s = 0.2
+
+        assert await num_stalled_calls("0.95") < await num_stalled_calls("0")
+
+    @pytest.mark.asyncio
+    async def test_embed_sparse(self):
+        model = await self._create()
+        limits = await model.configure()
+        texts = [f"document number {i}" for i in range(2 * limits.batch_size + 1)]
+
+        vectors = await model.embed_documents_sparse(texts)
+
+        for vector, expected in zip(vectors, embed_texts_sparse(texts), strict=True):
+            assert np.array_equal(np.sort(vector.indices), expected.indices)
+            assert np.allclose(
+                vector.values[np.argsort(vector.indices)], expected.values
+            )
+        with pytest.raises(InvalidInputException):
+            await model.embed_queries_sparse(["text " * 1000])
+
+    @pytest.mark.asyncio
+    async def test_embed_tokens(self):
+        model = await self._create()
+        limits = await model.configure()
+        texts = [f"document number {i}" for i in range(2 * limits.batch_size + 1)]
+
+        matrices = await model.embed_documents_tokens(texts)
+
+        expected = embed_texts_tokens(texts, 64, 3, 5)
+        for matrix, expected_matrix in zip(matrices, expected, strict=True):
+            assert matrix.dtype == np.float32
+            assert np.allclose(matrix, expected_matrix, atol=1e-6)
+            assert np.allclose(np.linalg.norm(matrix, axis=1), 1.0)
+
+
+class TestHashingEmbeddingsModel(BaseTestEmbeddingsModel):
+    async def _create(self, **kwargs):
+        return HashingEmbeddingsModel(config=await self._create_config(**kwargs))
+
+    async def _create_config(self, **kwargs) -> HashingEmbeddingsModelConfig:
+        return HashingEmbeddingsModelConfig(EMBEDDINGS_SIZE=64, **kwargs)
+
+    @pytest.mark.asyncio
+    async def test_similarity(self):
+        model = await self._create()
+
+        embeddings = await model.embed_documents_array(
+            ["The quick brown fox", "the quick brown foxes", "Quantum chromodynamics"]
+        )
+
+        assert np.linalg.norm(embeddings, axis=1) == pytest.approx(1.0, abs=1e-5)
+        similarities = embeddings @ embeddings.T
+        assert similarities[0, 1] > similarities[0, 2]
+        # a new model embeds the same
+        other = await self._create()
+        assert np.array_equal(
+            embeddings[:1], await other.embed_documents_array(["The quick brown fox"])
+        )
+
+    @pytest.mark.asyncio
+    async def test_sparse(self):
+        model = await self._create()
+
+        query, matching, other = await model.embed_queries_sparse(
+            ["Quick fox", "the quick brown fox, the fox", "Quantum chromodynamics"]
+        )
+
+        def score(a, b) -> float:
+            _, i, j = np.intersect1d(a.indices, b.indices, return_indices=True)
+            return float(a.values[i] @ b.values[j])
+
+        assert score(query, matching) > score(query, other) == 0
+        # repeated words weigh more
+        assert score(query, matching) == pytest.approx(
+            np.log(2) * (np.log(2) + np.log(3))
+        )
+
+    @pytest.mark.asyncio
+    async def test_tokens(self):
+        model = await self._create()
+
+        query, document = await model.embed_queries_tokens(
+            ["quick fox", "The quick brown fox"]
+        )
+
+        assert query.shape == (2, 64) and document.shape == (4, 64)
+        # every query word matches the same word in the document
+        similarities = query @ document.T
+        assert np.allclose(similarities.max(axis=1), 1.0)
+        assert list(similarities.argmax(axis=1)) == [1, 3]
+
+    @pytest.mark.asyncio
+    async def test_process_pool(self):
+        texts = [f"document number {i}" for i in range(10)]
+        model = await self._create()
+        pooled = await self._create(
+            EMBEDDINGS_HASHING_NUM_WORKERS=2,
+            EMBEDDINGS_HASHING_MIN_POOL_BATCH_SIZE=4,
+        )
+
+        assert np.array_equal(
+            await pooled.embed_documents_array(texts),
+            await model.embed_documents_array(texts),
+        )
+        pooled.close()
+        assert pooled._executor is None
+        # the pool is started again on demand
+        assert np.array_equal(
+            await pooled.embed_documents_array(texts),
+            await model.embed_documents_array(texts),
+        )
+        pooled.close()
+
+
+@pytest.mark.usefixtures("tei_stand_in")
+class TestTEIChannelPool:
+    @pytest.mark.asyncio
+    async def test_round_robin(self):
+        num_channels = TEIService().num_channels
+        pool = TEIChannelPool(TEIService())
+
+        stubs = [pool.embed_stub() for _ in range(2 * num_channels)]
+
+        assert len({id(stub) for stub in stubs}) == num_channels
+        assert stubs[:num_channels] == stubs[num_channels:]
+        await pool.close()
+        # closed channels are reopened on next use
+        assert pool.embed_stub() not in stubs
+        await pool.close()
+
+
+class CountingEmbeddingsModel(BaseEmbeddingsModel):
+    """Embeds a text as its length and rejects the text `invalid`."""
+
+    def __init__(self):
+        super().__init__(
+            config=EmbeddingsModelConfig(model_name="counting", embedding_size=1)
+        )
+        self.calls: list[list[str]] = []
+
+    async def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        self.calls.append(texts)
+        if "invalid" in texts:
+            raise InvalidInputException("invalid")
+        return [[float(len(text))] for text in texts]
+
+    async def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.embed_queries(texts)
+
+
+class SlowEmbeddingsModel(CountingEmbeddingsModel):
+    """Takes `latency` seconds and records the deadline it is called under."""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+        self.time_left: list[float | None] = []
+
+    async def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        self.time_left.append(deadline.remaining())
+        await asyncio.sleep(self.latency)
+        return await super().embed_queries(texts)
+
+
+class TestBatchingEmbeddingsModel:
+    @staticmethod
+    def _create(model: BaseEmbeddingsModel, **kwargs) -> BatchingEmbeddingsModel:
+        return BatchingEmbeddingsModel(model, config=EmbeddingsBatchingConfig(**kwargs))
+
+    @pytest.mark.asyncio
+    async def test_coalesce(self):
+        model = CountingEmbeddingsModel()
+        batching = self._create(
+            model, EMBEDDINGS_BATCH_MAX_WAIT_MS=50, EMBEDDINGS_BATCH_MAX_SIZE=4
+        )
+        queries = [["a"], ["bb", "ccc"], [], ["dddd"], ["eeeee"]]
+
+        embeddings = await asyncio.gather(
+            *[batching.embed_queries(texts) for texts in queries]
+        )
+
+        assert embeddings == [
+            [[float(len(text))] for text in texts] for texts in queries
+        ]
+        # the fourth text sends the first batch early
+        assert model.calls == [["a", "bb", "ccc", "dddd"], ["eeeee"]]
+
+    @pytest.mark.asyncio
+    async def test_invalid_input_isolated(self):
+        model = CountingEmbeddingsModel()
+        batching = self._create(model, EMBEDDINGS_BATCH_MAX_WAIT_MS=50)
+
+        embeddings = await asyncio.gather(
+            batching.embed_queries(["a"]),
+            batching.embed_queries(["invalid"]),
+            batching.embed_queries(["bb"]),
+            return_exceptions=True,
+        )
+
+        assert embeddings[0] == [[1.0]]
+        assert isinstance(embeddings[1], InvalidInputException)
+        assert embeddings[2] == [[2.0]]
+
+    @pytest.mark.asyncio
+    async def test_deadlines(self):
+        model = SlowEmbeddingsModel(latency=0.2)
+        batching = self._create(model, EMBEDDINGS_BATCH_MAX_WAIT_MS=20)
+
+        async def embed(timeout: float | None, texts: list[str]):
+            with deadline_scope(timeout):
+                return await batching.embed_queries(texts)
+
+        # the caller with the short deadline opens the batch
+        embeddings = await asyncio.gather(
+            embed(0.1, ["a"]), embed(5.0, ["bb"]), return_exceptions=True
+        )
+
+        assert isinstance(embeddings[0], DeadlineExceededException)
+        assert embeddings[1] == [[2.0]]
+        # the batch ran under the latest deadline of its callers
+        assert model.calls == [["a", "bb"]]
+        assert model.time_left[0] == pytest.approx(5.0, abs=0.5)
+
+        # a caller without deadline lifts the deadline of the batch
+        await asyncio.gather(
+            embed(1.0, ["a"]), embed(None, ["bb"]), return_exceptions=True
+        )
+        assert model.time_left[1] is None
+
+
+class TestCachingEmbeddingsModel:
+    @staticmethod
+    def _create(model: BaseEmbeddingsModel, **kwargs) -> CachingEmbeddingsModel:
+        kwargs.setdefault("EMBEDDINGS_CACHE_MAX_BYTES", 1 << 20)
+        return CachingEmbeddingsModel(model, config=EmbeddingsCacheConfig(**kwargs))
+
+    @pytest.mark.asyncio
+    async def test_hits(self):
+        model = CountingEmbeddingsModel()
+        cache = self._create(model)
+
+        assert await cache.embed_queries(["a", "bb"]) == [[1.0], [2.0]]
+        assert await cache.embed_queries([" bb ", "a", "ccc", "ccc"]) == [
+            [2.0],
+            [1.0],
+            [3.0],
+            [3.0],
+        ]
+
+        embeddings = await cache.embed_queries_array(["ccc", "dddd"])
+        assert embeddings.dtype == np.float32
+        assert embeddings.tolist() == [[3.0], [4.0]]
+
+        # normalized duplicates are embedded once
+        assert model.calls == [["a", "bb"], ["ccc"], ["dddd"]]
+        assert (cache.hits, cache.misses) == (3, 4)
+
+    @pytest.mark.asyncio
+    async def test_same_embedding_on_hit_and_miss(self):
+        model = CountingEmbeddingsModel()
+        cache = self._create(model)
+        # 2049 has no float16 representation
+        text = " " + "a" * 2048
+
+        missed = await cache.embed_queries_array([text])
+        hit = await cache.embed_queries_array(["a" * 2048 + " "])
+
+        assert missed.tolist() == hit.tolist() == [[2048.0]]
+        # the model gets the query as sent, not its normalized key
+        assert model.calls == [[text]]
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self):
+        model = CountingEmbeddingsModel()
+        # float16 embeddings of size 1 and one character texts take 3 bytes
+        cache = self._create(model, EMBEDDINGS_CACHE_MAX_BYTES=6)
+
+        await cache.embed_queries(["a", "b"])
+        await cache.embed_queries(["a"])
+        await cache.embed_queries(["c"])
+        await cache.embed_queries(["a", "b"])
+
+        assert model.calls == [["a", "b"], ["c"], ["b"]]
+        assert len(cache) == 2
+        assert cache.size <= 6
+
+    @pytest.mark.asyncio
+    async def test_ttl(self):
+        model = CountingEmbeddingsModel()
+        cache = self._create(model, EMBEDDINGS_CACHE_TTL_S=0)
+
+        await cache.embed_queries(["a"])
+        await cache.embed_queries(["a"])
+
+        assert model.calls == [["a"], ["a"]]
+        assert cache.hits == 0
+
+
+class TestDocumentCachingEmbeddingsModel:
+    @pytest.mark.asyncio
+    async def test_reingest(self, tmp_path):
+        config = DocumentEmbeddingsCacheConfig(
+            EMBEDDINGS_DOCUMENT_CACHE_PATH=str(tmp_path / "embeddings.sqlite")
+        )
+        model = CountingEmbeddingsModel()
+        cache = DocumentCachingEmbeddingsModel(model, config=config)
+        assert await cache.embed_documents(["a", "bb", "a"]) == [[1.0], [2.0], [1.0]]
+
+        # the cache outlives the process
+        model = CountingEmbeddingsModel()
+        cache = DocumentCachingEmbeddingsModel(model, config=config)
+        assert await cache.embed_documents(["bb", "ccc"]) == [[2.0], [3.0]]
+        assert model.calls == [["ccc"]]
+        await cache.close()
+
+    @pytest.mark.asyncio
+    async def test_same_embedding_on_hit_and_miss(self, tmp_path):
+        config = DocumentEmbeddingsCacheConfig(
+            EMBEDDINGS_DOCUMENT_CACHE_PATH=str(tmp_path / "embeddings.sqlite")
+        )
+        cache = DocumentCachingEmbeddingsModel(CountingEmbeddingsModel(), config=config)
+        # 2049 has no float16 representation
+        text = "a" * 2049
+
+        missed = await cache.embed_documents_array([text])
+        hit = await cache.embed_documents_array([text])
+
+        assert missed.dtype == hit.dtype == np.float32
+        assert missed.tolist() == hit.tolist() == [[2048.0]]
+        await cache.close()
+
+
+class TestAdaptiveLimiter:
+    @pytest.mark.asyncio
+    async def test_increase(self):
+        limiter = AdaptiveLimiter(limit=1, max_limit=4, max_queue=0)
+
+        for _ in range(20):
+            async with limiter.slot():
+                pass
+
+        assert limiter.limit == 4
+        assert limiter.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_decrease_once(self):
+        limiter = AdaptiveLimiter(limit=8, max_limit=8, max_queue=0)
+
+        async def rejected() -> None:
+            async with limiter.slot() as slot:
+                await asyncio.sleep(0.01)
+                slot.overloaded()
+                raise RuntimeError("Model is overloaded")
+
+        results = await asyncio.gather(
+            *(rejected() for _ in range(4)), return_exceptions=True
+        )
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert limiter.limit == 4
+
+    @pytest.mark.asyncio
+    async def test_queue(self):
+        limiter = AdaptiveLimiter(limit=1, max_limit=1, max_queue=1)
+        release = asyncio.Event()
+
+        async def call() -> None:
+            async with limiter.slot():
+                await release.wait()
+
+        first = asyncio.create_task(call())
+        second = asyncio.create_task(call())
+        await asyncio.sleep(0)
+        assert (limiter.in_flight, limiter.queued) == (1, 1)
+
+        with pytest.raises(OverloadedException):
+            await call()
+        release.set()
+        await asyncio.gather(first, second)
+        assert (limiter.in_flight, limiter.queued) == (0, 0)
+
+
+class TestRetryBudget:
+    def test_withdraw(self):
+        budget = RetryBudget(ratio=0.5, max_retries=1)
+
+        assert budget.withdraw()
+        assert not budget.withdraw()
+        budget.deposit()
+        assert not budget.withdraw()
+        budget.deposit()
+        assert budget.withdraw()
+
+
+class TestTokenWindows:
+    @pytest.mark.parametrize(
+        "num_tokens, max_tokens, overlap_tokens, expected",
+        [
+            (3, 4, 1, [(0, 3)]),
+            (7, 4, 1, [(0, 4), (3, 7)]),
+            (8, 4, 1, [(0, 4), (3, 7), (6, 8)]),
+            (4, 2, 0, [(0, 2), (2, 4)]),
+        ],
+    )
+    def test_windows(
+        self,
+        num_tokens: int,
+        max_tokens: int,
+        overlap_tokens: int,
+        expected: list[tuple[int, int]],
+    ):
+        # one character per token
+        offsets = [(i, i + 1) for i in range(num_tokens)]
+
+        assert token_windows(offsets, max_tokens, overlap_tokens) == expected
+
+
+@pytest.mark.usefixtures("tei_stand_in")
+class TestTEIChunker:
+    @pytest.mark.asyncio
+    async def test_multibyte_text(self):
+        chunker = TEIChunker(
+            config=TEIChunkerConfig(
+                EMBEDDINGS_CHUNK_MAX_TOKENS=2, EMBEDDINGS_CHUNK_OVERLAP_TOKENS=0
+            ),
+            channel_pool=TEIChannelPool(TEIService()),
+        )
+
+        # token offsets count UTF-8 bytes, these characters take 2 and 3
+        chunks = await chunker.chunk(["Café naïve 東京 タワー fin", "short"])
+
+        assert chunks == [["Café naïve", "東京 タワー", "fin"], ["short"]]
+
+    @pytest.mark.asyncio
+    async def test_deadline(self):
+        chunker = TEIChunker(
+            config=TEIChunkerConfig(EMBEDDINGS_CHUNK_MAX_TOKENS=2),
+            channel_pool=TEIChannelPool(TEIService()),
+        )
+        tokenize_stub = chunker._channel_pool.tokenize_stub
+
+        with deadline_scope(-1.0):
+            with pytest.raises(DeadlineExceededException):
+                await chunker.chunk(["The quick brown fox"])
+
+        # the call gets the time left as its timeout
+        def checked_tokenize_stub():
+            stub = tokenize_stub()
+            stream = stub.TokenizeStream
+
+            def tokenize_stream(requests, timeout=None):
+                assert 0 < timeout <= 0.5
+                return stream(requests, timeout=timeout)
+
+            stub.TokenizeStream = tokenize_stream
+            return stub
+
+        chunker._channel_pool.tokenize_stub = checked_tokenize_stub
+        with deadline_scope(0.5):
+            assert await chunker.chunk(["short"]) == [["short"]]
+
+
+class TestTEIStandIn:
+    @staticmethod
+    async def _embed(port: int, texts: list[str]) -> list[list[float]]:
+        async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+            stub = tei_pb2_grpc.EmbedStub(channel)
+            requests = [tei_pb2.EmbedRequest(inputs=text) for text in texts]
+            return [
+                list(response.embeddings)
+                async for response in stub.EmbedStream(iter(requests))
+            ]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "config, code",
+        [
+            (
+                TEIStandInConfig(max_concurrent_requests=2, item_latency_s=0.01),
+                grpc.StatusCode.RESOURCE_EXHAUSTED,
+            ),
+            (TEIStandInConfig(failure_rate=1.0), grpc.StatusCode.UNAVAILABLE),
+            (TEIStandInConfig(max_input_length=2), grpc.StatusCode.INVALID_ARGUMENT),
+        ],
+    )
+    async def test_errors(self, config: TEIStandInConfig, code: grpc.StatusCode):
+        server = TEIStandInServer(config)
+        port = await server.start()
+        try:
+            with pytest.raises(grpc.aio.AioRpcError) as e:
+                await self._embed(port, ["one two three"] * 4)
+            assert e.value.code() == code
+        finally:
+            await server.stop()
+
+    @pytest.mark.asyncio
+    async def test_rerank(self):
+        server = TEIStandInServer(TEIStandInConfig(embedding_size=64))
+        port = await server.start()
+        try:
+            async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+                response = await tei_pb2_grpc.RerankStub(channel).Rerank(
+                    tei_pb2.RerankRequest(
+                        query="quick brown fox",
+                        texts=["quantum physics", "the quick brown fox jumps"],
+                    )
+                )
+        finally:
+            await server.stop()
+
+        assert [rank.index for rank in response.ranks] == [1, 0]
+        assert response.ranks[0].score > response.ranks[1].score
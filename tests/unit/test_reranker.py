@@ -0,0 +1,178 @@
+import asyncio
+import numpy as np
+import pytest
+
+from rag_battle.domain.exceptions import InvalidInputException
+from rag_battle.domain.reranker import BaseReranker, RerankConfig, RerankStage
+from rag_battle.domain.retriever import BaseRetriever
+from rag_battle.domain.schemas import RAGQuery, ScoredItem, StoredItem
+from rag_battle.infra.embeddings.service import TEIService
+from rag_battle.infra.embeddings.text_embeddings_inference.channel_pool import (
+    TEIChannelPool,
+)
+from rag_battle.infra.rerankers import (
+    CachingReranker,
+    RerankCacheConfig,
+    TEIReranker,
+    TEIRerankerConfig,
+)
+
+
+class LengthReranker(BaseReranker):
+    """Scores longer texts higher and counts the reranked texts."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.num_texts = 0
+
+    async def rerank(self, query: str, texts: list[str]) -> np.ndarray:
+        self.num_texts += len(texts)
+        await asyncio.sleep(self.latency)
+        return np.array([len(text) for text in texts], dtype=np.float32)
+
+
+class StaticRetriever(BaseRetriever):
+    """Retrieves items by descending score, shorter ones first."""
+
+    def __init__(self, num_items: int):
+        self.items = [
+            ScoredItem(
+                item=StoredItem(item_id=f"{i}", content="x" * (i + 1), tags=()),
+                score=1.0 - i / num_items,
+            )
+            for i in range(num_items)
+        ]
+        self.num_items: int | None = None
+
+    async def retrieve(self, query: RAGQuery) -> list[ScoredItem]:
+        self.num_items = query.num_items
+        return self.items[: query.num_items]
+
+
+@pytest.mark.usefixtures("tei_stand_in")
+class TestTEIReranker:
+    @pytest.mark.asyncio
+    async def test_rerank(self):
+        reranker = TEIReranker(
+            config=TEIRerankerConfig(), channel_pool=TEIChannelPool(TEIService())
+        )
+        batch_size = await reranker.configure()
+        texts = ["quantum physics", "the quick brown fox jumps"] * (batch_size + 1)
+
+        scores = await reranker.rerank("quick brown fox", texts)
+
+        assert len(scores) == len(texts)
+        assert np.all(scores[1::2] > scores[::2])
+        assert np.array_equal(scores[:2], scores[-2:])
+
+
+class TestCachingReranker:
+    @pytest.mark.asyncio
+    async def test_hits(self):
+        inner = LengthReranker()
+        reranker = CachingReranker(
+            inner, config=RerankCacheConfig(RERANK_CACHE_MAX_ENTRIES=3)
+        )
+
+        assert list(await reranker.rerank("query", ["a", "bb", "a"])) == [1, 2, 1]
+        # the normalized query hits, a new text is reranked on its own
+        assert list(await reranker.rerank(" query ", ["bb", "ccc"])) == [2, 3]
+        assert inner.num_texts == 3
+        assert (reranker.hits, reranker.misses) == (1, 3)
+
+        # the least recently used score is evicted
+        await reranker.rerank("query", ["a", "dddd"])
+        assert len(reranker) == 3
+        await reranker.rerank("query", ["a", "bb"])
+        assert inner.num_texts == 5
+
+
+class TestRerankStage:
+    @staticmethod
+    def _query(**kwargs) -> RAGQuery:
+        return RAGQuery(query="query", tags=[], num_items=3, **kwargs)
+
+    @pytest.mark.asyncio
+    async def test_rerank(self):
+        retriever = StaticRetriever(num_items=20)
+        stage = RerankStage(
+            reranker=LengthReranker(),
+            config=RerankConfig(RERANK=True, RERANK_NUM_CANDIDATES=10),
+        )
+
+        items = await stage.retrieve(retriever, self._query())
+        assert retriever.num_items == 10
+        assert [(x.item.item_id, x.score) for x in items] == [
+            ("9", 10.0),
+            ("8", 9.0),
+            ("7", 8.0),
+        ]
+
+        items = await stage.retrieve(retriever, self._query(rerank_candidates=5))
+        assert retriever.num_items == 5
+        assert [x.item.item_id for x in items] == ["4", "3", "2"]
+
+        # opting out keeps the retrieval order
+        items = await stage.retrieve(retriever, self._query(rerank=False))
+        assert retriever.num_items == 3
+        assert [x.item.item_id for x in items] == ["0", "1", "2"]
+
+    @pytest.mark.asyncio
+    async def test_too_many_candidates(self):
+        retriever = StaticRetriever(num_items=20)
+        stage = RerankStage(
+            reranker=LengthReranker(),
+            config=RerankConfig(RERANK=True, RERANK_MAX_CANDIDATES=10),
+        )
+
+        with pytest.raises(InvalidInputException):
+            await stage.retrieve(retriever, self._query(rerank_candidates=11))
+        assert retriever.num_items is None
+        items = await stage.retrieve(retriever, self._query(rerank_candidates=10))
+        assert retriever.num_items == 10
+        assert len(items) == 3
+
+    @pytest.mark.asyncio
+    async def test_many_items(self):
+        retriever = StaticRetriever(num_items=20)
+        reranker = LengthReranker()
+        stage = RerankStage(
+            reranker=reranker,
+            config=RerankConfig(
+                RERANK=True, RERANK_NUM_CANDIDATES=5, RERANK_MAX_CANDIDATES=10
+            ),
+        )
+
+        items = await stage.retrieve(
+            retriever, RAGQuery(query="query", tags=[], num_items=15)
+        )
+
+        assert retriever.num_items == 15
+        assert reranker.num_texts == 10
+        # items beyond the reranked ones follow in retrieval order
+        assert [x.item.item_id for x in items] == [
+            *(f"{i}" for i in range(9, -1, -1)),
+            *(f"{i}" for i in range(10, 15)),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_budget_exceeded(self):
+        retriever = StaticRetriever(num_items=20)
+        stage = RerankStage(
+            reranker=LengthReranker(latency=1.0),
+            config=RerankConfig(RERANK_BUDGET_MS=50),
+        )
+
+        start_time = asyncio.get_running_loop().time()
+        items = await stage.retrieve(retriever, self._query(rerank=True))
+
+        assert asyncio.get_running_loop().time() - start_time < 0.5
+        assert [x.item.item_id for x in items] == ["0", "1", "2"]
+
+    @pytest.mark.asyncio
+    async def test_not_configured(self):
+        retriever = StaticRetriever(num_items=20)
+        stage = RerankStage(reranker=None, config=RerankConfig())
+
+        with pytest.raises(InvalidInputException):
+            await stage.retrieve(retriever, self._query(rerank=True))
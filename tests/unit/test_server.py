@@ -0,0 +1,117 @@
+import os
+import sys
+import asyncio
+import pytest
+
+# the dependencies are created on import, so the app runs in a fresh process
+# that sees the environment of the test
+START_APP = """
+import asyncio
+from httpx import AsyncClient
+
+from rag_battle.server import app, lifespan
+
+ITEM_ID = "0e556d891af44b139c34322ea21ff382"
+
+
+async def main():
+    async with lifespan(app):
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            document = {"item_id": ITEM_ID, "content": "The quick fox", "tags": []}
+            response = await client.put("/v1/", json={"documents": [document]})
+            assert response.status_code == 204, response.text
+            response = await client.post(
+                "/v1/query",
+                json={"query": "quick fox", "tags": [], "num_items": 1},
+            )
+            assert response.status_code == 200, response.text
+            print(response.json()["items"][0]["item_id"])
+
+
+asyncio.run(main())
+"""
+
+# prints the status code of a query for every X-Request-Timeout-Ms header
+QUERY_WITH_TIMEOUTS = """
+import sys
+import asyncio
+from httpx import AsyncClient
+
+from rag_battle.server import app, lifespan
+
+
+async def main():
+    async with lifespan(app):
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            for i, timeout in enumerate(sys.argv[1:]):
+                # distinct queries, a cached embedding would skip the deadline
+                response = await client.post(
+                    "/v1/query",
+                    json={"query": f"quick fox {i}", "tags": [], "num_items": 1},
+                    headers={"X-Request-Timeout-Ms": timeout} if timeout else {},
+                )
+                print(response.status_code)
+
+
+asyncio.run(main())
+"""
+
+
+async def run_app(
+    script: str, *args: str, env: dict[str, str] | None = None
+) -> list[str]:
+    """
+    :param env: Environment of the app, the one of the test by default.
+
+    :return: list[str]: The words the script printed.
+    """
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-c",
+        script,
+        *args,
+        env=os.environ.copy() if env is None else env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate()
+    assert process.returncode == 0, stderr.decode()
+    return stdout.decode().split()
+
+
+class TestServer:
+    @pytest.mark.asyncio
+    async def test_start_without_embedding_size(self, tei_stand_in, monkeypatch):
+        monkeypatch.delenv("EMBEDDINGS_SIZE")
+
+        assert await run_app(START_APP) == ["0e556d891af44b139c34322ea21ff382"]
+
+    @pytest.mark.asyncio
+    async def test_request_timeout(self, tei_stand_in, monkeypatch):
+        monkeypatch.delenv("REQUEST_TIMEOUT_MS", raising=False)
+
+        status_codes = await run_app(
+            QUERY_WITH_TIMEOUTS,
+            # no header, a deadline that passes before the embeddings call, and
+            # invalid values
+            "",
+            "0.001",
+            "10000",
+            "0",
+            "-5",
+            "soon",
+        )
+
+        assert status_codes == ["200", "504", "200", "422", "422", "422"]
+
+    @pytest.mark.asyncio
+    async def test_hashing_backend_without_tei(self):
+        # nothing but the hashing model, no TEI or reranker service to point to
+        env = {
+            name: value
+            for name, value in os.environ.items()
+            if not name.startswith(("EMBEDDINGS_", "RERANK", "FAISS_"))
+        }
+        env.update(EMBEDDINGS_BACKEND="hashing", EMBEDDINGS_SIZE="64")
+
+        assert await run_app(START_APP, env=env) == ["0e556d891af44b139c34322ea21ff382"]
@@ -0,0 +1,895 @@
+import pytest
+import asyncio
+import numpy as np
+from abc import ABC, abstractmethod
+
+from rag_battle.domain.exceptions import InvalidInputException
+from rag_battle.domain.schemas import DataItem, DataItemWithEmbedding, SparseVector
+from rag_battle.domain.vector_database import VectorDatabase
+from rag_battle.infra.vector_database import (
+    FaissVectorDatabase,
+    FaissVectorDatabaseConfig,
+)
+from rag_battle.infra.vector_database import index as faiss_index_utils
+from rag_battle.infra.vector_database.bitmap import IdBitmap
+from rag_battle.infra.vector_database.faiss import chunk_key
+from rag_battle.infra.vector_database.id_map import IdMap
+from rag_battle.infra.vector_database.sparse_index import SparseIndex
+from rag_battle.infra.vector_database import token_store as token_store_module
+from rag_battle.infra.vector_database.token_store import TokenStore
+
+EMBEDDING_SIZE = 8
+
+
+def create_items(tags: list[list[str]]) -> list[DataItemWithEmbedding]:
+    embeddings = np.eye(len(tags), EMBEDDING_SIZE, dtype=np.float32)
+    return [
+        DataItemWithEmbedding(
+            item=DataItem(item_id=f"{i}", content=f"Document {i}.", tags=tags[i]),
+            embedding=embeddings[i],
+        )
+        for i in range(len(tags))
+    ]
+
+
+def sparse_vector(weights: dict[int, float]) -> SparseVector:
+    return SparseVector(
+        indices=np.array(list(weights), dtype=np.int64),
+        values=np.array(list(weights.values()), dtype=np.float32),
+    )
+
+
+class BaseTestVectorDatabase(ABC):
+    @abstractmethod
+    async def _create(self) -> VectorDatabase:
+        raise NotImplementedError
+
+    @pytest.mark.asyncio
+    async def test_empty_database(self):
+        database = await self._create()
+
+        items = await database.query(
+            query_embeddings=[np.ones(EMBEDDING_SIZE)],
+            tags=[],
+            num_items=10,
+            remove_duplicates=True,
+        )
+
+        assert items == []
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "tags, expected_item_ids",
+        [
+            ([], {"0", "1", "2", "3"}),
+            (["films"], {"0", "1"}),
+            (["books"], {"0", "2"}),
+            (["films", "books"], {"0", "1", "2"}),
+            (["unknown"], set()),
+            (["unknown", "movies"], {"3"}),
+        ],
+    )
+    async def test_tags_query(self, tags: list[str], expected_item_ids: set[str]):
+        database = await self._create()
+        await database.save_items(
+            create_items([["films", "books"], ["films"], ["books"], ["movies"]])
+        )
+
+        items = await database.query(
+            query_embeddings=[np.ones(EMBEDDING_SIZE)],
+            tags=tags,
+            num_items=100,
+            remove_duplicates=True,
+        )
+
+        assert len(items) == len(expected_item_ids)
+        assert {result.item.item_id for result in items} == expected_item_ids
+        for result in items:
+            assert not tags or set(tags) & set(result.item.tags)
+
+    @pytest.mark.asyncio
+    async def test_overwrite(self):
+        database = await self._create()
+        await database.save_items(create_items([["films"], ["books"]]))
+
+        items = create_items([["movies"]])
+        items[0].item.content = "Updated."
+        await database.save_items(items)
+
+        assert not await database.query(
+            query_embeddings=[np.ones(EMBEDDING_SIZE)],
+            tags=["films"],
+            num_items=100,
+            remove_duplicates=True,
+        )
+        items = await database.query(
+            query_embeddings=[np.ones(EMBEDDING_SIZE)],
+            tags=[],
+            num_items=100,
+            remove_duplicates=True,
+        )
+        assert len(items) == 2
+        assert {result.item.content for result in items} == {"Updated.", "Document 1."}
+
+    @pytest.mark.asyncio
+    async def test_delete(self):
+        database = await self._create()
+        await database.save_items(create_items([["films"], ["books"], ["films"]]))
+
+        await database.delete_items(["0", "unknown"])
+
+        items = await database.query(
+            query_embeddings=[np.ones(EMBEDDING_SIZE)],
+            tags=[],
+            num_items=100,
+            remove_duplicates=True,
+        )
+        assert {result.item.item_id for result in items} == {"1", "2"}
+        items = await database.query(
+            query_embeddings=[np.ones(EMBEDDING_SIZE)],
+            tags=["films"],
+            num_items=100,
+            remove_duplicates=True,
+        )
+        assert [result.item.item_id for result in items] == ["2"]
+
+    @pytest.mark.asyncio
+    async def test_scores_order(self):
+        database = await self._create()
+        await database.save_items(create_items([["films"], ["films"], ["films"]]))
+
+        query = np.array([0.1, 0.9, 0.5] + [0.0] * (EMBEDDING_SIZE - 3))
+        items = await database.query(
+            query_embeddings=[query],
+            tags=["films"],
+            num_items=2,
+            remove_duplicates=True,
+        )
+
+        assert [result.item.item_id for result in items] == ["1", "2"]
+        assert items[0].score == pytest.approx(0.9)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "remove_duplicates, expected",
+        [
+            (True, [("1", 0.9), ("0", 0.8), ("2", 0.5)]),
+            (False, [("1", 0.9), ("0", 0.8), ("1", 0.7), ("2", 0.5)]),
+        ],
+    )
+    async def test_multiple_query_embeddings(
+        self, remove_duplicates: bool, expected: list[tuple[str, float]]
+    ):
+        database = await self._create()
+        await database.save_items(create_items([["films"], ["films"], ["films"]]))
+
+        padding = [0.0] * (EMBEDDING_SIZE - 3)
+        items = await database.query(
+            query_embeddings=[
+                np.array([0.1, 0.9, 0.5] + padding),
+                np.array([0.8, 0.7, 0.0] + padding),
+            ],
+            tags=["films"],
+            num_items=4,
+            remove_duplicates=remove_duplicates,
+        )
+
+        assert [result.item.item_id for result in items] == [x[0] for x in expected]
+        assert [result.score for result in items] == pytest.approx(
+            [x[1] for x in expected]
+        )
+
+    @pytest.mark.asyncio
+    async def test_chunked_items(self):
+        database = await self._create()
+        eye = np.eye(EMBEDDING_SIZE, dtype=np.float32)
+        await database.save_items(
+            [
+                DataItemWithEmbedding(
+                    item=DataItem(item_id="0", content="Long.", tags=["films"]),
+                    embedding=eye[[0, 1, 2]],
+                ),
+                DataItemWithEmbedding(
+                    item=DataItem(item_id="1", content="Short.", tags=["films"]),
+                    embedding=eye[3],
+                ),
+            ]
+        )
+        query = np.array([0.6, 0.3, 0.0, 0.5] + [0.0] * (EMBEDDING_SIZE - 4))
+
+        items = await database.query(
+            query_embeddings=[query],
+            tags=["films"],
+            num_items=2,
+            remove_duplicates=True,
+        )
+        # an item is scored by its best chunk
+        assert [(x.item.item_id, x.score) for x in items] == [
+            ("0", pytest.approx(0.6)),
+            ("1", pytest.approx(0.5)),
+        ]
+
+        # fewer chunks replace all chunks of the item
+        await database.save_items(
+            [
+                DataItemWithEmbedding(
+                    item=DataItem(item_id="0", content="Long.", tags=["films"]),
+                    embedding=eye[[1, 2]],
+                )
+            ]
+        )
+        items = await database.query(
+            query_embeddings=[query],
+            tags=["films"],
+            num_items=2,
+            remove_duplicates=True,
+        )
+        assert [(x.item.item_id, x.score) for x in items] == [
+            ("1", pytest.approx(0.5)),
+            ("0", pytest.approx(0.3)),
+        ]
+
+        await database.delete_items(["0"])
+        items = await database.query(
+            query_embeddings=[query],
+            tags=[],
+            num_items=2,
+            remove_duplicates=True,
+        )
+        assert [x.item.item_id for x in items] == ["1"]
+
+
+class TestFaissVectorDatabase(BaseTestVectorDatabase):
+    index_factory: str = "Flat"
+    storage: str = "fp32"
+    rescore_factor: int = 0
+
+    async def _create(self, **kwargs) -> FaissVectorDatabase:
+        # tombstones stay in the index unless a test compacts them
+        kwargs.setdefault("FAISS_COMPACTION_THRESHOLD", None)
+        return await FaissVectorDatabase.create(
+            embedding_size=EMBEDDING_SIZE,
+            config=FaissVectorDatabaseConfig(
+                FAISS_INDEX_FACTORY=self.index_factory,
+                FAISS_STORAGE=self.storage,
+                FAISS_RESCORE_FACTOR=self.rescore_factor,
+                FAISS_TRAIN_SIZE=2,
+                FAISS_NPROBE=2,
+                **kwargs,
+            ),
+        )
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("snapshot_mmap", [True, False])
+    async def test_snapshot(self, tmp_path, snapshot_mmap: bool):
+        snapshot_dir = str(tmp_path)
+        database = await self._create(FAISS_SNAPSHOT_DIR=snapshot_dir)
+        await database.save_items(create_items([["films"], ["books"], ["films"]]))
+        # overwrite an item to leave a removed or dead id behind
+        await database.save_items(create_items([["books"]]))
+        await database.close()
+
+        restored = await self._create(
+            FAISS_SNAPSHOT_DIR=snapshot_dir, FAISS_SNAPSHOT_MMAP=snapshot_mmap
+        )
+        for tags in [[], ["films"], ["books"]]:
+            expected = await database.query(
+                query_embeddings=[np.ones(EMBEDDING_SIZE)],
+                tags=tags,
+                num_items=100,
+                remove_duplicates=True,
+            )
+            found = await restored.query(
+                query_embeddings=[np.ones(EMBEDDING_SIZE)],
+                tags=tags,
+                num_items=100,
+                remove_duplicates=True,
+            )
+            assert found == expected
+
+        # the restored database stays writable
+        items = create_items([["films"], ["films"], ["films"], ["movies"]])
+        await restored.save_items(items[3:])
+        found = await restored.query(
+            query_embeddings=[np.ones(EMBEDDING_SIZE)],
+            tags=["movies"],
+            num_items=100,
+            remove_duplicates=True,
+        )
+        assert [result.item.item_id for result in found] == ["3"]
+
+    @pytest.mark.asyncio
+    async def test_shared(self, tmp_path):
+        # two workers of one server sharing the snapshot directory
+        workers = [
+            await self._create(FAISS_SNAPSHOT_DIR=str(tmp_path), FAISS_SHARED=True)
+            for _ in range(2)
+        ]
+        items = create_items([["films"], ["books"], ["films"]])
+        await workers[0].save_items(items[:2])
+        await workers[1].save_items(items[2:])
+        # an overwrite must not resurrect the old tags in any worker
+        await workers[0].save_items(create_items([["books"]]))
+
+        for worker in workers:
+            for tags, expected_item_ids in [
+                ([], ["0", "1", "2"]),
+                (["films"], ["2"]),
+                (["books"], ["0", "1"]),
+            ]:
+                found = await worker.query(
+                    query_embeddings=[np.ones(EMBEDDING_SIZE)],
+                    tags=tags,
+                    num_items=100,
+                    remove_duplicates=True,
+                )
+                assert (
+                    sorted(result.item.item_id for result in found) == expected_item_ids
+                )
+            # every worker serves the published snapshot from the same files
+            assert worker._is_mapped
+
+    @pytest.mark.asyncio
+    async def test_shared_publishes_concurrent_writes_together(self, tmp_path):
+        worker = await self._create(
+            FAISS_SNAPSHOT_DIR=str(tmp_path),
+            FAISS_SHARED=True,
+            FAISS_SHARED_PUBLISH_WAIT_MS=10,
+        )
+        num_snapshots = 0
+        write_snapshot = worker._write_snapshot
+
+        async def count_snapshots():
+            nonlocal num_snapshots
+            num_snapshots += 1
+            await write_snapshot()
+
+        worker._write_snapshot = count_snapshots
+        items = create_items([["films"], ["books"], ["films"]])
+        await asyncio.gather(*(worker.save_items([item]) for item in items))
+
+        assert num_snapshots == 1
+        # the id map and the tag bitmaps stay mapped from the snapshot
+        assert not worker._dead_ids._bits.flags.writeable
+        assert worker._vector_ids.get(chunk_key("1", 0)) is not None
+        # writes copy them before changing anything
+        await worker.delete_items(["1"])
+        found = await worker.query(
+            query_embeddings=[np.ones(EMBEDDING_SIZE)],
+            tags=[],
+            num_items=100,
+            remove_duplicates=True,
+        )
+        assert sorted(result.item.item_id for result in found) == ["0", "2"]
+
+    @pytest.mark.asyncio
+    async def test_compaction(self):
+        database = await self._create(FAISS_COMPACTION_THRESHOLD=0.5)
+        items = create_items([["films"], ["books"], ["films"], ["books"], ["films"]])
+        await database.save_items(items[:4])
+        await database.save_items(items[:2])
+        assert database._compaction is None
+        # half of the vectors in the index are tombstones now
+        await database.delete_items(["2"])
+        compaction = database._compaction
+        assert compaction is not None
+        # let the compaction start, then write while it runs
+        await asyncio.sleep(0)
+        await database.save_items(items[4:])
+        await compaction
+
+        assert database._num_dead_ids == 0
+        assert database._faiss_index.ntotal == 4
+        for tags, expected_item_ids in [
+            ([], ["0", "1", "3", "4"]),
+            (["films"], ["0", "4"]),
+            (["books"], ["1", "3"]),
+        ]:
+            found = await database.query(
+                query_embeddings=[np.ones(EMBEDDING_SIZE)],
+                tags=tags,
+                num_items=100,
+                remove_duplicates=True,
+            )
+            assert sorted(result.item.item_id for result in found) == expected_item_ids
+
+    @pytest.mark.asyncio
+    async def test_search_batching(self):
+        items = create_items([["films"], ["books"], ["films"], ["films", "books"]])
+        database = await self._create()
+        batched = await self._create(FAISS_SEARCH_BATCH_MAX_WAIT_MS=50)
+        await database.save_items(items)
+        await batched.save_items(items)
+        search = batched._search
+        num_searches = 0
+
+        def count_searches(*args, **kwargs):
+            nonlocal num_searches
+            num_searches += 1
+            return search(*args, **kwargs)
+
+        batched._search = count_searches
+        rng = np.random.default_rng(0)
+        queries = [
+            dict(
+                query_embeddings=[rng.standard_normal(EMBEDDING_SIZE)],
+                tags=tags,
+                num_items=k,
+            )
+            for tags, k in [
+                (["films"], 1),
+                (["films"], 3),
+                (["films"], 2),
+                (["books"], 2),
+                (["unknown"], 2),
+            ]
+        ]
+
+        found = await asyncio.gather(
+            *[batched.query(**query, remove_duplicates=True) for query in queries]
+        )
+
+        # one search per distinct filter
+        assert num_searches == 3
+        for query, results in zip(queries, found):
+            assert results == await database.query(**query, remove_duplicates=True)
+
+    @pytest.mark.asyncio
+    async def test_chunk_aggregation_sum(self):
+        database = await self._create(FAISS_CHUNK_AGGREGATION="sum")
+        eye = np.eye(EMBEDDING_SIZE, dtype=np.float32)
+        await database.save_items(
+            [
+                DataItemWithEmbedding(
+                    item=DataItem(item_id="0", content="Long.", tags=[]),
+                    embedding=eye[[0, 1]],
+                ),
+                DataItemWithEmbedding(
+                    item=DataItem(item_id="1", content="Short.", tags=[]),
+                    embedding=eye[2],
+                ),
+            ]
+        )
+
+        items = await database.query(
+            query_embeddings=[np.array([0.3, 0.4, 0.6] + [0.0] * (EMBEDDING_SIZE - 3))],
+            tags=[],
+            num_items=2,
+            remove_duplicates=True,
+        )
+
+        assert [(x.item.item_id, x.score) for x in items] == [
+            ("0", pytest.approx(0.7)),
+            ("1", pytest.approx(0.6)),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_unknown_search_params(self):
+        database = await self._create()
+        await database.save_items(create_items([["films"]]))
+
+        with pytest.raises(InvalidInputException):
+            await database.query(
+                query_embeddings=[np.ones(EMBEDDING_SIZE)],
+                tags=[],
+                num_items=1,
+                remove_duplicates=True,
+                search_params={"unknown": 1},
+            )
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("fusion", ["rrf", "weighted"])
+    async def test_hybrid(self, tmp_path, fusion: str):
+        database = await self._create(
+            FAISS_SNAPSHOT_DIR=str(tmp_path), FAISS_FUSION=fusion
+        )
+        items = create_items([["films"], ["films"], ["films"], ["books"]])
+        # the keyword is in the last item by dense score, and in the books item
+        for i, item in enumerate(items):
+            keyword = {42: 1.0} if i in [2, 3] else {}
+            item.sparse_embeddings = [sparse_vector({10 + i: 1.0, **keyword})]
+        await database.save_items(items)
+        query = {
+            "query_embeddings": [np.array([1.0, 0.5, 0.25] + [0.0] * 5)],
+            "tags": ["films"],
+            "num_items": 2,
+            "remove_duplicates": True,
+        }
+        keyword_query = [sparse_vector({42: 1.0})]
+
+        dense = await database.query(**query)
+        hybrid = await database.query(**query, sparse_query_embeddings=keyword_query)
+
+        assert [x.item.item_id for x in dense] == ["0", "1"]
+        assert [x.item.item_id for x in hybrid] == ["2", "0"]
+
+        # an overwrite replaces the sparse vector
+        items[2].sparse_embeddings = [sparse_vector({12: 1.0})]
+        await database.save_items(items[2:3])
+        await database.close()
+        restored = await self._create(
+            FAISS_SNAPSHOT_DIR=str(tmp_path), FAISS_FUSION=fusion
+        )
+        hybrid = await restored.query(**query, sparse_query_embeddings=keyword_query)
+        assert [x.item.item_id for x in hybrid] == ["0", "1"]
+
+    @pytest.mark.asyncio
+    async def test_late_interaction(self, tmp_path):
+        database = await self._create(FAISS_SNAPSHOT_DIR=str(tmp_path))
+        items = create_items([["films"], ["films"], ["films"], ["films"]])
+        tokens = np.eye(3, 4, dtype=np.float32)
+        # the last item has no token embeddings
+        for i, item in enumerate(items[:3]):
+            item.token_embeddings = [tokens[[i, i]]]
+        await database.save_items(items)
+        query = {
+            "query_embeddings": [np.array([1.0, 0.5, 0.25, 0.1] + [0.0] * 4)],
+            "tags": ["films"],
+            "num_items": 2,
+            "remove_duplicates": True,
+        }
+        token_query = [np.array([[0.0, 0.0, 1.0, 0.0]] * 2, dtype=np.float32)]
+
+        dense = await database.query(**query)
+        late = await database.query(**query, token_query_embeddings=token_query)
+
+        assert [x.item.item_id for x in dense] == ["0", "1"]
+        # the second query token matches the same document token again
+        assert [(x.item.item_id, x.score) for x in late] == [("2", 2.0), ("0", 0.0)]
+
+        # an overwrite replaces the token embeddings
+        items[2].token_embeddings = [tokens[[1]]]
+        await database.save_items(items[2:3])
+        await database.close()
+        restored = await self._create(FAISS_SNAPSHOT_DIR=str(tmp_path))
+        late = await restored.query(**query, token_query_embeddings=token_query)
+        assert [x.item.item_id for x in late] == ["0", "1"]
+
+
+class TestFaissHNSWVectorDatabase(TestFaissVectorDatabase):
+    # HNSW can't remove vectors, compaction rebuilds the graph
+    index_factory = "HNSW8"
+
+
+class TestFaissIVFVectorDatabase(TestFaissVectorDatabase):
+    # trained once the second item arrives, after that vectors migrate from flat
+    index_factory = "IVF2,Flat"
+
+
+class TestFaissSQ8VectorDatabase(TestFaissVectorDatabase):
+    # rescoring restores the exact scores of the quantized vectors
+    storage = "sq8"
+    rescore_factor = 2
+
+
+class TestFaissHNSWFP16VectorDatabase(TestFaissVectorDatabase):
+    index_factory = "HNSW8"
+    storage = "fp16"
+
+
+class TestFaissIndexFactory:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "index_factory, min_recall",
+        [
+            # filtered graph traversal is approximate
+            ("HNSW16", 0.9),
+            ("IVF4,Flat", 1.0),
+            ("SQ8", 1.0),
+            # PQ rejects id selectors, filtering happens after the search
+            ("PQ4x4", 1.0),
+            # ids are handled below the pre-transform
+            ("PCA8,IVF4,PQ4x4", 1.0),
+        ],
+    )
+    async def test_training_lifecycle(self, index_factory: str, min_recall: float):
+        num_items = 512
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((num_items, EMBEDDING_SIZE))
+        items = [
+            DataItemWithEmbedding(
+                item=DataItem(
+                    item_id=f"{i}", content=f"Document {i}.", tags=[f"tag{i % 4}"]
+                ),
+                embedding=embeddings[i],
+            )
+            for i in range(num_items)
+        ]
+        database = await FaissVectorDatabase.create(
+            embedding_size=EMBEDDING_SIZE,
+            config=FaissVectorDatabaseConfig(
+                FAISS_INDEX_FACTORY=index_factory, FAISS_TRAIN_SIZE=num_items // 2
+            ),
+        )
+
+        await database.save_items(items[: num_items // 2])
+        await database.save_items(items[num_items // 2 :])
+        # overwrite the first tag with new tags after the index is trained
+        for item in items[::4]:
+            item.item.tags = ["tag1"]
+        await database.save_items(items[::4])
+
+        found = await database.query(
+            query_embeddings=[embeddings[1]],
+            tags=["tag1"],
+            num_items=num_items,
+            remove_duplicates=True,
+            search_params={"nprobe": 4, "ef_search": num_items},
+        )
+        assert min_recall * num_items // 2 <= len(found) <= num_items // 2
+        assert all(result.item.tags == ("tag1",) for result in found)
+        assert not await database.query(
+            query_embeddings=[embeddings[0]],
+            tags=["tag0"],
+            num_items=num_items,
+            remove_duplicates=True,
+        )
+
+        # the overwrite tombstoned a fifth of the index, wait for the compaction
+        await database.close()
+        assert database._num_dead_ids == 0
+        assert database._faiss_index.ntotal == num_items
+        found = await database.query(
+            query_embeddings=[embeddings[1]],
+            tags=["tag1"],
+            num_items=num_items,
+            remove_duplicates=True,
+            search_params={"nprobe": 4, "ef_search": num_items},
+        )
+        assert min_recall * num_items // 2 <= len(found) <= num_items // 2
+
+
+class TestFaissStorage:
+    @pytest.mark.parametrize(
+        "index_factory, storage, expected",
+        [
+            ("Flat", "fp32", "Flat"),
+            ("Flat", "sq8", "SQ8"),
+            ("HNSW32", "fp16", "HNSW32,SQfp16"),
+            ("HNSW32,Flat", "sq8", "HNSW32,SQ8"),
+            ("PCA8,IVF4,Flat", "fp16", "PCA8,IVF4,SQfp16"),
+        ],
+    )
+    def test_with_storage(self, index_factory: str, storage: str, expected: str):
+        assert faiss_index_utils.with_storage(index_factory, storage) == expected
+
+    def test_compressed_storage(self):
+        with pytest.raises(ValueError):
+            FaissVectorDatabase(
+                embedding_size=EMBEDDING_SIZE,
+                config=FaissVectorDatabaseConfig(
+                    FAISS_INDEX_FACTORY="PQ4x4", FAISS_STORAGE="sq8"
+                ),
+            )
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "storage, rescore_factor, min_recall",
+        [
+            ("fp16", 0, 0.99),
+            # int8 codes misorder close neighbours, rescoring fixes the order
+            ("sq8", 0, 0.8),
+            ("sq8", 4, 1.0),
+        ],
+    )
+    async def test_recall(
+        self, tmp_path, storage: str, rescore_factor: int, min_recall: float
+    ):
+        num_items, num_queries, k = 1024, 20, 10
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((num_items, EMBEDDING_SIZE), np.float32)
+        queries = rng.standard_normal((num_queries, EMBEDDING_SIZE), np.float32)
+        database = await FaissVectorDatabase.create(
+            embedding_size=EMBEDDING_SIZE,
+            config=FaissVectorDatabaseConfig(
+                FAISS_STORAGE=storage,
+                FAISS_RESCORE_FACTOR=rescore_factor,
+                FAISS_TRAIN_SIZE=num_items // 2,
+                FAISS_SNAPSHOT_DIR=str(tmp_path),
+            ),
+        )
+        await database.save_items(
+            [
+                DataItemWithEmbedding(
+                    item=DataItem(item_id=f"{i}", content=f"Document {i}.", tags=[]),
+                    embedding=embeddings[i],
+                )
+                for i in range(num_items)
+            ]
+        )
+        await database.close()
+        restored = await FaissVectorDatabase.create(
+            embedding_size=EMBEDDING_SIZE,
+            config=FaissVectorDatabaseConfig(
+                FAISS_STORAGE=storage,
+                FAISS_RESCORE_FACTOR=rescore_factor,
+                FAISS_SNAPSHOT_DIR=str(tmp_path),
+            ),
+        )
+
+        found = 0
+        for query in queries:
+            expected = np.argsort(-(embeddings @ query))[:k]
+            items = await restored.query(
+                query_embeddings=[query],
+                tags=[],
+                num_items=k,
+                remove_duplicates=True,
+            )
+            found += len({f"{i}" for i in expected} & {x.item.item_id for x in items})
+            if rescore_factor:
+                scores = [x.score for x in items]
+                assert scores == pytest.approx((embeddings @ query)[expected], rel=1e-5)
+        assert found >= min_recall * num_queries * k
+
+
+class TestSparseIndex:
+    @pytest.mark.parametrize("k", [1, 10, 1000])
+    def test_search_exact(self, tmp_path, k: int):
+        num_vectors, vocab_size = 1000, 200
+        rng = np.random.default_rng(0)
+        # skewed term frequencies, like words in text
+        terms = rng.zipf(1.3, (num_vectors, 20)) % vocab_size
+        dense = np.zeros((num_vectors, vocab_size), dtype=np.float32)
+        index = SparseIndex()
+        for start in range(0, num_vectors, 100):
+            vectors = []
+            for row in range(start, start + 100):
+                indices = np.unique(terms[row])
+                dense[row, indices] = rng.random(len(indices), dtype=np.float32)
+                vectors.append(SparseVector(indices, dense[row, indices]))
+            index.add(np.arange(start, start + 100), vectors)
+        purged = index.without(np.arange(0, num_vectors, 7))
+        # the index itself keeps the postings for searches still running on it
+        query = SparseVector(np.flatnonzero(dense[0]), dense[0][dense[0] > 0])
+        assert 0 in index.search(query, num_vectors)[1]
+        assert 0 not in purged.search(query, num_vectors)[1]
+        index = purged
+        dense[::7] = 0
+        excluded = IdBitmap()
+        excluded.add(np.arange(0, num_vectors, 5))
+        index.write(str(tmp_path / "sparse"))
+
+        for searched in [index, SparseIndex.read(str(tmp_path / "sparse"))]:
+            for _ in range(10):
+                query_terms = np.unique(rng.zipf(1.3, 5) % vocab_size)
+                query = SparseVector(
+                    query_terms, rng.random(len(query_terms), dtype=np.float32)
+                )
+                scores, ids = searched.search(query, k, excluded=excluded)
+
+                expected = dense[:, query_terms] @ query.values
+                expected[::5] = 0
+                expected_ids = np.flatnonzero(expected)
+                expected_ids = expected_ids[np.argsort(-expected[expected_ids])][:k]
+                assert scores == pytest.approx(expected[expected_ids], rel=1e-5)
+                # ids may differ from the expected ones among ties at the cut
+                assert expected[ids] == pytest.approx(scores, rel=1e-5)
+
+
+class TestTokenStore:
+    @pytest.mark.parametrize("mmap", [True, False])
+    def test_maxsim_exact(self, tmp_path, mmap: bool):
+        num_vectors, size = 200, 16
+        rng = np.random.default_rng(0)
+        matrices = {}
+        store = TokenStore()
+        for start in range(0, num_vectors, 50):
+            ids = np.arange(start, start + 50)
+            batch = [rng.standard_normal((rng.integers(1, 20), size)) for _ in ids]
+            store.add(ids, batch)
+            matrices.update(zip(ids.tolist(), batch))
+        # replaced and removed vectors leave dead rows until a repack
+        replaced = rng.standard_normal((3, size))
+        store.add(np.array([5]), [replaced])
+        matrices[5] = replaced
+        store = store.without(np.arange(0, num_vectors, 3))
+        store.write(str(tmp_path / "tokens"))
+        restored = TokenStore.read(str(tmp_path / "tokens"), mmap=mmap)
+        # the mapped matrix is copied on the first write
+        restored.add(np.array([num_vectors]), [rng.standard_normal((4, size))])
+
+        query = rng.standard_normal((5, size)).astype(np.float32)
+        ids = np.array([-1, 0, 1, 5, 7, num_vectors - 1, num_vectors + 10])
+        for searched in [store, restored]:
+            scores = searched.maxsim(query, ids)
+
+            for score, vector_id in zip(scores, ids.tolist()):
+                if vector_id % 3 == 0 or vector_id not in matrices:
+                    assert score == -np.inf
+                else:
+                    matrix = matrices[vector_id].astype(np.float16)
+                    expected = (matrix.astype(np.float32) @ query.T).max(axis=0).sum()
+                    assert score == pytest.approx(expected, rel=1e-4)
+
+        # dead rows are dropped once they are more than half of the matrix
+        purged = store.without(np.arange(num_vectors))
+        assert purged.is_empty
+        assert purged.nbytes == purged._starts.nbytes + purged._lengths.nbytes
+        # the store itself is left as it was
+        assert not store.is_empty
+
+    def test_maxsim_chunked(self, monkeypatch):
+        num_vectors, size = 100, 16
+        rng = np.random.default_rng(0)
+        store = TokenStore()
+        store.add(
+            np.arange(num_vectors),
+            [
+                rng.standard_normal((rng.integers(1, 20), size))
+                for _ in range(num_vectors)
+            ],
+        )
+        query = rng.standard_normal((5, size)).astype(np.float32)
+        ids = rng.permutation(num_vectors + 5) - 2
+        expected = store.maxsim(query, ids)
+
+        # chunks smaller than the tokens of a vector still take the vector whole
+        for chunk_rows in [1, 7, 64]:
+            monkeypatch.setattr(token_store_module, "MAXSIM_CHUNK_ROWS", chunk_rows)
+            assert store.maxsim(query, ids) == pytest.approx(expected, rel=1e-6)
+
+
+class TestIdMap:
+    def test_allocation(self):
+        id_map = IdMap()
+
+        assert [id_map.get_or_add(key) for key in ["a", "b", "a"]] == [
+            (0, True),
+            (1, True),
+            (0, False),
+        ]
+        assert len(id_map) == 2
+        assert id_map.capacity == 2
+        assert id_map.keys(np.array([1, 0])).tolist() == ["b", "a"]
+
+    def test_reuse_after_release(self):
+        id_map = IdMap()
+        for key in ["a", "b", "c"]:
+            id_map.get_or_add(key)
+
+        assert id_map.remove("a") == 0
+        assert id_map.get_or_add("d") == (0, True)
+        # ids of vectors still in the index wait for `release`
+        assert id_map.remove("b", reuse=False) == 1
+        assert id_map.get_or_add("e") == (3, True)
+        id_map.release(np.array([1]))
+        assert id_map.get_or_add("f") == (1, True)
+        assert len(id_map) == 4
+        assert id_map.capacity == 4
+
+    def test_unknown(self):
+        id_map = IdMap()
+        id_map.get_or_add("a")
+        id_map.remove("a", reuse=False)
+
+        assert id_map.get("a") is None
+        assert "a" not in id_map
+        assert id_map.key(0) is None
+        assert id_map.key(1) is None
+        assert id_map.keys(np.array([0, 1])).tolist() == [None, None]
+        with pytest.raises(KeyError):
+            id_map.remove("a")
+
+    @pytest.mark.parametrize("mmap", [True, False])
+    def test_write_read(self, tmp_path, mmap: bool):
+        id_map = IdMap()
+        for key in ["a", "b", "c", "d"]:
+            id_map.get_or_add(key)
+        id_map.remove("b")
+        id_map.remove("c", reuse=False)
+        id_map.write(str(tmp_path / "ids"))
+
+        restored = IdMap.read(str(tmp_path / "ids"), mmap=mmap)
+        assert len(restored) == 2
+        assert restored.capacity == 4
+        assert [restored.get(key) for key in ["a", "b", "c", "d"]] == [0, None, None, 3]
+        assert restored.keys(np.arange(4)).tolist() == ["a", None, None, "d"]
+        # changes shadow the restored map
+        assert restored.get_or_add("e") == (1, True)
+        assert restored.remove("a") == 0
+        assert restored.get_or_add("a") == (0, True)
+        assert restored.remove("d") == 3
+        assert restored.get("d") is None
+        assert restored.keys(np.arange(4)).tolist() == ["a", "e", None, None]
+        assert len(restored) == 2